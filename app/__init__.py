@@ -18,11 +18,16 @@ from .content_generator import (
     generate_instagram_image_prompt_for_video,
     generate_instagram_video_prompt,
     generate_instagram_post_texts,
-    analyze_blog_for_instagram_inputs
+    analyze_blog_for_instagram_inputs,
+    regenerate_package_artifacts
 )
 from .file_utils import save_output_to_file_async, extract_keywords
+from .prompt_registry import get_prompt_template, preload_prompt_templates
 from .utils import get_app_version # Example utility from the refactored utils.py
 
+# Load every prompt template once so generation never touches the prompts directory
+preload_prompt_templates()
+
 logging.info("App package initialized.")
 
 __all__ = [
@@ -35,7 +40,10 @@ __all__ = [
     "generate_instagram_video_prompt",
     "generate_instagram_post_texts",
     "analyze_blog_for_instagram_inputs",
+    "regenerate_package_artifacts",
     "save_output_to_file_async",
     "extract_keywords",
+    "get_prompt_template",
+    "preload_prompt_templates",
     "get_app_version"
 ] 
\ No newline at end of file
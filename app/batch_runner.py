@@ -0,0 +1,297 @@
+import os
+import sys
+import json
+import time
+import asyncio
+import hashlib
+import logging
+import argparse
+
+from .llm_clients import initialize_llm_clients
+from .content_generator import generate_persian_blog_package
+from .rate_limiter import LLM_RATE_LIMITS, parse_rate_limits, apply_rate_limits
+from .llm_pool import pool_state
+from .http_transport import http_transport_stats
+from .source_dedup import find_duplicate_sources
+from .pantry_outbox import PANTRY_OUTBOX_ENABLED, PANTRY_OUTBOX_DRAIN_TIMEOUT, get_pantry_outbox
+
+# Configure logging (can be configured centrally if preferred)
+logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+
+BATCH_WORKERS = int(os.getenv("BATCH_WORKERS", "3"))
+BATCH_RESULTS_FILE = os.getenv("BATCH_RESULTS_FILE", os.path.join("answers", "batch_results.jsonl"))
+
+REQUIRED_SOURCE_FIELDS = ("source_title", "source_body")
+OPTIONAL_SOURCE_FIELDS = ("source_name", "source_url")
+
+
+# --- Loading Sources ---
+def _items_from_file(path: str) -> list[dict]:
+    with open(path, 'r', encoding='utf-8') as f:
+        if path.endswith(".jsonl"):
+            items = []
+            for line_number, line in enumerate(f, 1):
+                line = line.strip()
+                if not line:
+                    continue
+                try:
+                    items.append(json.loads(line))
+                except json.JSONDecodeError as e:
+                    logging.error(f"Skipping invalid JSON on line {line_number} of {path}: {e}")
+            return items
+        data = json.load(f)
+    return data if isinstance(data, list) else [data]
+
+
+def batch_item_id(item: dict) -> str:
+    """Stable identity of a source: its explicit 'id', else a hash of its URL, else of its title and body."""
+    if item.get("id"):
+        return str(item["id"])
+    basis = item.get("source_url") or f"{item.get('source_title', '')}\n{item.get('source_body', '')}"
+    return hashlib.sha256(basis.encode("utf-8")).hexdigest()[:16]
+
+
+def load_batch_items(path: str) -> list[dict]:
+    """
+    Reads sources from a .jsonl file, a .json file (object or list), or a directory of such files
+    (sorted by name). Items missing source_title/source_body are skipped with an error.
+    """
+    if os.path.isdir(path):
+        files = sorted(os.path.join(path, name) for name in os.listdir(path) if name.endswith((".json", ".jsonl")))
+    else:
+        files = [path]
+
+    items = []
+    seen_ids = set()
+    for file_path in files:
+        try:
+            raw_items = _items_from_file(file_path)
+        except (OSError, json.JSONDecodeError) as e:
+            logging.error(f"Could not read batch source file {file_path}: {e}")
+            continue
+        for raw in raw_items:
+            if not isinstance(raw, dict) or not all(raw.get(field) for field in REQUIRED_SOURCE_FIELDS):
+                logging.error(f"Skipping source in {file_path} without {' and '.join(REQUIRED_SOURCE_FIELDS)}.")
+                continue
+            item = {field: raw.get(field) or "" for field in REQUIRED_SOURCE_FIELDS + OPTIONAL_SOURCE_FIELDS}
+            item["id"] = batch_item_id(raw)
+            if item["id"] in seen_ids:
+                logging.warning(f"Skipping duplicate source '{item['id']}' in {file_path}.")
+                continue
+            seen_ids.add(item["id"])
+            items.append(item)
+    logging.info(f"Loaded {len(items)} source(s) from {path}.")
+    return items
+
+
+def load_completed_ids(results_path: str) -> set[str]:
+    """Ids that already have a successful record in the results file (failed items are retried)."""
+    completed = set()
+    try:
+        with open(results_path, 'r', encoding='utf-8') as f:
+            for line in f:
+                try:
+                    record = json.loads(line)
+                except json.JSONDecodeError:
+                    continue # A line cut short by an interrupted run
+                if record.get("status") == "success" and record.get("id"):
+                    completed.add(record["id"])
+    except FileNotFoundError:
+        pass
+    return completed
+
+
+# --- Results File ---
+class _ResultsWriter:
+    """Appends one JSON line per finished item and flushes it, so a crash loses at most the item in flight."""
+    def __init__(self, path: str):
+        self.path = path
+        self._lock = asyncio.Lock()
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+
+    def _append(self, line: str) -> None:
+        with open(self.path, 'a', encoding='utf-8') as f:
+            f.write(line + "\n")
+            f.flush()
+            os.fsync(f.fileno())
+
+    async def write(self, record: dict) -> None:
+        line = json.dumps(record, ensure_ascii=False)
+        async with self._lock:
+            await asyncio.to_thread(self._append, line)
+
+
+# --- Runner ---
+async def _process_item(item: dict, clients: tuple, options: dict, skip_duplicates: bool = True) -> dict:
+    llm_blog, llm_image_prompt, llm_instagram_text = clients
+    start = time.perf_counter()
+    if skip_duplicates:
+        duplicates = await asyncio.to_thread(find_duplicate_sources, item["source_body"], None, 1)
+        if duplicates:
+            logging.info(f"Batch item '{item['id']}' is {duplicates[0]['similarity']:.0%} similar to {duplicates[0]['local_file']}; skipping generation.")
+            return {
+                "id": item["id"],
+                "status": "duplicate",
+                "error_message": None,
+                "source_title": item["source_title"],
+                "source_url": item["source_url"],
+                "slug": duplicates[0]["slug"],
+                "elapsed_seconds": round(time.perf_counter() - start, 3),
+                "finished_at": time.strftime("%Y-%m-%dT%H:%M:%S"),
+                "duplicate_of": duplicates[0],
+                "package": None,
+            }
+    try:
+        package = await generate_persian_blog_package(
+            llm_blog, llm_image_prompt, llm_instagram_text,
+            item["source_title"], item["source_body"], item["source_name"], item["source_url"],
+            **options
+        )
+    except Exception as e:
+        logging.exception(f"Batch item '{item['id']}' raised: {e}")
+        package = {"error": f"Unexpected error: {e}"}
+    error = package.get("error") if isinstance(package, dict) else "Generator returned no package."
+    return {
+        "id": item["id"],
+        "status": "error" if error else "success",
+        "error_message": error,
+        "source_title": item["source_title"],
+        "source_url": item["source_url"],
+        "slug": package.get("slug") if isinstance(package, dict) else None,
+        "elapsed_seconds": round(time.perf_counter() - start, 3),
+        "finished_at": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "package": None if error else package,
+    }
+
+
+async def run_batch(
+    items: list[dict],
+    results_path: str = BATCH_RESULTS_FILE,
+    workers: int = BATCH_WORKERS,
+    rate_limits: dict[str, float] | None = None,
+    clients: tuple | None = None,
+    resume: bool = True,
+    skip_duplicates: bool = True,
+    **generation_options
+) -> dict:
+    """
+    Generates a package for every item with `workers` items in flight at once.
+
+    Each result is appended to `results_path` (JSONL) as soon as its item finishes. With `resume`,
+    items that already have a successful record there are skipped. `rate_limits` maps model names
+    (or '*') to requests per minute and is shared by all workers. With `skip_duplicates`, a source
+    that is a near-duplicate of an earlier saved one is recorded as 'duplicate' (pointing at the
+    earlier package) instead of being generated. Remaining keyword arguments go
+    to `generate_persian_blog_package`. Returns a summary of the run.
+    """
+    if clients is None:
+        clients = initialize_llm_clients()
+    if not all(clients):
+        raise RuntimeError("LLM clients could not be initialized; check GOOGLE_API_KEY.")
+    if rate_limits is None:
+        rate_limits = parse_rate_limits(LLM_RATE_LIMITS)
+    clients = tuple(apply_rate_limits(client, rate_limits) for client in clients)
+
+    completed_ids = load_completed_ids(results_path) if resume else set()
+    pending = [item for item in items if item["id"] not in completed_ids]
+    skipped = len(items) - len(pending)
+    if skipped:
+        logging.info(f"Resuming: {skipped} source(s) already completed in {results_path}.")
+
+    writer = _ResultsWriter(results_path)
+    queue: asyncio.Queue = asyncio.Queue()
+    for item in pending:
+        queue.put_nowait(item)
+    summary = {"total": len(items), "skipped": skipped, "succeeded": 0, "duplicates": 0, "failed": 0}
+    batch_start = time.perf_counter()
+
+    async def worker(worker_number: int):
+        while True:
+            try:
+                item = queue.get_nowait()
+            except asyncio.QueueEmpty:
+                return
+            logging.info(f"[worker {worker_number}] Generating '{item['source_title'][:60]}' ({item['id']}).")
+            record = await _process_item(item, clients, generation_options, skip_duplicates)
+            await writer.write(record)
+            summary[{"success": "succeeded", "duplicate": "duplicates"}.get(record["status"], "failed")] += 1
+            done = summary["succeeded"] + summary["duplicates"] + summary["failed"]
+            logging.info(f"[worker {worker_number}] {record['status']} for {item['id']} in {record['elapsed_seconds']}s ({done}/{len(pending)}).")
+
+    worker_count = max(1, min(workers, len(pending))) if pending else 0
+    await asyncio.gather(*(worker(n + 1) for n in range(worker_count)))
+
+    summary["elapsed_seconds"] = round(time.perf_counter() - batch_start, 3)
+    summary["results_path"] = results_path
+    if PANTRY_OUTBOX_ENABLED and os.getenv("PANTRY_ID"):
+        # Give queued uploads a chance to finish before the process exits; the rest resume next run
+        outbox = get_pantry_outbox()
+        if not await outbox.wait_idle(PANTRY_OUTBOX_DRAIN_TIMEOUT):
+            logging.warning(f"Pantry uploads still queued after {PANTRY_OUTBOX_DRAIN_TIMEOUT:.0f}s; they will resume on the next run.")
+        summary["pantry_outbox"] = (await asyncio.to_thread(outbox.status, 0))["counts"]
+    logging.info(f"Batch finished: {summary}")
+    summary["model_pool"] = pool_state() # Per-model breaker state, failures and latency after the run
+    summary["http_transport"] = http_transport_stats()
+    return summary
+
+
+# --- Command Line ---
+def _build_arg_parser() -> argparse.ArgumentParser:
+    parser = argparse.ArgumentParser(description="Generate Persian blog packages for a queue of English sources.")
+    parser.add_argument("input", help="A .jsonl/.json file or a directory of them, with source_title, source_body, source_name, source_url")
+    parser.add_argument("-o", "--output", default=BATCH_RESULTS_FILE, help=f"Results JSONL file (default: {BATCH_RESULTS_FILE})")
+    parser.add_argument("-w", "--workers", type=int, default=BATCH_WORKERS, help=f"Sources processed concurrently (default: {BATCH_WORKERS})")
+    parser.add_argument("--rate-limit", action="append", metavar="MODEL=RPM",
+                        help="Requests per minute for a model ('*' for any other); repeatable. Overrides LLM_RATE_LIMITS.")
+    parser.add_argument("--max-in-flight", type=int, default=None, help="Concurrent LLM calls within one source (default: LLM_MAX_IN_FLIGHT)")
+    parser.add_argument("--no-resume", action="store_true", help="Process every source even if already completed")
+    parser.add_argument("--no-instagram-texts", action="store_true", help="Skip Instagram post texts and video prompt")
+    parser.add_argument("--no-story-teasers", action="store_true", help="Skip Instagram story teasers")
+    parser.add_argument("--iranian-video-prompt", action="store_true", help="Also generate the Iranian Farsi video prompt")
+    parser.add_argument("--allow-duplicates", action="store_true", help="Generate sources even if a near-duplicate was generated before")
+    parser.add_argument("--bypass-cache", action="store_true", help="Ignore cached LLM responses and refresh them")
+    parser.add_argument("--source-digest", action=argparse.BooleanOptionalAction, default=None,
+                        help="Send a condensed source digest to the image/video prompt calls (default: SOURCE_DIGEST_ENABLED)")
+    parser.add_argument("--fuse-image-prompts", action=argparse.BooleanOptionalAction, default=None,
+                        help="Request the four image prompts in one structured call (default: FUSED_IMAGE_PROMPTS)")
+    return parser
+
+
+def main(argv: list[str] | None = None) -> int:
+    args = _build_arg_parser().parse_args(argv)
+    try:
+        rate_limits = parse_rate_limits(args.rate_limit if args.rate_limit else LLM_RATE_LIMITS)
+    except ValueError as e:
+        logging.error(str(e))
+        return 2
+    items = load_batch_items(args.input)
+    if not items:
+        logging.error(f"No usable sources found in {args.input}.")
+        return 1
+    try:
+        summary = asyncio.run(run_batch(
+            items,
+            results_path=args.output,
+            workers=args.workers,
+            rate_limits=rate_limits,
+            resume=not args.no_resume,
+            skip_duplicates=not args.allow_duplicates,
+            include_instagram_texts=not args.no_instagram_texts,
+            include_story_teasers=not args.no_story_teasers,
+            include_iranian_video_prompt=args.iranian_video_prompt,
+            max_in_flight=args.max_in_flight,
+            bypass_cache=args.bypass_cache,
+            use_source_digest=args.source_digest,
+            fuse_image_prompts=args.fuse_image_prompts,
+        ))
+    except RuntimeError as e:
+        logging.error(str(e))
+        return 1
+    print(json.dumps(summary, ensure_ascii=False, indent=2))
+    return 0 if summary["failed"] == 0 else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -1,43 +1,59 @@
 import logging
 import json
-import re
 import os
+import asyncio
 from langchain_openai import ChatOpenAI
 from langchain_core.messages import SystemMessage, HumanMessage
-from .file_utils import save_output_to_file_async, read_prompt_file_async
+from .file_utils import save_output_to_file_async
+from .prompt_registry import get_prompt_template
+from .stage_scheduler import Stage, run_stage_graph
+from .llm_cache import bypass_llm_cache, llm_cache_key, invalidate_llm_response
+from .json_stream import IncrementalJSONObjectParser
+from .tolerant_json import loads_tolerant
+from .tracing import traced
+from .source_digest import (
+    SOURCE_DIGEST_ENABLED, SOURCE_DIGEST_MIN_CHARS, SOURCE_DIGEST_MAX_WORDS,
+    source_hash, get_source_digest_store, build_digest_report
+)
 
 # Configure logging (can be configured centrally if preferred)
 logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
 
-# --- Main Blog Package Generation Function (Modified) ---
-async def generate_persian_blog_package(
+
+# Request the four image prompts in one structured call by default (falls back per prompt)
+FUSED_IMAGE_PROMPTS = os.getenv("FUSED_IMAGE_PROMPTS", "false").strip().lower() in ("1", "true", "yes", "on")
+
+
+class _BlogStageError(Exception):
+    """Raised by the blog stage after it has already saved the failed output; carries the user-facing error."""
+
+
+# --- Blog Content Stage ---
+async def _generate_blog_content(
     llm_blog_client: ChatOpenAI,
-    llm_image_prompt_client: ChatOpenAI,
-    llm_instagram_text_client: ChatOpenAI,
     source_title: str,
     source_body: str,
     source_name: str,
     source_url: str,
-    include_instagram_texts: bool = True,
-    include_story_teasers: bool = True,
-    include_iranian_video_prompt: bool = False
-) -> dict:
-    blog_package_content = {} # This will hold the blog content, meta, tags
-    blog_llm_raw_output = None
-    processed_output = None 
-    blog_thumbnail_image_prompt = "Error: Default blog image prompt."
+    pantry_api_id: str | None,
+    stream: bool = False,
+    on_field=None
+) -> tuple[dict, str]:
+    """
+    Generates and parses the blog JSON. Returns (blog_package_content, raw_output).
+    On any unrecoverable problem the failed output is saved and _BlogStageError is raised.
+
+    With `stream=True` the response is consumed through `astream` and `on_field(key, value)`
+    is called for each top-level JSON field as soon as it is complete (title, slug, tags and
+    keywords arrive well before the long `content` field).
+    """
     realistic_thumbnail_image_prompt = "Error: Default realistic blog image prompt."
     instagram_video_prompt = "Error: Default Instagram video prompt."
-    pantry_api_id = os.getenv("PANTRY_ID")
-    iranian_farsi_video_prompt = "Error: Iranian Farsi video prompt not generated."
-    
-    # Initialize final_package early to avoid UnboundLocalError
-    final_package = {}
 
     # Load prompts from files
     try:
-        system_prompt_blog_generation_template = await read_prompt_file_async("system_prompt_blog_generation.txt")
-        human_prompt_blog_generation_template = await read_prompt_file_async("human_prompt_blog_generation.txt")
+        system_prompt_blog_generation_template = get_prompt_template("system_prompt_blog_generation.txt").text
+        human_prompt_blog_generation_template = get_prompt_template("human_prompt_blog_generation.txt")
 
         # Format prompts with source data
         system_prompt_content = system_prompt_blog_generation_template
@@ -50,440 +66,434 @@ async def generate_persian_blog_package(
 
     except Exception as e:
         logging.exception(f"Error loading or formatting blog generation prompts from files: {e}")
-        return {"error": f"Error loading or formatting prompts: {e}"}
+        raise _BlogStageError(f"Error loading or formatting prompts: {e}")
 
-    try:
-        logging.info(f"Invoking LLM for Blog Content Generation (Source: {source_name}, Title: {source_title[:50]}...).)")
+    logging.info(f"Invoking LLM for Blog Content Generation (Source: {source_name}, Title: {source_title[:50]}...).)")
+    if stream:
+        blog_llm_raw_output, cache_key = await _stream_blog_response(llm_blog_client, messages, on_field)
+    else:
         response = await llm_blog_client.ainvoke(messages)
         blog_llm_raw_output = response.content 
-        
-        if not isinstance(blog_llm_raw_output, str):
-            logging.error(f"LLM response content for blog generation was not a string: {type(blog_llm_raw_output)}")
-            await save_output_to_file_async(
-                raw_blog_output=str(blog_llm_raw_output), # Attempt to convert to string for logging
-                raw_realistic_image_prompt=realistic_thumbnail_image_prompt, # NEW: Pass the realistic image prompt
-                raw_instagram_video_prompt=instagram_video_prompt,
-                error=f"Blog content LLM response was not a string: {type(blog_llm_raw_output)}", 
-                slug='non-string-response-blog',
-                pantry_id=pantry_api_id
-            )
-            return {"error": f"Blog content LLM response was not a string: {type(blog_llm_raw_output)}"}
+        cache_key = llm_cache_key(response)
+    
+    if not isinstance(blog_llm_raw_output, str):
+        logging.error(f"LLM response content for blog generation was not a string: {type(blog_llm_raw_output)}")
+        await save_output_to_file_async(
+            raw_blog_output=str(blog_llm_raw_output), # Attempt to convert to string for logging
+            raw_realistic_image_prompt=realistic_thumbnail_image_prompt,
+            raw_instagram_video_prompt=instagram_video_prompt,
+            error=f"Blog content LLM response was not a string: {type(blog_llm_raw_output)}", 
+            slug='non-string-response-blog',
+            pantry_id=pantry_api_id
+        )
+        raise _BlogStageError(f"Blog content LLM response was not a string: {type(blog_llm_raw_output)}")
 
-        logging.info("LLM for Blog Content Generation successful.")
+    logging.info("LLM for Blog Content Generation successful.")
 
-        processed_output = blog_llm_raw_output.strip()
-        if processed_output.startswith("```json"):
-            processed_output = processed_output[7:]
-        if processed_output.endswith("```"):
-            processed_output = processed_output[:-3]
-        processed_output = processed_output.strip()
+    processed_output = blog_llm_raw_output.strip()
 
-        try:
-            blog_package_content = json.loads(processed_output)
-            logging.info("Successfully parsed JSON response from Blog LLM.")
-            
-            required_keys_blog = ["primary_focus_keyword", "secondary_focus_keyword", "additional_focus_keywords", "title", "seo_title", "slug", "meta_description", "alt_text", "tags", "content"]
-            if not all(key in blog_package_content for key in required_keys_blog):
-                missing_keys = list(set(required_keys_blog) - set(blog_package_content.keys()))
-                logging.error(f"Missing required keys in parsed JSON for blog content: {missing_keys}")
-                await save_output_to_file_async(
-                    raw_blog_output=processed_output, 
-                    raw_realistic_image_prompt=realistic_thumbnail_image_prompt, # NEW: Pass the realistic image prompt
-                    raw_instagram_video_prompt=instagram_video_prompt,
-                    error=f"Blog content JSON missing keys: {missing_keys}", 
-                    slug='json-error-blog',
-                    pantry_id=pantry_api_id # Pass pantry_id
-                )
-                return {"error": f"Blog content LLM response missing keys: {missing_keys}"}
-            
-            if not isinstance(blog_package_content.get('additional_focus_keywords'), list):
-                logging.error(f"Invalid type for 'additional_focus_keywords': expected list")
-                await save_output_to_file_async(
-                    raw_blog_output=processed_output, 
-                    raw_realistic_image_prompt=realistic_thumbnail_image_prompt, # NEW: Pass the realistic image prompt
-                    raw_instagram_video_prompt=instagram_video_prompt,
-                    error="Invalid type for additional_focus_keywords", 
-                    slug='json-type-error-blog',
-                    pantry_id=pantry_api_id # Pass pantry_id
-                )
-                return {"error": "Blog content LLM response has invalid type for additional_focus_keywords"}
-
-            slug = blog_package_content.get('slug')
-            if slug:
-                blog_package_content['filename'] = f"hooshews.com-{slug}.webp" # For blog thumbnail
-            else:
-                blog_package_content['filename'] = "hooshews.com-missing-slug.webp"
-                logging.warning("Slug key missing or empty in blog JSON, using default filename.")
+    try:
+        blog_package_content = loads_tolerant(processed_output)
+        logging.info("Successfully parsed JSON response from Blog LLM.")
+    except json.JSONDecodeError as json_err:
+        logging.error(f"Failed to decode Blog LLM JSON: {json_err}. Raw (first 500 chars): {processed_output[:500]}...")
+        await invalidate_llm_response(cache_key)
+        await save_output_to_file_async(
+            raw_blog_output=processed_output, 
+            raw_realistic_image_prompt=realistic_thumbnail_image_prompt,
+            raw_instagram_video_prompt=instagram_video_prompt,
+            error=f"Blog content JSON decode error: {json_err}", 
+            slug='json-decode-error-blog',
+            pantry_id=pantry_api_id
+        )
+        raise _BlogStageError(f"Could not parse Blog LLM response as JSON: {json_err}")
 
-        except json.JSONDecodeError as json_err:
-            logging.warning(f"Initial JSON parsing failed: {json_err}. Attempting to fix literal newlines in JSON...")
-            
-            # Try to fix literal newlines in JSON string values
-            try:
-                # Step 1: Protect already escaped sequences
-                temp_output = processed_output.replace('\\"', '__TEMP_QUOTE__')
-                temp_output = temp_output.replace('\\n', '__TEMP_NEWLINE__')
-                
-                # Step 2: Find literal newlines inside JSON string values and escape them
-                # This regex finds patterns like "key": "value with\nliteral newline" and fixes them
-                
-                # Replace literal newlines inside string values (between quotes)
-                def fix_newlines_in_strings(match):
-                    full_match = match.group(0)
-                    # Replace literal newlines with \n inside the string value
-                    return full_match.replace('\n', '\\n')
-                
-                # Pattern to match JSON string values that might contain literal newlines
-                # This handles both simple and complex multi-line string values
-                pattern = r'"[^"]*":\s*"(?:[^"\\]|\\.)*(?:\n(?:[^"\\]|\\.)*)*"'
-                temp_output = re.sub(pattern, fix_newlines_in_strings, temp_output, flags=re.MULTILINE | re.DOTALL)
-                
-                # Step 3: Restore protected sequences
-                temp_output = temp_output.replace('__TEMP_NEWLINE__', '\\n')
-                temp_output = temp_output.replace('__TEMP_QUOTE__', '\\"')
-                
-                # Step 4: Remove any trailing commas
-                temp_output = re.sub(r',(\s*[}\]])', r'\1', temp_output)
-                
-                logging.info(f"Fixed JSON (first 500 chars): {temp_output[:500]}...")
-                
-                blog_package_content = json.loads(temp_output)
-                logging.info("Successfully parsed JSON after fixing literal newlines.")
-                
-            except json.JSONDecodeError as json_err2:
-                logging.error(f"Failed to decode JSON even after newline fixes: {json_err2}. Raw (first 500 chars): {processed_output[:500]}...")
-                await save_output_to_file_async(
-                    raw_blog_output=processed_output, 
-                    raw_realistic_image_prompt=realistic_thumbnail_image_prompt, # NEW: Pass the realistic image prompt
-                    raw_instagram_video_prompt=instagram_video_prompt,
-                    error=f"Blog content JSON decode error: {json_err2}", 
-                    slug='json-decode-error-blog',
-                    pantry_id=pantry_api_id
-                )
-                return {"error": f"Could not parse Blog LLM response as JSON: {json_err2}"}
-            except Exception as fix_err:
-                logging.error(f"Error while trying to fix JSON: {fix_err}. Raw (first 500 chars): {processed_output[:500]}...")
-                await save_output_to_file_async(
-                    raw_blog_output=processed_output, 
-                    raw_realistic_image_prompt=realistic_thumbnail_image_prompt, # NEW: Pass the realistic image prompt
-                    raw_instagram_video_prompt=instagram_video_prompt,
-                    error=f"Blog content JSON fix error: {fix_err}", 
-                    slug='json-fix-error-blog',
-                    pantry_id=pantry_api_id
-                )
-                return {"error": f"Error while fixing Blog LLM JSON: {fix_err}"}
-        
-        # Initialize the final package with the blog content
-        final_package = {**blog_package_content} # Start with content, meta, tags
+    if not isinstance(blog_package_content, dict):
+        logging.error(f"Blog LLM JSON was not an object: {type(blog_package_content)}")
+        await invalidate_llm_response(cache_key)
+        await save_output_to_file_async(
+            raw_blog_output=processed_output, 
+            raw_realistic_image_prompt=realistic_thumbnail_image_prompt,
+            raw_instagram_video_prompt=instagram_video_prompt,
+            error=f"Blog content JSON was not an object: {type(blog_package_content)}", 
+            slug='json-type-error-blog',
+            pantry_id=pantry_api_id
+        )
+        raise _BlogStageError(f"Blog content LLM response was not a JSON object: {type(blog_package_content)}")
+    
+    required_keys_blog = ["primary_focus_keyword", "secondary_focus_keyword", "additional_focus_keywords", "title", "seo_title", "slug", "meta_description", "alt_text", "tags", "content"]
+    if not all(key in blog_package_content for key in required_keys_blog):
+        missing_keys = list(set(required_keys_blog) - set(blog_package_content.keys()))
+        logging.error(f"Missing required keys in parsed JSON for blog content: {missing_keys}")
+        await invalidate_llm_response(cache_key)
+        await save_output_to_file_async(
+            raw_blog_output=processed_output, 
+            raw_realistic_image_prompt=realistic_thumbnail_image_prompt,
+            raw_instagram_video_prompt=instagram_video_prompt,
+            error=f"Blog content JSON missing keys: {missing_keys}", 
+            slug='json-error-blog',
+            pantry_id=pantry_api_id # Pass pantry_id
+        )
+        raise _BlogStageError(f"Blog content LLM response missing keys: {missing_keys}")
+    
+    if not isinstance(blog_package_content.get('additional_focus_keywords'), list):
+        logging.error(f"Invalid type for 'additional_focus_keywords': expected list")
+        await invalidate_llm_response(cache_key)
+        await save_output_to_file_async(
+            raw_blog_output=processed_output, 
+            raw_realistic_image_prompt=realistic_thumbnail_image_prompt,
+            raw_instagram_video_prompt=instagram_video_prompt,
+            error="Invalid type for additional_focus_keywords", 
+            slug='json-type-error-blog',
+            pantry_id=pantry_api_id # Pass pantry_id
+        )
+        raise _BlogStageError("Blog content LLM response has invalid type for additional_focus_keywords")
+
+    slug = blog_package_content.get('slug')
+    if slug:
+        blog_package_content['filename'] = f"hooshews.com-{slug}.webp" # For blog thumbnail
+    else:
+        blog_package_content['filename'] = "hooshews.com-missing-slug.webp"
+        logging.warning("Slug key missing or empty in blog JSON, using default filename.")
+
+    return blog_package_content, blog_llm_raw_output
+
+
+async def _stream_blog_response(llm_blog_client: ChatOpenAI, messages: list, on_field=None):
+    """Streams the blog response, reporting completed top-level JSON fields. Returns (full raw text, cache key)."""
+    parser = IncrementalJSONObjectParser()
+    non_text_chunks = []
+    cache_key = None
+    async for chunk in llm_blog_client.astream(messages):
+        cache_key = cache_key or llm_cache_key(chunk)
+        if not isinstance(chunk.content, str):
+            non_text_chunks.append(chunk.content)
+            continue
+        for key, value in parser.feed(chunk.content):
+            logging.info(f"Blog field '{key}' received while streaming ({len(parser.text)} chars so far).")
+            if on_field is not None:
+                try:
+                    on_field(key, value)
+                except Exception as cb_err:
+                    logging.warning(f"Blog field callback failed for '{key}': {cb_err}")
+    if non_text_chunks and not parser.text:
+        return non_text_chunks, cache_key # Let the caller's non-string check report it
+    return parser.text, cache_key
+
+
+# --- Blog Analysis Stage (shared by Instagram texts and Iranian video prompt) ---
+async def _run_blog_analysis_stage(llm_instagram_text_client: ChatOpenAI, blog_package_content: dict) -> dict:
+    if not blog_package_content.get('content'):
+        logging.info("Blog analysis for Instagram/Iranian video skipped (missing blog content). ")
+        return {"error": "Blog analysis skipped or missing data.", "derived_blog_topic": "", "derived_key_takeaways": [], "derived_core_emotion": "", "derived_cta_word": ""}
+    try:
+        logging.info("Starting blog analysis for Instagram/Iranian video inputs...")
+        derived_insta_inputs = await analyze_blog_for_instagram_inputs(
+            llm_client=llm_instagram_text_client, 
+            blog_title=blog_package_content.get('title', ''),
+            blog_content=blog_package_content.get('content', '')
+        )
+        logging.info(f"Blog analysis successful. Derived inputs: {derived_insta_inputs}")
+        return derived_insta_inputs
+    except Exception as analysis_e:
+        logging.exception(f"An unexpected error occurred during blog analysis: {analysis_e}")
+        return {"error": f"Unexpected error during blog analysis: {analysis_e}", "derived_blog_topic": "", "derived_key_takeaways": [], "derived_core_emotion": "", "derived_cta_word": ""}
 
-        # Generate BOTH image prompts (blog thumbnail and Instagram post image)
-        # These are added to the final_package but are generated by different prompts/logic
-        if llm_image_prompt_client:
-            if source_title and source_body: 
-                # Generate artistic blog thumbnail image prompt
-                blog_thumbnail_image_prompt = await generate_image_prompt( # For blog thumbnail
-                    llm_client=llm_image_prompt_client,
-                    header=source_title, # Use original source_title for blog thumbnail context
-                    description=source_body # Use original source_body for blog thumbnail context
-                )
-                final_package['image_prompt'] = blog_thumbnail_image_prompt # Blog thumbnail prompt
-
-                # Generate realistic blog thumbnail image prompt
-                realistic_thumbnail_image_prompt = await generate_realistic_image_prompt( # For realistic blog thumbnail
-                    llm_client=llm_image_prompt_client,
-                    header=source_title, # Use original source_title for realistic thumbnail context
-                    description=source_body # Use original source_body for realistic thumbnail context
-                )
-                final_package['realistic_image_prompt'] = realistic_thumbnail_image_prompt # Realistic blog thumbnail prompt
-
-                # Always generate static Instagram image prompt
-                instagram_static_image_prompt = await generate_instagram_image_prompt( # For Instagram post image (static)
-                    llm_client=llm_image_prompt_client,
-                    header=source_title, # Can also use source_title for context here
-                    description=source_body # Or specific snippets if preferred later
-                )
-                final_package['instagram_static_image_prompt'] = instagram_static_image_prompt
-
-                # Always generate video-ready Instagram image prompt
-                instagram_video_ready_image_prompt = await generate_instagram_image_prompt_for_video( # For Instagram post image (video-ready)
-                    llm_client=llm_image_prompt_client,
-                    header=source_title, # Can also use source_title for context here
-                    description=source_body # Or specific snippets if preferred later
-                )
-                final_package['instagram_video_ready_image_prompt'] = instagram_video_ready_image_prompt
-            else:
-                final_package['image_prompt'] = "Error: Missing source for blog image prompt."
-                final_package['realistic_image_prompt'] = "Error: Missing source for realistic blog image prompt."
-                final_package['instagram_static_image_prompt'] = "Error: Missing source for Instagram static image prompt."
-                final_package['instagram_video_ready_image_prompt'] = "Error: Missing source for Instagram video-ready image prompt."
-                logging.warning("Missing source_title or source_body for image prompt generation.")
-        else:
-            final_package['image_prompt'] = "Error: Blog image prompt LLM client not available."
-            final_package['realistic_image_prompt'] = "Error: Realistic blog image prompt LLM client not available."
-            final_package['instagram_static_image_prompt'] = "Error: Instagram static image prompt LLM client not available."
-            final_package['instagram_video_ready_image_prompt'] = "Error: Instagram video-ready image prompt LLM client not available."
-            logging.error("Skipping image prompt generation; llm_image_prompt_client was None.")
-        
-        # --- NEW: Perform blog analysis for Instagram and Iranian video if needed ---
-        derived_insta_inputs = {}
-        if (include_instagram_texts or include_iranian_video_prompt) and llm_instagram_text_client and blog_package_content.get('content'):
-            try:
-                logging.info("Starting blog analysis for Instagram/Iranian video inputs...")
-                
-                derived_insta_inputs = await analyze_blog_for_instagram_inputs(
-                    llm_client=llm_instagram_text_client, 
-                    blog_title=blog_package_content.get('title', ''),
-                    blog_content=blog_package_content.get('content', '')
-                )
-                logging.info(f"Blog analysis successful. Derived inputs: {derived_insta_inputs}")
-
-            except Exception as analysis_e:
-                logging.exception(f"An unexpected error occurred during blog analysis: {analysis_e}")
-                derived_insta_inputs = {"error": f"Unexpected error during blog analysis: {analysis_e}", "derived_blog_topic": "", "derived_key_takeaways": [], "derived_core_emotion": "", "derived_cta_word": ""}
-        else:
-            logging.info("Blog analysis for Instagram/Iranian video skipped (not requested or missing data/LLM). ")
-            derived_insta_inputs = {"error": "Blog analysis skipped or missing data.", "derived_blog_topic": "", "derived_key_takeaways": [], "derived_core_emotion": "", "derived_cta_word": ""}
-
-
-        # --- Conditionally Generate Instagram Texts ---
-        # Only run this section if include_instagram_texts is True
-        if include_instagram_texts:
-            try:
-                logging.info("Starting Instagram text generation...")
-                # Use derived_insta_inputs from the common analysis block
-                if not derived_insta_inputs.get("error") and derived_insta_inputs.get("derived_blog_topic"):
-                    # Ensure derived_key_takeaways is a list of strings
-                    derived_key_takeaways_for_insta = [str(item) for item in derived_insta_inputs.get("derived_key_takeaways", []) if isinstance(item, (str, int, float, bool))]
-
-                    # Load prompts for Instagram post texts
-                    system_prompt_instagram_texts_template = await read_prompt_file_async("system_prompt_instagram_texts.txt")
-                    human_prompt_instagram_texts_template = await read_prompt_file_async("human_prompt_instagram_texts.txt")
-
-                    takeaways_formatted_for_insta = "\n".join([f"    * {point}" for point in derived_key_takeaways_for_insta])
-
-                    human_prompt_content_insta = human_prompt_instagram_texts_template.format(
-                        derived_blog_topic=derived_insta_inputs.get("derived_blog_topic", ""),
-                        takeaways_formatted=takeaways_formatted_for_insta,
-                        derived_cta_word=derived_insta_inputs.get("derived_cta_word", ""),
-                        derived_core_emotion=derived_insta_inputs.get("derived_core_emotion", "")
-                    )
-
-                    messages_insta = [
-                        SystemMessage(content=system_prompt_instagram_texts_template),
-                        HumanMessage(content=human_prompt_content_insta)
-                    ]
-
-                    response_insta = await llm_instagram_text_client.ainvoke(messages_insta)
-                    raw_output_insta = response_insta.content
-
-                    if isinstance(raw_output_insta, str):
-                        insta_texts = {} # Initialize in this scope
-                        cleaned_output_insta = raw_output_insta.strip()
-                        if cleaned_output_insta.startswith("```json") or cleaned_output_insta.startswith("```"):
-                            cleaned_output_insta = cleaned_output_insta[cleaned_output_insta.find("{"):cleaned_output_insta.rfind("}") + 1]
-                        
-                        try:
-                            insta_texts = json.loads(cleaned_output_insta)
-                        except json.JSONDecodeError as jde:
-                            logging.warning(f"JSON parsing failed for Instagram texts after ALL cleaning attempts ({str(jde)}). Raw cleaned output: {cleaned_output_insta[:200]}...")
-                            title_match = re.search(r'"instagram_post_title":\s*"(.*?)"', cleaned_output_insta, re.DOTALL)
-                            caption_match = re.search(r'"instagram_post_caption":\s*"(.*?)"', cleaned_output_insta, re.DOTALL)
-                            if title_match and caption_match:
-                                insta_texts = {
-                                    "instagram_post_title": title_match.group(1).strip(),
-                                    "instagram_post_caption": caption_match.group(1).strip()
-                                }
-                                logging.info("Successfully extracted Instagram texts using fallback regex.")
-                            else:
-                                logging.error(f"Could not parse Instagram texts with regex fallback. Title match: {bool(title_match)}, Caption match: {bool(caption_match)}. Raw: {cleaned_output_insta[:200]}")
-                                insta_texts = {"error": "Could not parse Instagram texts from LLM (regex fallback failed)"}
-                        except Exception as e:
-                            logging.error(f"An unexpected error occurred during Instagram text parsing: {e}")
-                            insta_texts = {"error": f"Instagram text parsing failed - {e}"}
-
-                    if insta_texts.get("error"):
-                        logging.error(f"Error during Instagram text generation: {insta_texts.get('error')}")
-                        final_package['instagram_post_title'] = f"Error: Instagram text generation failed - {insta_texts.get('error')}"
-                        final_package['instagram_post_caption'] = f"Error: Instagram text generation failed - {insta_texts.get('error')}"
-                        final_package['instagram_video_prompt'] = "Instagram video prompt not generated (Instagram texts disabled by user)."
-                    else:
-                        logging.info("Instagram text generation complete.")
-                        final_package['instagram_post_title'] = insta_texts.get('instagram_post_title')
-                        final_package['instagram_post_caption'] = insta_texts.get('instagram_post_caption')
-                        
-                        if llm_image_prompt_client and insta_texts.get('instagram_post_caption'): # Simplified check
-                            try:
-                                logging.info("Starting Instagram video prompt generation...")
-                                instagram_video_prompt = await generate_instagram_video_prompt(
-                                    llm_client=llm_image_prompt_client,
-                                    header=source_title,
-                                    description=source_body,
-                                            instagram_caption=insta_texts.get('instagram_post_caption', "")
-                                )
-                                final_package['instagram_video_prompt'] = instagram_video_prompt
-                                logging.info("Instagram video prompt generation complete.")
-                            except Exception as video_prompt_e:
-                                logging.exception(f"Error during Instagram video prompt generation: {video_prompt_e}")
-                                final_package['instagram_video_prompt'] = f"Error generating Instagram video prompt: {video_prompt_e}"
-                        else:
-                            final_package['instagram_video_prompt'] = "Error: Missing required data for Instagram video prompt generation (Instagram texts enabled)."
-                            logging.warning("Skipping Instagram video prompt generation due to missing requirements (Instagram texts enabled).")
 
-                else:
-                    # This else corresponds to 'if not derived_insta_inputs.get("error") and derived_insta_inputs.get("derived_blog_topic"):'
-                    final_package['instagram_post_title'] = "Error: Instagram text generation skipped due to blog analysis error or missing data."
-                    final_package['instagram_post_caption'] = "Error: Instagram text generation skipped due to blog analysis error or missing data."
-                    final_package['instagram_video_prompt'] = "Instagram video prompt not generated (blog analysis failed or texts disabled)."
-                    logging.warning("Instagram text generation skipped due to blog analysis error or missing data.")
-
-            except Exception as insta_gen_e:
-                logging.exception(f"An unexpected error occurred during Instagram text generation: {insta_gen_e}")
-                final_package['instagram_post_title'] = f"Error: Instagram text generation failed - {insta_gen_e}"
-                final_package['instagram_post_caption'] = f"Error: Instagram text generation failed - {insta_gen_e}"
-                final_package['instagram_video_prompt'] = "Instagram video prompt not generated (Instagram texts disabled by user)."
-
-        # If Instagram texts were not generated because include_instagram_texts is False, set default error messages
-        if not include_instagram_texts:
-            final_package['instagram_post_title'] = "Instagram post title not generated (disabled by user)."
-            final_package['instagram_post_caption'] = "Instagram post caption not generated (disabled by user)."
-            final_package['instagram_video_prompt'] = "Instagram video prompt not generated (Instagram texts disabled by user)."
-                
-        # --- Conditionally Generate Instagram Story Teasers ---
-        # Only run this section if include_story_teasers is True and LLM client is available and blog content is available
-        if include_story_teasers and llm_instagram_text_client and blog_package_content.get('content'):
-            try:
-                logging.info("Starting Instagram Story teaser generation...")
-                # Load prompts for Instagram story teasers
-                system_prompt_story_template = await read_prompt_file_async("system_prompt_instagram_story_teasers.txt")
-                human_prompt_story_template = await read_prompt_file_async("human_prompt_instagram_story_teasers.txt")
-
-                human_prompt_content_story = human_prompt_story_template.format(
-                    blog_content=blog_package_content.get('content', '')
-                )
-
-                messages_story = [
-                    SystemMessage(content=system_prompt_story_template),
-                    HumanMessage(content=human_prompt_content_story)
-                ]
-
-                response_story = await llm_instagram_text_client.ainvoke(messages_story)
-                raw_output_story = response_story.content
-
-                if isinstance(raw_output_story, str):
-                    story_teasers_result = {} # Initialize in this scope
-                    story_teasers_result["raw_output"] = raw_output_story
-                    logging.info(f"LLM for Instagram Story Teasers successful. Raw output: {raw_output_story[:200]}...")
-
-                    try:
-                        cleaned_output_story = raw_output_story.strip()
-                        if cleaned_output_story.startswith("```json"):
-                            cleaned_output_story = cleaned_output_story[7:]
-                        if cleaned_output_story.endswith("```"):
-                            cleaned_output_story = cleaned_output_story[:-3]
-                        cleaned_output_story = cleaned_output_story.strip()
-
-                        parsed_json_story = json.loads(cleaned_output_story)
-                        story_teasers_result["story_main_title"] = parsed_json_story.get("story_main_title", "Error: Missing main title")
-                        story_teasers_result["story_subtitle"] = parsed_json_story.get("story_subtitle", "Error: Missing subtitle")
-                        story_teasers_result["story_body_text"] = parsed_json_story.get("story_body_text", "Error: Missing body text")
-                        if not (parsed_json_story.get("story_main_title") and parsed_json_story.get("story_subtitle") and parsed_json_story.get("story_body_text")):
-                            story_teasers_result["error"] = "One or more required fields missing in story teaser JSON."
-                            logging.error(f"Story Teaser JSON missing fields. Parsed: {parsed_json_story}")
-                    except json.JSONDecodeError as e:
-                        logging.error(f"Failed to decode JSON from Story Teaser LLM: {e}. Raw: {raw_output_story}")
-                        story_teasers_result["error"] = f"Could not parse Story Teaser LLM response as JSON: {e}"
-                        title_match = re.search(r'"story_main_title":\s*"(.*?)"', raw_output_story, re.DOTALL)
-                        subtitle_match = re.search(r'"story_subtitle":\s*"(.*?)"', raw_output_story, re.DOTALL)
-                        body_match = re.search(r'"story_body_text":\s*"(.*?)"', raw_output_story, re.DOTALL)
-
-                        if title_match:
-                            story_teasers_result["story_main_title"] = title_match.group(1).strip()
-                        else:
-                            story_teasers_result["story_main_title"] = "Error: Could not extract main title (regex)"
-                        
-                        if subtitle_match:
-                            story_teasers_result["story_subtitle"] = subtitle_match.group(1).strip()
-                        else:
-                            story_teasers_result["story_subtitle"] = "Error: Could not extract subtitle (regex)"
-
-                        if body_match:
-                            story_teasers_result["story_body_text"] = body_match.group(1).strip()
-                        else:
-                            story_teasers_result["story_body_text"] = "Error: Could not extract body text (regex)"
-                        
-                        if not (title_match and subtitle_match and body_match):
-                            logging.warning("Fallback regex extraction for story teasers failed or was incomplete.")
-                            current_error = story_teasers_result.get("error", "")
-                            story_teasers_result["error"] = f"{current_error} | Regex extraction also failed or incomplete.".strip(" | ")
-                        else:
-                            logging.info("Successfully extracted story teaser fields using fallback regex.")
-                            story_teasers_result["error"] = None 
-                else:
-                    logging.error(f"LLM response content for Instagram story teasers was not a string: {type(raw_output_story)}")
-                    story_teasers_result = {"error": "LLM response content for Instagram story teasers not string.", "story_main_title": "Error: Generation failed (non-string output)", "story_subtitle": "Error: Generation failed (non-string output)", "story_body_text": "Error: Generation failed (non-string output)"}
-                final_package['instagram_story_teasers'] = story_teasers_result
-                logging.info("Instagram Story teaser generation complete.")
-
-            except Exception as insta_story_gen_e:
-                logging.exception(f"An unexpected error occurred during Instagram Story teaser generation: {insta_story_gen_e}")
-                final_package['instagram_story_teasers'] = {"error": f"Error generating Instagram Story teasers: {insta_story_gen_e}"}
-
-        elif not include_story_teasers:
-             logging.info("Instagram Story teaser generation skipped by user.")
-             final_package['instagram_story_teasers'] = {"error": "Instagram Story teaser generation skipped by user."}
-        elif not llm_instagram_text_client:
-             logging.warning("Skipping Instagram Story teaser generation; llm_instagram_text_client was None.")
-             final_package['instagram_story_teasers'] = {"error": "Instagram text LLM client not available for story teasers."}
-        elif not blog_package_content.get('content'):
-             logging.warning("Skipping Instagram Story teaser generation; blog content not available.")
-             final_package['instagram_story_teasers'] = {"error": "Blog content not available for story teasers."}
-
-        # --- NEW: Conditionally Generate Iranian Farsi Video Prompt ---
-        # Use derived_insta_inputs for blog_topic and key_takeaways
-        if include_iranian_video_prompt and llm_instagram_text_client and not derived_insta_inputs.get("error") and derived_insta_inputs.get("derived_blog_topic"):
-            try:
-                logging.info("Starting Iranian Farsi video prompt generation...")
-                # Load prompts for Iranian Farsi video
-                system_prompt_iranian_video_template = await read_prompt_file_async("system_prompt_iranian_video.txt")
-                human_prompt_iranian_video_template = await read_prompt_file_async("human_prompt_iranian_video.txt")
-
-                # Ensure key_takeaways is a list of strings for formatting
-                key_takeaways_for_iranian_video = [str(item) for item in derived_insta_inputs.get("derived_key_takeaways", []) if isinstance(item, (str, int, float, bool))]
-                key_takeaways_formatted_for_iranian_video = "\n".join([f"    * {point}" for point in key_takeaways_for_iranian_video])
-
-                human_prompt_content_iranian_video = human_prompt_iranian_video_template.format(
-                    blog_topic=derived_insta_inputs.get("derived_blog_topic", ""),
-                    key_takeaways_formatted=key_takeaways_formatted_for_iranian_video
-                )
-
-                messages_iranian_video = [
-                    SystemMessage(content=system_prompt_iranian_video_template),
-                    HumanMessage(content=human_prompt_content_iranian_video)
-                ]
-
-                response_iranian_video = await llm_instagram_text_client.ainvoke(messages_iranian_video)
-                prompt_output_iranian_video = response_iranian_video.content
-
-                if isinstance(prompt_output_iranian_video, str):
-                    iranian_farsi_video_prompt = prompt_output_iranian_video.strip()
-                    logging.info("Iranian Farsi Video Prompt LLM invocation successful.")
-                else:
-                    logging.error(f"LLM response content for Iranian Farsi video prompt was not a string: {type(prompt_output_iranian_video)}")
-                    iranian_farsi_video_prompt = "Error: LLM response content for Iranian Farsi video prompt not string."
-
-                final_package['iranian_farsi_video_prompt'] = iranian_farsi_video_prompt
-            except Exception as iranian_video_e:
-                logging.exception(f"Error during Iranian Farsi video prompt generation: {iranian_video_e}")
-                final_package['iranian_farsi_video_prompt'] = f"Error generating Iranian Farsi video prompt: {iranian_video_e}"
-        elif not include_iranian_video_prompt:
-            logging.info("Iranian Farsi video prompt generation skipped by user.")
-            final_package['iranian_farsi_video_prompt'] = "Iranian Farsi video prompt not generated (disabled by user)."
-        elif not llm_instagram_text_client:
+# --- Instagram Texts Stage ---
+async def _run_instagram_texts_stage(llm_instagram_text_client: ChatOpenAI, derived_insta_inputs: dict) -> dict:
+    """Returns the Instagram title/caption fields; on failure also fills 'instagram_video_prompt' with the reason."""
+    try:
+        logging.info("Starting Instagram text generation...")
+        if derived_insta_inputs.get("error") or not derived_insta_inputs.get("derived_blog_topic"):
+            logging.warning("Instagram text generation skipped due to blog analysis error or missing data.")
+            return {
+                'instagram_post_title': "Error: Instagram text generation skipped due to blog analysis error or missing data.",
+                'instagram_post_caption': "Error: Instagram text generation skipped due to blog analysis error or missing data.",
+                'instagram_video_prompt': "Instagram video prompt not generated (blog analysis failed or texts disabled)."
+            }
+
+        # Ensure derived_key_takeaways is a list of strings
+        derived_key_takeaways_for_insta = [str(item) for item in derived_insta_inputs.get("derived_key_takeaways", []) if isinstance(item, (str, int, float, bool))]
+        insta_texts = await generate_instagram_post_texts(
+            llm_client=llm_instagram_text_client,
+            derived_blog_topic=derived_insta_inputs.get("derived_blog_topic", ""),
+            derived_key_takeaways=derived_key_takeaways_for_insta,
+            derived_cta_word=derived_insta_inputs.get("derived_cta_word", ""),
+            derived_core_emotion=derived_insta_inputs.get("derived_core_emotion", "")
+        )
+        if not isinstance(insta_texts, dict) or insta_texts.get("error"):
+            error_detail = insta_texts.get("error") if isinstance(insta_texts, dict) else f"unexpected result type {type(insta_texts)}"
+            logging.error(f"Error during Instagram text generation: {error_detail}")
+            return {
+                'instagram_post_title': f"Error: Instagram text generation failed - {error_detail}",
+                'instagram_post_caption': f"Error: Instagram text generation failed - {error_detail}",
+                'instagram_video_prompt': "Instagram video prompt not generated (Instagram texts disabled by user)."
+            }
+
+        logging.info("Instagram text generation complete.")
+        return {
+            'instagram_post_title': insta_texts.get('instagram_post_title'),
+            'instagram_post_caption': insta_texts.get('instagram_post_caption')
+        }
+    except Exception as insta_gen_e:
+        logging.exception(f"An unexpected error occurred during Instagram text generation: {insta_gen_e}")
+        return {
+            'instagram_post_title': f"Error: Instagram text generation failed - {insta_gen_e}",
+            'instagram_post_caption': f"Error: Instagram text generation failed - {insta_gen_e}",
+            'instagram_video_prompt': "Instagram video prompt not generated (Instagram texts disabled by user)."
+        }
+
+
+# --- Instagram Video Prompt Stage ---
+def _instagram_video_prompt_ready(llm_image_prompt_client: ChatOpenAI, insta_texts: dict) -> bool:
+    """True if the Instagram video prompt stage will call the LLM for these Instagram texts."""
+    return bool('instagram_video_prompt' not in insta_texts and llm_image_prompt_client and insta_texts.get('instagram_post_caption'))
+
+
+async def _run_instagram_video_prompt_stage(llm_image_prompt_client: ChatOpenAI, source_title: str, source_body: str, insta_texts: dict) -> str:
+    if 'instagram_video_prompt' in insta_texts:
+        return insta_texts['instagram_video_prompt'] # Texts failed; reason already recorded
+    if not _instagram_video_prompt_ready(llm_image_prompt_client, insta_texts):
+        logging.warning("Skipping Instagram video prompt generation due to missing requirements (Instagram texts enabled).")
+        return "Error: Missing required data for Instagram video prompt generation (Instagram texts enabled)."
+    try:
+        logging.info("Starting Instagram video prompt generation...")
+        instagram_video_prompt = await generate_instagram_video_prompt(
+            llm_client=llm_image_prompt_client,
+            header=source_title,
+            description=source_body,
+            instagram_caption=insta_texts.get('instagram_post_caption', "")
+        )
+        logging.info("Instagram video prompt generation complete.")
+        return instagram_video_prompt
+    except Exception as video_prompt_e:
+        logging.exception(f"Error during Instagram video prompt generation: {video_prompt_e}")
+        return f"Error generating Instagram video prompt: {video_prompt_e}"
+
+
+# --- Iranian Farsi Video Prompt Stage ---
+async def _run_iranian_video_prompt_stage(llm_instagram_text_client: ChatOpenAI, derived_insta_inputs: dict) -> str:
+    if derived_insta_inputs.get("error") or not derived_insta_inputs.get("derived_blog_topic"):
+        logging.warning("Skipping Iranian Farsi video prompt generation; blog analysis failed or missing data.")
+        return "Error: Blog analysis data not available for Iranian Farsi video prompt."
+    return await generate_iranian_farsi_video_prompt(
+        llm_client=llm_instagram_text_client,
+        blog_topic=derived_insta_inputs.get("derived_blog_topic", ""),
+        key_takeaways=derived_insta_inputs.get("derived_key_takeaways", [])
+    )
+
+
+# --- Instagram Story Teasers Stage ---
+async def _run_story_teasers_stage(llm_instagram_text_client: ChatOpenAI, blog_package_content: dict) -> dict:
+    if not blog_package_content.get('content'):
+        logging.warning("Skipping Instagram Story teaser generation; blog content not available.")
+        return {"error": "Blog content not available for story teasers."}
+    try:
+        story_teasers_result = await generate_instagram_story_teasers(
+            llm_client=llm_instagram_text_client,
+            blog_content=blog_package_content.get('content', '')
+        )
+        logging.info("Instagram Story teaser generation complete.")
+        return story_teasers_result
+    except Exception as insta_story_gen_e:
+        logging.exception(f"An unexpected error occurred during Instagram Story teaser generation: {insta_story_gen_e}")
+        return {"error": f"Error generating Instagram Story teasers: {insta_story_gen_e}"}
+
+
+# --- Main Blog Package Generation Function (Stage Graph) ---
+@traced("generate_persian_blog_package")
+async def generate_persian_blog_package(
+    llm_blog_client: ChatOpenAI,
+    llm_image_prompt_client: ChatOpenAI,
+    llm_instagram_text_client: ChatOpenAI,
+    source_title: str,
+    source_body: str,
+    source_name: str,
+    source_url: str,
+    include_instagram_texts: bool = True,
+    include_story_teasers: bool = True,
+    include_iranian_video_prompt: bool = False,
+    max_in_flight: int | None = None,
+    bypass_cache: bool = False,
+    stream_blog: bool = False,
+    on_blog_field=None,
+    use_source_digest: bool | None = None,
+    fuse_image_prompts: bool | None = None,
+    on_stage_event=None
+) -> dict:
+    """
+    Generates the full Persian blog package.
+
+    Every LLM call is a stage in a dependency graph and starts as soon as its inputs exist:
+    the four image prompts only need the source and run alongside the blog call, story teasers
+    wait for the blog, and Instagram texts / Iranian video wait for the blog analysis.
+    `max_in_flight` caps concurrent LLM calls (defaults to LLM_MAX_IN_FLIGHT or 4).
+    `bypass_cache=True` skips the LLM response cache for this run and refreshes its entries.
+
+    `stream_blog=True` streams the blog call and calls `on_blog_field(key, value)` as each JSON
+    field completes (for partial rendering).
+
+    `use_source_digest=True` (default: SOURCE_DIGEST_ENABLED) condenses the source once and sends that
+    digest, instead of the full body, to the image and video prompt calls; the package then carries a
+    `source_digest_report` comparing bytes/tokens sent with and without it.
+
+    `fuse_image_prompts=True` (default: FUSED_IMAGE_PROMPTS) asks for all four image prompts in a single
+    JSON call; any prompt missing from that response is generated by its own call as usual.
+
+    `on_stage_event`, if given, receives the stage graph's progress events (see `run_stage_graph`).
+    """
+    if use_source_digest is None:
+        use_source_digest = SOURCE_DIGEST_ENABLED
+    if fuse_image_prompts is None:
+        fuse_image_prompts = FUSED_IMAGE_PROMPTS
+    blog_llm_raw_output = None
+    blog_thumbnail_image_prompt = "Error: Default blog image prompt."
+    realistic_thumbnail_image_prompt = "Error: Default realistic blog image prompt."
+    pantry_api_id = os.getenv("PANTRY_ID")
+    # Stored with the saved package so later sources can be checked against it for near-duplicates
+    source_record = {"title": source_title, "body": source_body, "name": source_name, "url": source_url}
+    
+    # Initialize final_package early to avoid UnboundLocalError
+    final_package = {}
+
+    # Image prompt stages only need the source, so work out up front whether they can run
+    can_generate_image_prompts = bool(llm_image_prompt_client and source_title and source_body)
+    if not llm_image_prompt_client:
+        logging.error("Skipping image prompt generation; llm_image_prompt_client was None.")
+    elif not (source_title and source_body):
+        logging.warning("Missing source_title or source_body for image prompt generation.")
+
+    def image_skip_result(missing_source_msg: str, no_client_msg: str) -> str:
+        return missing_source_msg if llm_image_prompt_client else no_client_msg
+
+    # Calls that were sent the source digest (or the full source), for the digest report
+    digest_consumers = []
+
+    def image_prompt_stage(package_key, generator):
+        async def run(inputs):
+            fused_prompt = inputs["fused_image_prompts"].get(package_key)
+            if fused_prompt:
+                return fused_prompt
+            digest_consumers.append(package_key)
+            return await generator(
+                llm_client=llm_image_prompt_client,
+                header=source_title, # Use original source title/body (or its digest) for image prompt context
+                description=inputs["source_digest"]["description"]
+            )
+        return run
+
+    async def fused_image_prompts_stage(inputs):
+        digest_consumers.append("fused_image_prompts") # One call for all four prompts
+        return await generate_fused_image_prompts(llm_image_prompt_client, source_title, inputs["source_digest"]["description"])
+
+    async def source_digest_stage(_inputs):
+        return await generate_source_digest(llm_instagram_text_client or llm_image_prompt_client, source_title, source_body)
+
+    async def blog_stage(_inputs):
+        return await _generate_blog_content(llm_blog_client, source_title, source_body, source_name, source_url, pantry_api_id,
+                                            stream=stream_blog, on_field=on_blog_field)
+
+    async def analysis_stage(inputs):
+        return await _run_blog_analysis_stage(llm_instagram_text_client, inputs["blog"][0])
+
+    async def instagram_texts_stage(inputs):
+        return await _run_instagram_texts_stage(llm_instagram_text_client, inputs["analysis"])
+
+    async def instagram_video_prompt_stage(inputs):
+        if _instagram_video_prompt_ready(llm_image_prompt_client, inputs["instagram_texts"]):
+            digest_consumers.append("instagram_video_prompt")
+        return await _run_instagram_video_prompt_stage(llm_image_prompt_client, source_title, inputs["source_digest"]["description"], inputs["instagram_texts"])
+
+    async def story_teasers_stage(inputs):
+        return await _run_story_teasers_stage(llm_instagram_text_client, inputs["blog"][0])
+
+    async def iranian_video_stage(inputs):
+        return await _run_iranian_video_prompt_stage(llm_instagram_text_client, inputs["analysis"])
+
+    # Skip results mirror the messages the sequential implementation produced
+    if not include_story_teasers:
+        logging.info("Instagram Story teaser generation skipped by user.")
+        story_skip = {"error": "Instagram Story teaser generation skipped by user."}
+    else:
+        if not llm_instagram_text_client:
+            logging.warning("Skipping Instagram Story teaser generation; llm_instagram_text_client was None.")
+        story_skip = {"error": "Instagram text LLM client not available for story teasers."}
+
+    if not include_iranian_video_prompt:
+        logging.info("Iranian Farsi video prompt generation skipped by user.")
+        iranian_skip = "Iranian Farsi video prompt not generated (disabled by user)."
+    else:
+        if not llm_instagram_text_client:
             logging.warning("Skipping Iranian Farsi video prompt generation; llm_instagram_text_client was None.")
-            final_package['iranian_farsi_video_prompt'] = "Error: LLM client not available for Iranian Farsi video prompt."
-        elif derived_insta_inputs.get("error") or not derived_insta_inputs.get("derived_blog_topic"):
-            logging.warning("Skipping Iranian Farsi video prompt generation; blog analysis failed or missing data.")
-            final_package['iranian_farsi_video_prompt'] = "Error: Blog analysis data not available for Iranian Farsi video prompt."
+        iranian_skip = "Error: LLM client not available for Iranian Farsi video prompt."
+
+    analysis_skip = {"error": "Blog analysis skipped or missing data.", "derived_blog_topic": "", "derived_key_takeaways": [], "derived_core_emotion": "", "derived_cta_word": ""}
+    insta_texts_disabled = {
+        'instagram_post_title': "Instagram post title not generated (disabled by user).",
+        'instagram_post_caption': "Instagram post caption not generated (disabled by user).",
+        'instagram_video_prompt': "Instagram video prompt not generated (Instagram texts disabled by user)."
+    }
+
+    may_use_digest = can_generate_image_prompts or bool(include_instagram_texts and llm_image_prompt_client)
+    full_source = {"description": source_body, "digest_used": False, "reason": "disabled"}
+
+    stages = [
+        Stage("blog", blog_stage),
+        Stage("source_digest", source_digest_stage,
+              enabled=bool(use_source_digest and may_use_digest and (llm_instagram_text_client or llm_image_prompt_client)),
+              skip_result=full_source),
+        Stage("fused_image_prompts", fused_image_prompts_stage, requires=["source_digest"],
+              enabled=bool(fuse_image_prompts and can_generate_image_prompts), skip_result={}),
+        Stage("image_prompt", image_prompt_stage("image_prompt", generate_image_prompt), requires=["source_digest", "fused_image_prompts"],
+              enabled=can_generate_image_prompts,
+              skip_result=image_skip_result("Error: Missing source for blog image prompt.", "Error: Blog image prompt LLM client not available.")),
+        Stage("realistic_image_prompt", image_prompt_stage("realistic_image_prompt", generate_realistic_image_prompt), requires=["source_digest", "fused_image_prompts"],
+              enabled=can_generate_image_prompts,
+              skip_result=image_skip_result("Error: Missing source for realistic blog image prompt.", "Error: Realistic blog image prompt LLM client not available.")),
+        Stage("instagram_static_image_prompt", image_prompt_stage("instagram_static_image_prompt", generate_instagram_image_prompt), requires=["source_digest", "fused_image_prompts"],
+              enabled=can_generate_image_prompts,
+              skip_result=image_skip_result("Error: Missing source for Instagram static image prompt.", "Error: Instagram static image prompt LLM client not available.")),
+        Stage("instagram_video_ready_image_prompt", image_prompt_stage("instagram_video_ready_image_prompt", generate_instagram_image_prompt_for_video), requires=["source_digest", "fused_image_prompts"],
+              enabled=can_generate_image_prompts,
+              skip_result=image_skip_result("Error: Missing source for Instagram video-ready image prompt.", "Error: Instagram video-ready image prompt LLM client not available.")),
+        Stage("analysis", analysis_stage, requires=["blog"],
+              enabled=bool((include_instagram_texts or include_iranian_video_prompt) and llm_instagram_text_client),
+              skip_result=analysis_skip),
+        Stage("instagram_texts", instagram_texts_stage, requires=["analysis"],
+              enabled=include_instagram_texts, skip_result=insta_texts_disabled),
+        Stage("instagram_video_prompt", instagram_video_prompt_stage, requires=["instagram_texts", "source_digest"],
+              enabled=include_instagram_texts, skip_result=insta_texts_disabled['instagram_video_prompt']),
+        Stage("story_teasers", story_teasers_stage, requires=["blog"],
+              enabled=bool(include_story_teasers and llm_instagram_text_client), skip_result=story_skip),
+        Stage("iranian_video_prompt", iranian_video_stage, requires=["analysis"],
+              enabled=bool(include_iranian_video_prompt and llm_instagram_text_client), skip_result=iranian_skip),
+    ]
+
+    try:
+        with bypass_llm_cache(bypass_cache):
+            results = await run_stage_graph(stages, max_in_flight=max_in_flight, on_event=on_stage_event)
+
+        blog_package_content, blog_llm_raw_output = results["blog"]
+        blog_thumbnail_image_prompt = results["image_prompt"]
+        realistic_thumbnail_image_prompt = results["realistic_image_prompt"]
+
+        # Assemble in the same key order the sequential pipeline produced
+        final_package = {**blog_package_content} # Start with content, meta, tags
+        final_package['image_prompt'] = blog_thumbnail_image_prompt # Blog thumbnail prompt
+        final_package['realistic_image_prompt'] = realistic_thumbnail_image_prompt # Realistic blog thumbnail prompt
+        final_package['instagram_static_image_prompt'] = results["instagram_static_image_prompt"]
+        final_package['instagram_video_ready_image_prompt'] = results["instagram_video_ready_image_prompt"]
+
+        insta_texts = results["instagram_texts"]
+        final_package['instagram_post_title'] = insta_texts.get('instagram_post_title')
+        final_package['instagram_post_caption'] = insta_texts.get('instagram_post_caption')
+        final_package['instagram_video_prompt'] = results["instagram_video_prompt"]
+        final_package['instagram_story_teasers'] = results["story_teasers"]
+        final_package['iranian_farsi_video_prompt'] = results["iranian_video_prompt"]
+        if use_source_digest:
+            final_package['source_digest_report'] = build_digest_report(source_body, results["source_digest"], len(digest_consumers))
+            logging.info(f"Source digest report: {final_package['source_digest_report']}")
 
         await save_output_to_file_async(
             raw_blog_output=blog_llm_raw_output,
@@ -494,9 +504,14 @@ async def generate_persian_blog_package(
             raw_iranian_farsi_video_prompt=final_package.get('iranian_farsi_video_prompt'), # NEW: Pass the Iranian Farsi video prompt
             parsed_package=final_package,
             slug=final_package.get('slug', 'no-slug-blog-pkg'),
-            pantry_id=pantry_api_id # Pass pantry_id
+            pantry_id=pantry_api_id, # Pass pantry_id
+            source=source_record
         )
-        return final_package # Return the package with blog content and both image prompts
+        return final_package # Return the package with blog content and all generated prompts
+
+    except _BlogStageError as blog_err:
+        # The blog stage already saved its failed output; the other stages were cancelled
+        return {"error": str(blog_err)}
 
     except Exception as e:
         logging.exception(f"Error during Persian blog package generation: {e}")
@@ -510,16 +525,280 @@ async def generate_persian_blog_package(
             raw_iranian_farsi_video_prompt=final_package.get('iranian_farsi_video_prompt', "Error during generation") if final_package else "Error during generation", # NEW: Pass the Iranian Farsi video prompt
             error=str(e), 
             slug='error-blog-pkg',
-            pantry_id=pantry_api_id_error # Pass pantry_id
+            pantry_id=pantry_api_id_error, # Pass pantry_id
+            source=source_record
         ) 
         return {"error": f"Error generating Persian blog package: {e}"}
 
 
+# --- Selective Regeneration ---
+# Artifacts of a saved package that can be re-run on their own; the blog itself is always reused
+REGENERABLE_ARTIFACTS = {
+    "image_prompt": "Blog image prompt (artistic)",
+    "realistic_image_prompt": "Blog image prompt (realistic)",
+    "instagram_static_image_prompt": "Instagram static image prompt",
+    "instagram_video_ready_image_prompt": "Instagram video-ready image prompt",
+    "instagram_texts": "Instagram title and caption (re-runs blog analysis)",
+    "instagram_video_prompt": "Instagram video prompt",
+    "story_teasers": "Instagram story teasers",
+    "iranian_video_prompt": "Iranian Farsi video prompt (re-runs blog analysis)",
+}
+SOURCE_ARTIFACTS = ("image_prompt", "realistic_image_prompt", "instagram_static_image_prompt", "instagram_video_ready_image_prompt", "instagram_video_prompt")
+
+
+@traced("regenerate_package_artifacts")
+async def regenerate_package_artifacts(
+    package: dict,
+    artifacts: list[str],
+    llm_image_prompt_client: ChatOpenAI,
+    llm_instagram_text_client: ChatOpenAI,
+    source_title: str | None = None,
+    source_body: str | None = None,
+    source_name: str | None = None,
+    source_url: str | None = None,
+    max_in_flight: int | None = None,
+    bypass_cache: bool = False,
+    use_source_digest: bool | None = None,
+    on_stage_event=None
+) -> dict:
+    """
+    Re-runs only the selected `artifacts` (keys of REGENERABLE_ARTIFACTS) on an existing
+    `final_parsed_package`; every other field, including the blog itself, is reused as-is.
+    Image and Instagram video prompts need the original source title/body. The result is saved as
+    a new version (`version`, `regenerated_fields`, `regenerated_from`) and returned; errors come
+    back as {"error": ...}.
+    """
+    artifacts = list(dict.fromkeys(artifacts or []))
+    unknown = [artifact for artifact in artifacts if artifact not in REGENERABLE_ARTIFACTS]
+    if unknown:
+        return {"error": f"Unknown artifact(s) for regeneration: {unknown}"}
+    if not artifacts:
+        return {"error": "No artifacts selected for regeneration."}
+    if not isinstance(package, dict) or not package.get("content"):
+        return {"error": "The package has no blog content to regenerate from."}
+    needs_source = any(artifact in SOURCE_ARTIFACTS for artifact in artifacts)
+    if needs_source and not (source_title and source_body):
+        return {"error": "Image and video prompts need the original source title and body."}
+    if needs_source and not llm_image_prompt_client:
+        return {"error": "Image prompt LLM client not available."}
+    if any(artifact not in SOURCE_ARTIFACTS for artifact in artifacts) and not llm_instagram_text_client:
+        return {"error": "Instagram text LLM client not available."}
+    if use_source_digest is None:
+        use_source_digest = SOURCE_DIGEST_ENABLED
+
+    image_generators = {
+        "image_prompt": generate_image_prompt,
+        "realistic_image_prompt": generate_realistic_image_prompt,
+        "instagram_static_image_prompt": generate_instagram_image_prompt,
+        "instagram_video_ready_image_prompt": generate_instagram_image_prompt_for_video,
+    }
+    full_source = {"description": source_body, "digest_used": False, "reason": "disabled"}
+
+    def image_prompt_stage(generator):
+        async def run(inputs):
+            return await generator(llm_client=llm_image_prompt_client, header=source_title, description=inputs["source_digest"]["description"])
+        return run
+
+    async def source_digest_stage(_inputs):
+        return await generate_source_digest(llm_instagram_text_client or llm_image_prompt_client, source_title, source_body)
+
+    async def analysis_stage(_inputs):
+        return await _run_blog_analysis_stage(llm_instagram_text_client, package)
+
+    async def instagram_texts_stage(inputs):
+        return await _run_instagram_texts_stage(llm_instagram_text_client, inputs["analysis"])
+
+    async def instagram_video_prompt_stage(inputs):
+        # Use the new caption if it is being regenerated too, otherwise the saved one
+        insta_texts = inputs.get("instagram_texts") or {'instagram_post_caption': package.get('instagram_post_caption')}
+        return await _run_instagram_video_prompt_stage(llm_image_prompt_client, source_title, inputs["source_digest"]["description"], insta_texts)
+
+    async def story_teasers_stage(_inputs):
+        return await _run_story_teasers_stage(llm_instagram_text_client, package)
+
+    async def iranian_video_stage(inputs):
+        return await _run_iranian_video_prompt_stage(llm_instagram_text_client, inputs["analysis"])
+
+    selected = set(artifacts)
+    stages = [
+        Stage("source_digest", source_digest_stage, enabled=bool(use_source_digest and needs_source), skip_result=full_source),
+        Stage("analysis", analysis_stage, enabled=bool(selected & {"instagram_texts", "iranian_video_prompt"}), skip_result={}),
+        Stage("instagram_texts", instagram_texts_stage, requires=["analysis"], enabled="instagram_texts" in selected, skip_result=None),
+        Stage("instagram_video_prompt", instagram_video_prompt_stage, requires=["instagram_texts", "source_digest"],
+              enabled="instagram_video_prompt" in selected),
+        Stage("story_teasers", story_teasers_stage, enabled="story_teasers" in selected),
+        Stage("iranian_video_prompt", iranian_video_stage, requires=["analysis"], enabled="iranian_video_prompt" in selected),
+    ]
+    stages += [
+        Stage(key, image_prompt_stage(generator), requires=["source_digest"], enabled=key in selected)
+        for key, generator in image_generators.items()
+    ]
+
+    try:
+        with bypass_llm_cache(bypass_cache):
+            results = await run_stage_graph(stages, max_in_flight=max_in_flight, on_event=on_stage_event)
+    except Exception as e:
+        logging.exception(f"Error during package regeneration: {e}")
+        return {"error": f"Error regenerating {', '.join(artifacts)}: {e}"}
+
+    new_package = dict(package)
+    for key in image_generators:
+        if key in selected:
+            new_package[key] = results[key]
+    if "instagram_texts" in selected:
+        new_package['instagram_post_title'] = results["instagram_texts"].get('instagram_post_title')
+        new_package['instagram_post_caption'] = results["instagram_texts"].get('instagram_post_caption')
+    if "instagram_video_prompt" in selected:
+        new_package['instagram_video_prompt'] = results["instagram_video_prompt"]
+    if "story_teasers" in selected:
+        new_package['instagram_story_teasers'] = results["story_teasers"]
+    if "iranian_video_prompt" in selected:
+        new_package['iranian_farsi_video_prompt'] = results["iranian_video_prompt"]
+
+    previous_version = package.get('version') or 1
+    new_package['version'] = previous_version + 1
+    new_package['regenerated_fields'] = artifacts
+    new_package['regenerated_from'] = {"version": previous_version, "slug": package.get('slug')}
+    logging.info(f"Regenerated {artifacts} for '{package.get('slug')}' (version {new_package['version']}).")
+
+    source_record = {"title": source_title, "body": source_body, "name": source_name, "url": source_url} if source_body else None
+    await save_output_to_file_async(
+        raw_image_prompt=new_package.get('image_prompt'),
+        raw_realistic_image_prompt=new_package.get('realistic_image_prompt'),
+        raw_instagram_post_image_prompt=new_package.get('instagram_static_image_prompt'),
+        raw_instagram_video_prompt=new_package.get('instagram_video_ready_image_prompt'),
+        raw_iranian_farsi_video_prompt=new_package.get('iranian_farsi_video_prompt'),
+        parsed_package=new_package,
+        slug=new_package.get('slug', 'regenerated-pkg'),
+        pantry_id=os.getenv("PANTRY_ID"),
+        source=source_record
+    )
+    return new_package
+
+
+# --- Source Digest Function ---
+async def generate_source_digest(llm_client: ChatOpenAI, source_title: str, source_body: str) -> dict:
+    """
+    Condenses the source into a short digest for the image/video prompt calls, cached per source hash.
+    Returns {"description", "digest_used", "cached", "reason", "usage"}; on any problem "description"
+    is the full source body, so callers can always use it.
+    """
+    result = {"description": source_body, "digest_used": False, "cached": False, "reason": None, "usage": None}
+    if len(source_body) < SOURCE_DIGEST_MIN_CHARS:
+        result["reason"] = f"source shorter than {SOURCE_DIGEST_MIN_CHARS} characters"
+        return result
+
+    key = source_hash(source_title, source_body)
+    try:
+        store = get_source_digest_store()
+        cached_digest = await asyncio.to_thread(store.get, key)
+    except Exception as e:
+        logging.warning(f"Source digest store unavailable ({e}); generating without it.")
+        store, cached_digest = None, None
+    if cached_digest:
+        logging.info(f"Using stored source digest ({len(cached_digest)} chars) for source {key[:12]}.")
+        result.update(description=cached_digest, digest_used=True, cached=True)
+        return result
+
+    try:
+        prompt_fstring = get_prompt_template("source_digest_prompt.txt").format(
+            header=source_title, description=source_body, max_words=SOURCE_DIGEST_MAX_WORDS
+        )
+    except Exception as e:
+        logging.exception(f"Error loading or formatting source digest prompt: {e}")
+        result["reason"] = f"prompt error: {e}"
+        return result
+
+    try:
+        logging.info(f"Invoking LLM for source digest ({len(source_body)} chars)...")
+        response = await llm_client.ainvoke([HumanMessage(content=prompt_fstring)])
+        digest = response.content.strip() if isinstance(response.content, str) else ""
+    except Exception as e:
+        logging.exception(f"Error during source digest LLM invocation: {e}")
+        result["reason"] = f"LLM error: {e}"
+        return result
+
+    if not digest or len(digest) >= len(source_body):
+        logging.warning("Source digest was empty or not shorter than the source; using the full source.")
+        await invalidate_llm_response(llm_cache_key(response))
+        result["reason"] = "digest not shorter than source"
+        return result
+
+    result.update(description=digest, digest_used=True, usage=getattr(response, "usage_metadata", None))
+    if store is not None:
+        try:
+            await asyncio.to_thread(store.put, key, digest, getattr(llm_client, "model_name", None))
+        except Exception as e:
+            logging.warning(f"Failed to store source digest: {e}")
+    logging.info(f"Source digest generated: {len(source_body)} -> {len(digest)} chars.")
+    return result
+
+
+# --- Fused Image Prompt Function ---
+# Package key -> prompt template for each prompt the fused call produces, in package order
+FUSED_IMAGE_PROMPT_TEMPLATES = {
+    "image_prompt": "blog_thumbnail_image_prompt.txt",
+    "realistic_image_prompt": "realistic_thumbnail_image_prompt.txt",
+    "instagram_static_image_prompt": "instagram_static_image_prompt.txt",
+    "instagram_video_ready_image_prompt": "instagram_video_ready_image_prompt.txt",
+}
+
+
+async def generate_fused_image_prompts(llm_client: ChatOpenAI, header: str, description: str) -> dict:
+    """
+    Requests all four image prompts in one call as a JSON object. Each template is embedded as a brief
+    with `[HEADER]`/`[DESCRIPTION]` references, so the source is sent once instead of four times.
+    Returns only the fields that came back as non-empty strings (possibly none); callers fall back
+    to the individual generators for the rest.
+    """
+    try:
+        briefs = []
+        for number, (key, template_name) in enumerate(FUSED_IMAGE_PROMPT_TEMPLATES.items(), 1):
+            brief = get_prompt_template(template_name).format(header="[HEADER]", description="[DESCRIPTION]")
+            # Drop the templates' own "[HEADER]: ..." footer lines; the source is given once at the end
+            brief_lines = [line for line in brief.strip().splitlines() if not line.rstrip().endswith(("**: [HEADER]", "**: [DESCRIPTION]"))]
+            briefs.append(f"=== Brief {number}: `{key}` ===\n" + "\n".join(brief_lines).strip().removesuffix("---").strip())
+        prompt_fstring = get_prompt_template("fused_image_prompts.txt").format(
+            briefs="\n\n".join(briefs),
+            keys="\n".join(f"- `{key}`" for key in FUSED_IMAGE_PROMPT_TEMPLATES),
+            header=header,
+            description=description
+        )
+    except Exception as e:
+        logging.exception(f"Error loading or formatting fused image prompt: {e}")
+        return {}
+
+    try:
+        logging.info("Invoking Image Prompt LLM for all four image prompts in one call (async)...")
+        response = await llm_client.ainvoke([HumanMessage(content=prompt_fstring)])
+        parsed = loads_tolerant(str(response.content))
+    except json.JSONDecodeError as e:
+        logging.error(f"Could not parse fused image prompt response as JSON: {e}")
+        await invalidate_llm_response(llm_cache_key(response))
+        return {}
+    except Exception as e:
+        logging.exception(f"Error during fused image prompt LLM invocation: {e}")
+        return {}
+    if not isinstance(parsed, dict):
+        logging.error(f"Fused image prompt response was not a JSON object: {type(parsed)}")
+        await invalidate_llm_response(llm_cache_key(response))
+        return {}
+
+    prompts = {key: parsed[key].strip() for key in FUSED_IMAGE_PROMPT_TEMPLATES
+               if isinstance(parsed.get(key), str) and parsed[key].strip()}
+    missing = [key for key in FUSED_IMAGE_PROMPT_TEMPLATES if key not in prompts]
+    if missing:
+        logging.warning(f"Fused image prompt response is missing {missing}; those will be generated individually.")
+    else:
+        logging.info("Fused image prompt call returned all four prompts.")
+    return prompts
+
+
 # --- Image Prompt Generation Function ---
 async def generate_image_prompt(llm_client: ChatOpenAI, header: str, description: str) -> str:
     """Generate an artistic, creative image prompt for blog thumbnail."""
     try:
-        prompt_fstring_template = await read_prompt_file_async("blog_thumbnail_image_prompt.txt")
+        prompt_fstring_template = get_prompt_template("blog_thumbnail_image_prompt.txt")
         prompt_fstring = prompt_fstring_template.format(header=header, description=description)
     except Exception as e:
         logging.exception(f"Error loading or formatting blog thumbnail image prompt: {e}")
@@ -543,7 +822,7 @@ async def generate_image_prompt(llm_client: ChatOpenAI, header: str, description
 async def generate_realistic_image_prompt(llm_client: ChatOpenAI, header: str, description: str) -> str:
     """Generate a photorealistic, high-quality image prompt for blog thumbnail."""
     try:
-        prompt_fstring_template = await read_prompt_file_async("realistic_thumbnail_image_prompt.txt")
+        prompt_fstring_template = get_prompt_template("realistic_thumbnail_image_prompt.txt")
         prompt_fstring = prompt_fstring_template.format(header=header, description=description)
     except Exception as e:
         logging.exception(f"Error loading or formatting realistic thumbnail image prompt: {e}")
@@ -567,7 +846,7 @@ async def generate_realistic_image_prompt(llm_client: ChatOpenAI, header: str, d
 async def generate_instagram_image_prompt(llm_client: ChatOpenAI, header: str, description: str) -> str:
     """Generate a professional, satirical, witty, and visually bold image prompt for a static Instagram post about tech/AI."""
     try:
-        prompt_fstring_template = await read_prompt_file_async("instagram_static_image_prompt.txt")
+        prompt_fstring_template = get_prompt_template("instagram_static_image_prompt.txt")
         prompt_fstring = prompt_fstring_template.format(header=header, description=description)
     except Exception as e:
         logging.exception(f"Error loading or formatting Instagram static image prompt: {e}")
@@ -591,7 +870,7 @@ async def generate_instagram_image_prompt(llm_client: ChatOpenAI, header: str, d
 async def generate_instagram_image_prompt_for_video(llm_client: ChatOpenAI, header: str, description: str) -> str:
     """Generate a professional, satirical, witty, and visually bold image prompt for an Instagram post optimized for video generation."""
     try:
-        prompt_fstring_template = await read_prompt_file_async("instagram_video_ready_image_prompt.txt")
+        prompt_fstring_template = get_prompt_template("instagram_video_ready_image_prompt.txt")
         prompt_fstring = prompt_fstring_template.format(header=header, description=description)
     except Exception as e:
         logging.exception(f"Error loading or formatting Instagram video-ready image prompt: {e}")
@@ -615,7 +894,7 @@ async def generate_instagram_image_prompt_for_video(llm_client: ChatOpenAI, head
 async def generate_instagram_video_prompt(llm_client: ChatOpenAI, header: str, description: str, instagram_caption: str) -> str:
     """Generate a professional video generation prompt following Veo 2 best practices for creating viral Instagram videos from static photos."""
     try:
-        prompt_fstring_template = await read_prompt_file_async("instagram_video_prompt.txt")
+        prompt_fstring_template = get_prompt_template("instagram_video_prompt.txt")
         prompt_fstring = prompt_fstring_template.format(header=header, description=description, instagram_caption=instagram_caption)
     except Exception as e:
         logging.exception(f"Error loading or formatting Instagram video prompt: {e}")
@@ -643,8 +922,8 @@ async def generate_instagram_post_texts(llm_client: ChatOpenAI, derived_blog_top
 
     # Load prompts from files
     try:
-        system_prompt_instagram_texts_template = await read_prompt_file_async("system_prompt_instagram_texts.txt")
-        human_prompt_instagram_texts_template = await read_prompt_file_async("human_prompt_instagram_texts.txt")
+        system_prompt_instagram_texts_template = get_prompt_template("system_prompt_instagram_texts.txt").text
+        human_prompt_instagram_texts_template = get_prompt_template("human_prompt_instagram_texts.txt")
 
         system_prompt_instagram_texts = system_prompt_instagram_texts_template
         human_prompt_instagram_texts = human_prompt_instagram_texts_template.format(
@@ -668,27 +947,16 @@ async def generate_instagram_post_texts(llm_client: ChatOpenAI, derived_blog_top
         response = await llm_client.ainvoke(messages)
         raw_output = str(response.content) # Ensure raw_output is always a string
         
-        cleaned_output = raw_output.strip()
-        if cleaned_output.startswith("```json") or cleaned_output.startswith("```"):
-            cleaned_output = cleaned_output[cleaned_output.find("{"):cleaned_output.rfind("}") + 1]
-        
         try:
-            instagram_texts = json.loads(cleaned_output)
-            return instagram_texts
+            instagram_texts = loads_tolerant(raw_output)
         except json.JSONDecodeError as jde:
-            logging.warning(f"JSON parsing failed for Instagram texts after ALL cleaning attempts ({str(jde)}). Raw cleaned output: {cleaned_output[:200]}...")
-            title_match = re.search(r'"instagram_post_title":\s*"(.*?)"', cleaned_output, re.DOTALL)
-            caption_match = re.search(r'"instagram_post_caption":\s*"(.*?)"', cleaned_output, re.DOTALL)
-            if title_match and caption_match:
-                instagram_texts = {
-                    "instagram_post_title": title_match.group(1).strip(),
-                    "instagram_post_caption": caption_match.group(1).strip()
-                }
-                logging.info("Successfully extracted Instagram texts using fallback regex.")
-                return instagram_texts
-            else:
-                logging.error(f"Could not parse Instagram texts with regex fallback. Title match: {bool(title_match)}, Caption match: {bool(caption_match)}. Raw: {cleaned_output[:200]}")
-                raise ValueError("Could not parse Instagram texts from LLM (regex fallback failed)")
+            logging.error(f"Could not parse Instagram texts from LLM ({jde}). Raw: {raw_output[:200]}")
+            await invalidate_llm_response(llm_cache_key(response))
+            raise ValueError(f"Could not parse Instagram texts from LLM: {jde}")
+        if not isinstance(instagram_texts, dict):
+            await invalidate_llm_response(llm_cache_key(response))
+            raise ValueError(f"Instagram texts LLM response was not a JSON object: {type(instagram_texts)}")
+        return instagram_texts
     except Exception as e:
         logging.error(f"Error during Instagram text generation: {str(e)}")
         raise
@@ -697,8 +965,8 @@ async def analyze_blog_for_instagram_inputs(llm_client: ChatOpenAI, blog_title:
     
     # Load prompts for blog analysis
     try:
-        system_prompt_analyze_blog_template = await read_prompt_file_async("system_prompt_analyze_blog.txt")
-        human_prompt_analyze_blog_template = await read_prompt_file_async("human_prompt_analyze_blog.txt")
+        system_prompt_analyze_blog_template = get_prompt_template("system_prompt_analyze_blog.txt").text
+        human_prompt_analyze_blog_template = get_prompt_template("human_prompt_analyze_blog.txt")
 
         # Format human prompt with blog content
         human_prompt_content_analyze = human_prompt_analyze_blog_template.format(
@@ -720,20 +988,13 @@ async def analyze_blog_for_instagram_inputs(llm_client: ChatOpenAI, blog_title:
         response = await llm_client.ainvoke(messages_analyze)
         raw_output = str(response.content) # Ensure raw_output is always a string
         
-        # Rest of the code for parsing and error handling
-        raw_output = raw_output.strip()
-        if raw_output.startswith("```json"):
-            raw_output = raw_output[7:]
-        if raw_output.endswith("```"):
-            raw_output = raw_output[:-3]
-        raw_output = raw_output.strip()
-
         try:
-            parsed_json = json.loads(raw_output)
+            parsed_json = loads_tolerant(raw_output)
             required_keys = ["derived_blog_topic", "derived_key_takeaways", "derived_core_emotion", "derived_cta_word"]
             if isinstance(parsed_json, dict) and all(key in parsed_json for key in required_keys):
                 if not isinstance(parsed_json.get("derived_key_takeaways"), list):
                     logging.error(f"Invalid type for 'derived_key_takeaways': expected list, got {type(parsed_json.get('derived_key_takeaways'))}. Output: {raw_output}")
+                    await invalidate_llm_response(llm_cache_key(response))
                     derived_inputs = {"error": "Derived key takeaways is not a list."}
                 else:
                     # Ensure derived_key_takeaways is list of strings
@@ -742,9 +1003,11 @@ async def analyze_blog_for_instagram_inputs(llm_client: ChatOpenAI, blog_title:
                     logging.info("Successfully parsed JSON response from Blog Analysis.")
             else:
                 logging.error(f"Could not find required keys in JSON from Blog Analysis LLM: {raw_output}")
+                await invalidate_llm_response(llm_cache_key(response))
                 derived_inputs = {"error": "LLM response from Blog Analysis missing required keys."}
         except json.JSONDecodeError as json_err:
             logging.error(f"Failed to decode JSON from Blog Analysis LLM response: {json_err}. Raw: {raw_output}")
+            await invalidate_llm_response(llm_cache_key(response))
             derived_inputs = {"error": f"Could not parse Blog Analysis response from LLM. See logs."}
 
     except Exception as e:
@@ -762,8 +1025,8 @@ async def generate_iranian_farsi_video_prompt(
 
     # Load prompts for Iranian Farsi video
     try:
-        system_prompt_iranian_video_template = await read_prompt_file_async("system_prompt_iranian_video.txt")
-        human_prompt_iranian_video_template = await read_prompt_file_async("human_prompt_iranian_video.txt")
+        system_prompt_iranian_video_template = get_prompt_template("system_prompt_iranian_video.txt").text
+        human_prompt_iranian_video_template = get_prompt_template("human_prompt_iranian_video.txt")
 
         # Ensure key_takeaways is a list of strings for formatting
         key_takeaways_for_iranian_video = [str(item) for item in key_takeaways if isinstance(item, (str, int, float, bool))]
@@ -808,8 +1071,8 @@ async def generate_instagram_story_teasers(
 
     # Load prompts for Instagram story teasers
     try:
-        system_prompt_story_template = await read_prompt_file_async("system_prompt_instagram_story_teasers.txt")
-        human_prompt_story_template = await read_prompt_file_async("human_prompt_instagram_story_teasers.txt")
+        system_prompt_story_template = get_prompt_template("system_prompt_instagram_story_teasers.txt").text
+        human_prompt_story_template = get_prompt_template("human_prompt_instagram_story_teasers.txt")
 
         human_prompt_content_story = human_prompt_story_template.format(
             blog_content=blog_content
@@ -841,14 +1104,9 @@ async def generate_instagram_story_teasers(
         logging.info(f"LLM for Instagram Story Teasers successful. Raw output: {raw_output_story[:200]}...")
 
         try:
-            cleaned_output_story = raw_output_story.strip()
-            if cleaned_output_story.startswith("```json"):
-                cleaned_output_story = cleaned_output_story[7:]
-            if cleaned_output_story.endswith("```"):
-                cleaned_output_story = cleaned_output_story[:-3]
-            cleaned_output_story = cleaned_output_story.strip()
-
-            parsed_json_story = json.loads(cleaned_output_story)
+            parsed_json_story = loads_tolerant(raw_output_story)
+            if not isinstance(parsed_json_story, dict):
+                raise json.JSONDecodeError(f"Expected a JSON object, got {type(parsed_json_story).__name__}", raw_output_story, 0)
             story_teasers["story_main_title"] = parsed_json_story.get("story_main_title", "Error: Missing main title")
             story_teasers["story_subtitle"] = parsed_json_story.get("story_subtitle", "Error: Missing subtitle")
             story_teasers["story_body_text"] = parsed_json_story.get("story_body_text", "Error: Missing body text")
@@ -857,33 +1115,11 @@ async def generate_instagram_story_teasers(
                 logging.error(f"Story Teaser JSON missing fields. Parsed: {parsed_json_story}")
         except json.JSONDecodeError as e:
             logging.error(f"Failed to decode JSON from Story Teaser LLM: {e}. Raw: {raw_output_story}")
+            await invalidate_llm_response(llm_cache_key(response_story))
             story_teasers["error"] = f"Could not parse Story Teaser LLM response as JSON: {e}"
-            title_match = re.search(r'"story_main_title":\s*"(.*?)"', raw_output_story, re.DOTALL)
-            subtitle_match = re.search(r'"story_subtitle":\s*"(.*?)"', raw_output_story, re.DOTALL)
-            body_match = re.search(r'"story_body_text":\s*"(.*?)"', raw_output_story, re.DOTALL)
-
-            if title_match:
-                story_teasers["story_main_title"] = title_match.group(1).strip()
-            else:
-                story_teasers["story_main_title"] = "Error: Could not extract main title (regex)"
-            
-            if subtitle_match:
-                story_teasers["story_subtitle"] = subtitle_match.group(1).strip()
-            else:
-                story_teasers["story_subtitle"] = "Error: Could not extract subtitle (regex)"
-
-            if body_match:
-                story_teasers["story_body_text"] = body_match.group(1).strip()
-            else:
-                story_teasers["story_body_text"] = "Error: Could not extract body text (regex)"
-            
-            if not (title_match and subtitle_match and body_match):
-                logging.warning("Fallback regex extraction for story teasers failed or was incomplete.")
-                current_error = story_teasers.get("error", "")
-                story_teasers["error"] = f"{current_error} | Regex extraction also failed or incomplete.".strip(" | ")
-            else:
-                logging.info("Successfully extracted story teaser fields using fallback regex.")
-                story_teasers["error"] = None 
+            story_teasers["story_main_title"] = "Error: Could not extract main title"
+            story_teasers["story_subtitle"] = "Error: Could not extract subtitle"
+            story_teasers["story_body_text"] = "Error: Could not extract body text"
     except Exception as e:
         logging.exception("An unexpected error occurred during Instagram Story Teaser generation.")
         story_teasers = {"error": f"Unexpected error in story teaser generation: {e}", "story_main_title": "Error: Generation failed", "story_subtitle": "Error: Generation failed", "story_body_text": "Error: Generation failed"}
@@ -4,14 +4,236 @@ import json
 import re
 from datetime import datetime
 import asyncio # Added
+import atexit
+import threading
+import uuid
 import aiohttp  # Added
-import aiofiles # Added for prompt reading
 import requests # Added for Pantry listing/getting
+from .prompt_registry import get_prompt_template, PROMPTS_DIR
+from .tracing import trace_span, current_trace, traced
+from .source_dedup import get_source_index
+from .output_store import get_output_store
+from .output_archive import get_output_archive, OUTPUT_ARCHIVE_ENABLED
+from .search_index import get_search_index, SEARCH_INDEX_ENABLED
+
+try:
+    import orjson # Optional: several times faster than json for large records
+except ImportError:
+    orjson = None
 
 # Configure logging (can be configured centrally if preferred)
 logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
 
-PANTRY_BASE_URL = "https://getpantry.cloud/apiv1/pantry" # Added for Pantry
+PANTRY_BASE_URL = os.getenv("PANTRY_BASE_URL", "https://getpantry.cloud/apiv1/pantry").rstrip("/") # Overridable, e.g. for the local stand-in server
+
+IO_DNS_CACHE_TTL = int(os.getenv("IO_DNS_CACHE_TTL", "300"))          # Seconds a resolved host is reused
+IO_MAX_CONNECTIONS = int(os.getenv("IO_MAX_CONNECTIONS", "10"))
+IO_KEEPALIVE_TIMEOUT = float(os.getenv("IO_KEEPALIVE_TIMEOUT", "60"))  # Seconds an idle connection is kept open
+IO_REQUEST_TIMEOUT = float(os.getenv("IO_REQUEST_TIMEOUT", "30"))
+
+OUTPUT_JSON_COMPACT = os.getenv("OUTPUT_JSON_COMPACT", "false").strip().lower() in ("1", "true", "yes", "on")  # No indentation in answers/*.json
+OUTPUT_JSON_FAST = os.getenv("OUTPUT_JSON_FAST", "true").strip().lower() in ("1", "true", "yes", "on")        # Use orjson when installed
+OUTPUT_FSYNC = os.getenv("OUTPUT_FSYNC", "false").strip().lower() in ("1", "true", "yes", "on")                # fsync each file before it is renamed into place
+
+# --- Managed I/O Runtime ---
+class IORuntime:
+    """
+    One event loop in a daemon thread plus one pooled aiohttp session (keep-alive, DNS cache) for
+    Pantry traffic. Sync code calls `run(coro)`; async code on any other loop awaits
+    `run_async(coro)`. Either way the request runs on this loop, so connections stay warm between
+    UI clicks, generations and batch items.
+    """
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._loop: asyncio.AbstractEventLoop | None = None
+        self._thread: threading.Thread | None = None
+        self._session: aiohttp.ClientSession | None = None
+        self._stats = {"requests": 0, "new_connections": 0, "reused_connections": 0, "dns_cache_hits": 0}
+
+    @property
+    def loop(self) -> asyncio.AbstractEventLoop:
+        with self._lock:
+            if self._loop is None or not self._thread.is_alive():
+                loop = asyncio.new_event_loop()
+                self._thread = threading.Thread(target=loop.run_forever, name="io-runtime-loop", daemon=True)
+                self._thread.start()
+                self._loop = loop
+                self._session = None
+            return self._loop
+
+    def _trace_config(self) -> aiohttp.TraceConfig:
+        trace_config = aiohttp.TraceConfig()
+
+        def counter(name):
+            async def count(session, context, params):
+                self._stats[name] += 1
+            return count
+
+        trace_config.on_request_start.append(counter("requests"))
+        trace_config.on_connection_create_end.append(counter("new_connections"))
+        trace_config.on_connection_reuseconn.append(counter("reused_connections"))
+        trace_config.on_dns_cache_hit.append(counter("dns_cache_hits"))
+        return trace_config
+
+    async def session(self) -> aiohttp.ClientSession:
+        """The shared session; must be awaited on the runtime's own loop."""
+        if self._session is None or self._session.closed:
+            connector = aiohttp.TCPConnector(
+                limit=IO_MAX_CONNECTIONS,
+                ttl_dns_cache=IO_DNS_CACHE_TTL,
+                keepalive_timeout=IO_KEEPALIVE_TIMEOUT,
+            )
+            self._session = aiohttp.ClientSession(
+                connector=connector,
+                timeout=aiohttp.ClientTimeout(total=IO_REQUEST_TIMEOUT),
+                trace_configs=[self._trace_config()],
+            )
+        return self._session
+
+    def _on_runtime_loop(self) -> bool:
+        try:
+            return asyncio.get_running_loop() is self._loop
+        except RuntimeError:
+            return False
+
+    def submit(self, coro):
+        """Schedules `coro` on the runtime loop; returns a concurrent.futures.Future."""
+        return asyncio.run_coroutine_threadsafe(coro, self.loop)
+
+    def run(self, coro, timeout: float | None = None):
+        """Runs `coro` on the runtime loop and blocks the calling (sync) thread for its result."""
+        if self._on_runtime_loop():
+            coro.close()
+            raise RuntimeError("IORuntime.run() would deadlock when called from the runtime loop; await the coroutine instead.")
+        return self.submit(coro).result(timeout)
+
+    async def run_async(self, coro):
+        """Awaits `coro` on the runtime loop from any event loop (directly if already on it)."""
+        if self._on_runtime_loop():
+            return await coro
+        return await asyncio.wrap_future(self.submit(coro))
+
+    def stats(self) -> dict:
+        """Request and connection counters for the shared session."""
+        return dict(self._stats)
+
+    def close(self) -> None:
+        """Cancels background tasks (e.g. the Pantry outbox drain), closes the session and stops the loop thread."""
+        with self._lock:
+            loop, session = self._loop, self._session
+            self._loop = self._session = None
+        if loop is None:
+            return
+
+        async def shutdown():
+            tasks = [task for task in asyncio.all_tasks() if task is not asyncio.current_task()]
+            for task in tasks:
+                task.cancel()
+            await asyncio.gather(*tasks, return_exceptions=True)
+            if session is not None and not session.closed:
+                await session.close()
+
+        try:
+            asyncio.run_coroutine_threadsafe(shutdown(), loop).result(5)
+        except Exception as e:
+            logging.warning(f"Failed to close the I/O runtime cleanly: {e}")
+        loop.call_soon_threadsafe(loop.stop)
+
+
+_io_runtime: IORuntime | None = None
+_io_runtime_lock = threading.Lock()
+
+
+def get_io_runtime() -> IORuntime:
+    """The process-wide I/O runtime (created on first use, closed at interpreter exit)."""
+    global _io_runtime
+    with _io_runtime_lock:
+        if _io_runtime is None:
+            _io_runtime = IORuntime()
+            atexit.register(_io_runtime.close)
+        return _io_runtime
+
+
+def run_io(coro, timeout: float | None = None):
+    """Sync entry point: runs an I/O coroutine (e.g. a Pantry call) on the shared runtime and returns its result."""
+    return get_io_runtime().run(coro, timeout)
+
+
+async def _traced_pantry_request(method: str, step: str, url: str, expect_json: bool = True, span_attributes: dict | None = None, **kwargs):
+    """
+    A Pantry request on the runtime's pooled session, recorded as an 'http' span named pantry.<step>.
+    Returns the parsed JSON (or text) body; HTTP error statuses raise aiohttp.ClientResponseError.
+    """
+    async def call():
+        session = await get_io_runtime().session()
+        async with session.request(method, url, **kwargs) as response:
+            status = response.status
+            response.raise_for_status()
+            return status, (await response.json() if expect_json else await response.text())
+
+    # The span is opened here, in the caller's context, so it lands in the caller's trace
+    with trace_span(f"pantry.{step}", kind="http", method=method, **(span_attributes or {})) as span:
+        try:
+            status, body = await get_io_runtime().run_async(call())
+        except aiohttp.ClientResponseError as e:
+            span.set(status=e.status)
+            raise
+        span.set(status=status)
+        return body
+
+# --- Local Persistence ---
+def serialize_record(record: dict, compact: bool = OUTPUT_JSON_COMPACT, fast: bool = OUTPUT_JSON_FAST) -> bytes:
+    """
+    UTF-8 JSON for a saved record, with Persian text left unescaped. Uses orjson when enabled and
+    installed (pretty output is then indented by 2), else the json module (indented by 4).
+    """
+    if fast and orjson is not None:
+        try:
+            return orjson.dumps(record, option=None if compact else orjson.OPT_INDENT_2)
+        except TypeError:
+            pass # e.g. non-str keys or integers beyond 64 bits, which the json module still handles
+    if compact:
+        return json.dumps(record, ensure_ascii=False, separators=(",", ":")).encode("utf-8")
+    return json.dumps(record, ensure_ascii=False, indent=4).encode("utf-8")
+
+
+def write_file_atomic(path: str, data: bytes, fsync: bool = OUTPUT_FSYNC) -> None:
+    """Writes `data` to a temp file beside `path` and renames it into place, so no reader sees a partial file."""
+    temp_path = f"{path}.{uuid.uuid4().hex[:8]}.tmp"
+    try:
+        with open(temp_path, 'xb') as f:
+            f.write(data)
+            if fsync:
+                f.flush()
+                os.fsync(f.fileno())
+        os.replace(temp_path, path)
+    except BaseException:
+        try:
+            os.remove(temp_path)
+        except FileNotFoundError:
+            pass
+        raise
+
+
+def _save_local_record(output_store, output_id: int, record: dict, local_filename: str) -> str:
+    """
+    Serializes and writes one record and indexes it under its ID (blocking; run via asyncio.to_thread).
+    Returns where it was written: `local_filename`, or its segment reference when the archive is on.
+    """
+    if OUTPUT_ARCHIVE_ENABLED:
+        reference = get_output_archive().append(output_id, record, record_json=serialize_record(record, compact=True), fsync=OUTPUT_FSYNC)
+        output_store.complete(output_id, record, reference, archived=True)
+        return reference
+    write_file_atomic(local_filename, serialize_record(record))
+    output_store.complete(output_id, record, local_filename)
+    return local_filename
+
+
+def _allocate_output_id(username: str, slug: str, timestamp: str, source: dict | None):
+    output_store = get_output_store()
+    return output_store, output_store.allocate(username, slug, timestamp, source_url=(source or {}).get("url"),
+                                               source_title=(source or {}).get("title"))
+
 
 # --- Helper function to save output (NOW ASYNC for Pantry part) --- 
 async def save_output_to_file_async(
@@ -24,14 +246,15 @@ async def save_output_to_file_async(
     parsed_package=None, 
     error=None, 
     slug='output',
-    pantry_id=None # Added for Pantry integration
+    pantry_id=None, # Added for Pantry integration
+    source=None # {"title", "body", "name", "url"} of the article this package was generated from
 ):
     """ 
     Saves the provided data locally to the 'answers' folder 
     and optionally to Pantry if a pantry_id is provided (Pantry part is async).
+    Successful saves that carry their `source` are added to the near-duplicate source index.
     """
     output_dir = "answers"
-    counter_file = os.path.join(output_dir, "counter.txt")
     timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
     safe_slug = re.sub(r'[^\w-]', '', slug)[:50]
     local_filename = None # Initialize local_filename
@@ -45,27 +268,17 @@ async def save_output_to_file_async(
     safe_username = safe_username[:30] # Limit length for extremely long usernames
 
     # --- Prepare data to save (common for local and cloud) ---
-    # This section determines `next_count` for the local file's ID and filename prefix.
-    # This count is also used as the 'id' within the JSON data.
-    count = 0
+    # The output store hands out `next_count` atomically (safe across concurrent sessions and processes).
+    # This count is used as the 'id' within the JSON data and in the filename prefix.
     try:
         os.makedirs(output_dir, exist_ok=True) # Ensure answers dir exists
-        with open(counter_file, 'r') as f_count:
-            count = int(f_count.read().strip())
-    except FileNotFoundError:
-        logging.info(f"Counter file '{counter_file}' not found, starting count at 0.")
-        count = 0
-    except ValueError:
-        logging.warning(f"Invalid content in {counter_file}. Resetting count to 0.")
-        count = 0
-    except Exception as e_read:
-        logging.error(f"Error reading counter file {counter_file}: {e_read}. Resetting count.")
-        count = 0
-    
-    next_count = count + 1
+        output_store, next_count = await asyncio.to_thread(_allocate_output_id, safe_username, safe_slug, timestamp, source)
+    except Exception as e_store:
+        logging.exception(f"Could not allocate an output ID from the output store: {e_store}")
+        return
     
     data_to_save = {
-        "id": next_count, # Using the local counter for the main ID
+        "id": next_count, # Allocated by the output store
         "timestamp": timestamp,
         "status": "error" if error else "success",
         "error_message": error,
@@ -76,7 +289,9 @@ async def save_output_to_file_async(
         "raw_instagram_video_prompt": raw_instagram_video_prompt,
         "raw_iranian_farsi_video_prompt": raw_iranian_farsi_video_prompt, # NEW: Added for Iranian Farsi video prompt
         "final_parsed_package": parsed_package,
-        "pantry_basket_name": None # Will be populated if saved to Pantry
+        "source": source,
+        "pantry_basket_name": None, # Will be populated if saved to Pantry
+        "trace": current_trace().to_dict() if current_trace() else None # Spans recorded so far in this run
     }
 
     # --- 1. Attempt Local Save ---
@@ -84,22 +299,28 @@ async def save_output_to_file_async(
     try:
         # Incorporate username into filename
         local_filename = os.path.join(output_dir, f"{safe_username}_{next_count:04d}_{safe_slug}_{timestamp}.json")
-        with open(local_filename, 'w', encoding='utf-8') as f:
-            json.dump(data_to_save, f, ensure_ascii=False, indent=4)
+        # Serializing and writing large Persian records happens off the event loop
+        with trace_span("answers.save_local", kind="io", path=local_filename):
+            local_filename = await asyncio.to_thread(_save_local_record, output_store, next_count, data_to_save, local_filename)
         logging.info(f"Successfully saved output locally to {local_filename}")
-        
-        # Try to update counter file only after successful local save of data
-        try:
-            with open(counter_file, 'w') as f_count:
-                f_count.write(str(next_count))
-        except Exception as e_write_counter:
-            # Log error but don't fail the entire save if counter update fails
-            logging.error(f"Failed to write next count ({next_count}) to {counter_file}: {e_write_counter}. Local data saved to {local_filename}.")
-        
         local_save_successful = True
 
+        try:
+            await asyncio.to_thread(lambda: get_source_index().add_record(data_to_save, local_filename))
+        except Exception as e_index:
+            logging.warning(f"Could not add {local_filename} to the source fingerprint index: {e_index}")
+        if SEARCH_INDEX_ENABLED:
+            try:
+                await asyncio.to_thread(lambda: get_search_index().add_record(next_count, data_to_save))
+            except Exception as e_search:
+                logging.warning(f"Could not add output {next_count} to the package search index: {e_search}")
+
     except Exception as e_local_save:
         logging.exception(f"Failed to save output locally: {e_local_save}")
+        try:
+            await asyncio.to_thread(output_store.mark_failed, next_count, str(e_local_save))
+        except Exception as e_mark:
+            logging.error(f"Could not mark output {next_count} as failed in the output store: {e_mark}")
         # If local save fails, we might not want to proceed to Pantry,
         # or we might want to log this specific failure prominently.
         # For now, we'll just log and not attempt Pantry if local save fails.
@@ -116,22 +337,32 @@ async def save_output_to_file_async(
         data_to_save_for_pantry = data_to_save.copy() # Make a copy to add pantry basket name
         data_to_save_for_pantry["pantry_basket_name"] = pantry_basket_name
 
-        try:
-            async with aiohttp.ClientSession() as session:
+        from .pantry_outbox import PANTRY_OUTBOX_ENABLED, get_pantry_outbox # Imported here: the outbox uploads through this module
+        if PANTRY_OUTBOX_ENABLED:
+            # Write-behind: the upload (with retries) happens in the background; the caller returns now
+            try:
+                entry_id = await asyncio.to_thread(lambda: get_pantry_outbox().enqueue(next_count, pantry_id, pantry_basket_name))
+                logging.info(f"Queued Pantry upload {entry_id} for basket {pantry_basket_name}.")
+            except Exception as e_outbox:
+                logging.exception(f"Could not queue the Pantry upload (Basket: {pantry_basket_name}): {e_outbox}")
+        else:
+            try:
                 pantry_url = f"{PANTRY_BASE_URL}/{pantry_id}/basket/{pantry_basket_name}"
                 headers = {"Content-Type": "application/json"}
-                async with session.post(pantry_url, json=data_to_save_for_pantry, headers=headers) as response:
-                    response.raise_for_status()
-                    logging.info(f"Successfully saved output to Pantry. Basket: {pantry_basket_name}")
-        except aiohttp.ClientResponseError as e: # More specific exception for aiohttp HTTP errors
-            logging.error(f"Failed to save output to Pantry (Basket: {pantry_basket_name}): {e.status} - {e.message}")
-            # response_text = await e.response.text() if hasattr(e, 'response') and e.response else "No response body"
-            # logging.error(f"Pantry Error Response: {response_text}")
-            logging.error(f"Pantry Error Response (from history): {e.history}") # history might be more informative
-        except aiohttp.ClientError as e: # Catch other aiohttp client errors (e.g., connection issues)
-             logging.error(f"AIOHTTP client error saving to Pantry (Basket: {pantry_basket_name}): {e}")
-        except Exception as e_pantry_generic:
-            logging.exception(f"An unexpected error occurred during Pantry save (Basket: {pantry_basket_name}): {e_pantry_generic}")
+                await _traced_pantry_request("POST", "save_basket", pantry_url, expect_json=False,
+                                             span_attributes={"basket": pantry_basket_name},
+                                             json=data_to_save_for_pantry, headers=headers)
+                logging.info(f"Successfully saved output to Pantry. Basket: {pantry_basket_name}")
+                await asyncio.to_thread(output_store.set_pantry_basket, next_count, pantry_basket_name)
+            except aiohttp.ClientResponseError as e: # More specific exception for aiohttp HTTP errors
+                logging.error(f"Failed to save output to Pantry (Basket: {pantry_basket_name}): {e.status} - {e.message}")
+                # response_text = await e.response.text() if hasattr(e, 'response') and e.response else "No response body"
+                # logging.error(f"Pantry Error Response: {response_text}")
+                logging.error(f"Pantry Error Response (from history): {e.history}") # history might be more informative
+            except aiohttp.ClientError as e: # Catch other aiohttp client errors (e.g., connection issues)
+                 logging.error(f"AIOHTTP client error saving to Pantry (Basket: {pantry_basket_name}): {e}")
+            except Exception as e_pantry_generic:
+                logging.exception(f"An unexpected error occurred during Pantry save (Basket: {pantry_basket_name}): {e_pantry_generic}")
     elif pantry_id and not local_save_successful:
         logging.warning("Skipping Pantry save because local save failed.")
     elif not pantry_id:
@@ -139,6 +370,7 @@ async def save_output_to_file_async(
 
 # --- Pantry Loading Functions (NOW ASYNC) ---
 
+@traced("pantry.list_baskets")
 async def list_pantry_baskets_async(pantry_id: str) -> list[str] | None:
     """Fetches the list of basket names from a given Pantry ID (async)."""
     if not pantry_id:
@@ -147,17 +379,14 @@ async def list_pantry_baskets_async(pantry_id: str) -> list[str] | None:
     try:
         url = f"{PANTRY_BASE_URL}/{pantry_id}" # Endpoint for pantry details
         headers = {"Content-Type": "application/json"} # Usually not needed for GET but good practice
-        async with aiohttp.ClientSession() as session:
-            async with session.get(url, headers=headers) as response:
-                response.raise_for_status() # Check for HTTP errors
-                details = await response.json()
-                
-                baskets_data = details.get("baskets", [])
-                basket_names = [basket.get("name") for basket in baskets_data if basket.get("name")]
-                basket_names.sort() # Sort alphabetically, or consider sorting by a timestamp in name later
-                
-                logging.info(f"Successfully fetched {len(basket_names)} basket names from Pantry ID {pantry_id}.")
-                return basket_names
+        details = await _traced_pantry_request("GET", "list_baskets", url, headers=headers) # Raises on HTTP errors
+
+        baskets_data = details.get("baskets", [])
+        basket_names = [basket.get("name") for basket in baskets_data if basket.get("name")]
+        basket_names.sort() # Sort alphabetically, or consider sorting by a timestamp in name later
+
+        logging.info(f"Successfully fetched {len(basket_names)} basket names from Pantry ID {pantry_id}.")
+        return basket_names
     except aiohttp.ClientResponseError as http_err:
         logging.error(f"HTTP error fetching Pantry baskets for ID {pantry_id}: {http_err.status} - {http_err.message}")
         # response_text = await http_err.response.text() if hasattr(http_err, 'response') and http_err.response else "No response body"
@@ -173,6 +402,7 @@ async def list_pantry_baskets_async(pantry_id: str) -> list[str] | None:
         logging.exception(f"An unexpected error occurred while listing Pantry baskets for ID {pantry_id}: {e_generic}")
         return None
 
+@traced("pantry.get_basket")
 async def get_pantry_basket_content_async(pantry_id: str, basket_name: str) -> dict | None:
     """Fetches the content of a specific basket from Pantry (async)."""
     if not pantry_id or not basket_name:
@@ -181,13 +411,9 @@ async def get_pantry_basket_content_async(pantry_id: str, basket_name: str) -> d
     try:
         url = f"{PANTRY_BASE_URL}/{pantry_id}/basket/{basket_name}"
         headers = {"Content-Type": "application/json"} # As before
-        async with aiohttp.ClientSession() as session:
-            async with session.get(url, headers=headers) as response:
-                response.raise_for_status() # Check for HTTP errors
-                
-                basket_content = await response.json()
-                logging.info(f"Successfully fetched content for basket '{basket_name}' from Pantry ID {pantry_id}.")
-                return basket_content # This should be the full saved data structure
+        basket_content = await _traced_pantry_request("GET", "get_basket", url, span_attributes={"basket": basket_name}, headers=headers) # Raises on HTTP errors
+        logging.info(f"Successfully fetched content for basket '{basket_name}' from Pantry ID {pantry_id}.")
+        return basket_content # This should be the full saved data structure
     except aiohttp.ClientResponseError as http_err:
         logging.error(f"HTTP error fetching content for Pantry basket '{basket_name}' (ID: {pantry_id}): {http_err.status} - {http_err.message}")
         # response_text = await http_err.response.text() if hasattr(http_err, 'response') and http_err.response else "No response body"
@@ -206,20 +432,18 @@ async def get_pantry_basket_content_async(pantry_id: str, basket_name: str) -> d
 # NEW: Function to read prompt files
 async def read_prompt_file_async(prompt_filename: str) -> str:
     """
-    Asynchronously reads the content of a prompt file from the 'app/prompts' directory.
+    Returns the content of a prompt file from the 'app/prompts' directory.
+    Served from the in-memory prompt registry; the file is only re-read when its mtime changes.
     """
-    filepath = os.path.join("app", "prompts", prompt_filename)
     try:
-        async with aiofiles.open(filepath, mode='r', encoding='utf-8') as f:
-            content = await f.read()
-        logging.info(f"Successfully read prompt file: {filepath}")
-        return content
+        return get_prompt_template(prompt_filename).text
     except FileNotFoundError:
+        filepath = os.path.join(PROMPTS_DIR, prompt_filename)
         logging.error(f"Prompt file not found: {filepath}")
         return f"Error: Prompt file not found at {filepath}"
     except Exception as e:
-        logging.exception(f"Error reading prompt file {filepath}: {e}")
-        return f"Error reading prompt file {filepath}: {e}"
+        logging.exception(f"Error reading prompt file {prompt_filename}: {e}")
+        return f"Error reading prompt file {prompt_filename}: {e}"
 
 # Placeholder function remains the same
 def extract_keywords(text):
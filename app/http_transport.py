@@ -0,0 +1,137 @@
+import os
+import asyncio
+import logging
+import threading
+import importlib.util
+import weakref
+import httpx
+
+# Configure logging (can be configured centrally if preferred)
+logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+
+LLM_HTTP_MAX_CONNECTIONS = int(os.getenv("LLM_HTTP_MAX_CONNECTIONS", "20"))
+LLM_HTTP_KEEPALIVE_CONNECTIONS = int(os.getenv("LLM_HTTP_KEEPALIVE_CONNECTIONS", "10"))
+LLM_HTTP_KEEPALIVE_EXPIRY = float(os.getenv("LLM_HTTP_KEEPALIVE_EXPIRY", "120"))  # Seconds an idle connection is kept
+# HTTP/2 multiplexes concurrent calls over one connection; needs the optional 'h2' package
+LLM_HTTP2 = os.getenv("LLM_HTTP2", "false").strip().lower() in ("1", "true", "yes", "on")
+
+
+def http2_available() -> bool:
+    return importlib.util.find_spec("h2") is not None
+
+
+# --- Reuse Metrics ---
+class ConnectionStats:
+    """Counts requests against the connections opened for them; a request with no TCP connect reused one."""
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.requests = 0
+        self.new_connections = 0
+        self.tls_handshakes = 0
+        self.http2_requests = 0
+
+    def record(self, connected: bool, tls: bool, http_version: str | None) -> None:
+        with self._lock:
+            self.requests += 1
+            self.new_connections += connected
+            self.tls_handshakes += tls
+            self.http2_requests += http_version == "HTTP/2"
+
+    def snapshot(self) -> dict:
+        with self._lock:
+            reused = self.requests - self.new_connections
+            return {
+                "requests": self.requests,
+                "new_connections": self.new_connections,
+                "reused_connections": reused,
+                "reuse_rate": round(reused / self.requests, 4) if self.requests else None,
+                "tls_handshakes": self.tls_handshakes,
+                "http2_requests": self.http2_requests,
+            }
+
+
+# --- Shared Transport ---
+class SharedAsyncTransport(httpx.AsyncBaseTransport):
+    """
+    Keep-alive connection pool shared by every LLM client in the process.
+
+    Pooled connections belong to the event loop that opened them, and the UI runs each generation
+    in a fresh loop, so one pool is kept per running loop (dropped once that loop is gone). Within
+    a loop, back-to-back stages and concurrent calls reuse warm connections instead of repeating
+    TCP and TLS setup.
+    """
+    def __init__(self, http2: bool = LLM_HTTP2, limits: httpx.Limits | None = None):
+        if http2 and not http2_available():
+            logging.warning("LLM_HTTP2 is on but the 'h2' package is not installed; LLM calls will use HTTP/1.1 keep-alive.")
+            http2 = False
+        self.http2 = http2
+        self.limits = limits or httpx.Limits(
+            max_connections=LLM_HTTP_MAX_CONNECTIONS,
+            max_keepalive_connections=LLM_HTTP_KEEPALIVE_CONNECTIONS,
+            keepalive_expiry=LLM_HTTP_KEEPALIVE_EXPIRY,
+        )
+        self.stats = ConnectionStats()
+        self._pools: weakref.WeakKeyDictionary = weakref.WeakKeyDictionary()
+        self._lock = threading.Lock()
+
+    def _pool_for_current_loop(self) -> httpx.AsyncHTTPTransport:
+        loop = asyncio.get_running_loop()
+        with self._lock:
+            pool = self._pools.get(loop)
+            if pool is None:
+                # A pool's sockets keep its loop alive, so pools of finished loops are dropped by hand
+                for stale in [old for old in self._pools.keys() if old.is_closed()]:
+                    del self._pools[stale]
+                pool = self._pools[loop] = httpx.AsyncHTTPTransport(http2=self.http2, limits=self.limits)
+            return pool
+
+    async def handle_async_request(self, request: httpx.Request) -> httpx.Response:
+        events = set()
+        outer_trace = request.extensions.get("trace")
+
+        async def trace(event_name: str, info: dict):
+            events.add(event_name)
+            if outer_trace is not None:
+                await outer_trace(event_name, info)
+
+        request.extensions["trace"] = trace
+        response = await self._pool_for_current_loop().handle_async_request(request)
+        self.stats.record(
+            connected="connection.connect_tcp.started" in events,
+            tls="connection.start_tls.started" in events,
+            http_version=response.extensions.get("http_version", b"").decode("ascii", "replace") or None,
+        )
+        return response
+
+    async def aclose(self) -> None:
+        try:
+            pool = self._pools.get(asyncio.get_running_loop())
+        except RuntimeError:
+            return
+        if pool is not None:
+            await pool.aclose()
+
+
+_shared_client: httpx.AsyncClient | None = None
+_shared_transport: SharedAsyncTransport | None = None
+_shared_client_lock = threading.Lock()
+
+
+def get_shared_async_http_client() -> httpx.AsyncClient:
+    """The process-wide httpx client handed to every ChatOpenAI instance (created on first use)."""
+    global _shared_client, _shared_transport
+    with _shared_client_lock:
+        if _shared_client is None:
+            _shared_transport = SharedAsyncTransport()
+            _shared_client = httpx.AsyncClient(transport=_shared_transport)
+            logging.info(f"Shared LLM HTTP transport created (HTTP/2: {_shared_transport.http2}, max connections: {_shared_transport.limits.max_connections}).")
+        return _shared_client
+
+
+def http_transport_stats() -> dict:
+    """Connection reuse counters for the shared LLM transport (empty if it has not been created)."""
+    with _shared_client_lock:
+        transport = _shared_transport
+    if transport is None:
+        return {}
+    return {"http2": transport.http2, **transport.stats.snapshot()}
@@ -0,0 +1,214 @@
+import os
+import time
+import uuid
+import asyncio
+import logging
+import threading
+from collections import deque
+
+# Configure logging (can be configured centrally if preferred)
+logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+
+JOB_MAX_CONCURRENT = int(os.getenv("JOB_MAX_CONCURRENT", "2"))   # Jobs generating at the same time; others queue
+JOB_HISTORY_LIMIT = int(os.getenv("JOB_HISTORY_LIMIT", "50"))    # Finished jobs kept for polling (oldest dropped first)
+_JOB_EVENT_LIMIT = 500
+
+
+# --- Job Record ---
+class Job:
+    """
+    One background job. Its callbacks (`on_stage_event`, `on_blog_field`) are called from the
+    job loop's thread while `snapshot()` is read from Streamlit's, so all state sits behind a lock.
+    """
+    QUEUED = "queued"
+    RUNNING = "running"
+    SUCCEEDED = "succeeded"
+    FAILED = "failed"
+    CANCELLED = "cancelled"
+    FINISHED_STATES = (SUCCEEDED, FAILED, CANCELLED)
+
+    def __init__(self, label: str, metadata: dict | None = None):
+        self.job_id = uuid.uuid4().hex[:12]
+        self.label = label
+        self.metadata = dict(metadata or {})
+        self.status = self.QUEUED
+        self.created_at = time.time()
+        self.started_at = None
+        self.finished_at = None
+        self.stages: dict[str, str] = {}
+        self.events: deque = deque(maxlen=_JOB_EVENT_LIMIT)
+        self.partial: dict = {}
+        self.result = None
+        self.error = None
+        self._future = None
+        self._lock = threading.Lock()
+
+    def on_stage_event(self, event: dict) -> None:
+        """Stage callback for `run_stage_graph` (pending/started/finished/skipped/failed)."""
+        with self._lock:
+            self.stages[event["stage"]] = event["event"]
+            self.events.append({**event, "at": time.time()})
+
+    def on_blog_field(self, key: str, value) -> None:
+        """Streaming callback: keeps the blog fields received so far for partial rendering."""
+        with self._lock:
+            self.partial[key] = value
+
+    def _set(self, **fields) -> None:
+        with self._lock:
+            for name, value in fields.items():
+                setattr(self, name, value)
+
+    @property
+    def finished(self) -> bool:
+        return self.status in self.FINISHED_STATES
+
+    def snapshot(self, include_result: bool = False) -> dict:
+        with self._lock:
+            done = sum(1 for event in self.stages.values() if event in ("finished", "skipped"))
+            end = self.finished_at or time.time()
+            snapshot = {
+                "job_id": self.job_id,
+                "label": self.label,
+                "metadata": dict(self.metadata),
+                "status": self.status,
+                "created_at": self.created_at,
+                "started_at": self.started_at,
+                "finished_at": self.finished_at,
+                "elapsed_seconds": round(end - self.started_at, 1) if self.started_at else None,
+                "progress": {"done": done, "total": len(self.stages)},
+                "stages": dict(self.stages),
+                "partial": dict(self.partial),
+                "error": self.error,
+            }
+            if include_result:
+                snapshot["result"] = self.result
+            return snapshot
+
+
+# --- Manager ---
+class JobManager:
+    """
+    Runs coroutines on one persistent event loop in a daemon thread, so work outlives the Streamlit
+    script run (and browser session) that started it. Jobs are addressed by id: `submit`, `poll`,
+    `result`, `cancel`, `list_jobs`. At most `max_concurrent` jobs run at once; the rest wait queued.
+    """
+    def __init__(self, max_concurrent: int = JOB_MAX_CONCURRENT, history_limit: int = JOB_HISTORY_LIMIT):
+        self.max_concurrent = max(1, max_concurrent)
+        self.history_limit = max(1, history_limit)
+        self._jobs: dict[str, Job] = {}
+        self._lock = threading.Lock()
+        self._loop: asyncio.AbstractEventLoop | None = None
+        self._thread: threading.Thread | None = None
+        self._slots: asyncio.Semaphore | None = None
+
+    def _ensure_loop(self) -> asyncio.AbstractEventLoop:
+        with self._lock:
+            if self._loop is None or not self._thread.is_alive():
+                loop = asyncio.new_event_loop()
+                ready = threading.Event()
+
+                def run():
+                    asyncio.set_event_loop(loop)
+                    self._slots = asyncio.Semaphore(self.max_concurrent)
+                    ready.set()
+                    loop.run_forever()
+
+                self._thread = threading.Thread(target=run, name="job-manager-loop", daemon=True)
+                self._thread.start()
+                ready.wait()
+                self._loop = loop
+                logging.info(f"Job manager loop started (max {self.max_concurrent} concurrent job(s)).")
+            return self._loop
+
+    async def _run(self, job: Job, coroutine_factory):
+        async with self._slots:
+            job._set(status=Job.RUNNING, started_at=time.time())
+            logging.info(f"Job {job.job_id} ('{job.label}') started.")
+            try:
+                result = await coroutine_factory(job)
+            except asyncio.CancelledError:
+                job._set(status=Job.CANCELLED, finished_at=time.time())
+                logging.info(f"Job {job.job_id} cancelled.")
+                raise
+            except Exception as e:
+                logging.exception(f"Job {job.job_id} failed: {e}")
+                job._set(status=Job.FAILED, error=f"{type(e).__name__}: {e}", finished_at=time.time())
+                return None
+            # Pipeline functions report failure as {"error": ...} rather than raising
+            error = result.get("error") if isinstance(result, dict) else None
+            job._set(status=Job.FAILED if error else Job.SUCCEEDED, result=result, error=error, finished_at=time.time())
+            logging.info(f"Job {job.job_id} {job.status} in {job.finished_at - job.started_at:.1f}s.")
+            return result
+
+    def submit(self, coroutine_factory, label: str = "", **metadata) -> str:
+        """
+        Schedules `coroutine_factory(job)` (which must return an awaitable) and returns the job id
+        immediately. The factory receives the Job so it can wire `job.on_stage_event` / `job.on_blog_field`.
+        """
+        loop = self._ensure_loop()
+        job = Job(label, metadata)
+        with self._lock:
+            self._jobs[job.job_id] = job
+            self._trim_history()
+        job._future = asyncio.run_coroutine_threadsafe(self._run(job, coroutine_factory), loop)
+        logging.info(f"Job {job.job_id} ('{label}') queued.")
+        return job.job_id
+
+    def _trim_history(self) -> None:
+        finished = [job for job in self._jobs.values() if job.finished]
+        for job in sorted(finished, key=lambda j: j.created_at)[:max(0, len(self._jobs) - self.history_limit)]:
+            del self._jobs[job.job_id]
+
+    def get(self, job_id: str) -> Job | None:
+        with self._lock:
+            return self._jobs.get(job_id)
+
+    def poll(self, job_id: str) -> dict | None:
+        """Status, stage progress and partial output of a job (None for an unknown id)."""
+        job = self.get(job_id)
+        return job.snapshot() if job else None
+
+    def result(self, job_id: str):
+        """The job's return value once it has finished, else None."""
+        job = self.get(job_id)
+        return job.result if job and job.finished else None
+
+    def cancel(self, job_id: str) -> bool:
+        """Requests cancellation; True if the job was still queued or running."""
+        job = self.get(job_id)
+        if job is None or job.finished or job._future is None:
+            return False
+        if job.status == Job.QUEUED:
+            job._set(status=Job.CANCELLED, finished_at=time.time())
+        return job._future.cancel()
+
+    def list_jobs(self) -> list[dict]:
+        """Snapshots of every known job, newest first."""
+        with self._lock:
+            jobs = list(self._jobs.values())
+        return [job.snapshot() for job in sorted(jobs, key=lambda j: j.created_at, reverse=True)]
+
+    def shutdown(self) -> None:
+        """Cancels outstanding jobs and stops the loop thread."""
+        with self._lock:
+            loop, jobs = self._loop, list(self._jobs.values())
+            self._loop = None
+        for job in jobs:
+            if not job.finished and job._future is not None:
+                job._future.cancel()
+        if loop is not None:
+            loop.call_soon_threadsafe(loop.stop)
+
+
+_manager: JobManager | None = None
+_manager_lock = threading.Lock()
+
+
+def get_job_manager() -> JobManager:
+    """The process-wide job manager; shared by every Streamlit session and rerun."""
+    global _manager
+    with _manager_lock:
+        if _manager is None:
+            _manager = JobManager()
+        return _manager
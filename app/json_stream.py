@@ -0,0 +1,114 @@
+import json
+import logging
+
+# Configure logging (can be configured centrally if preferred)
+logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+
+
+# --- Incremental Top-level JSON Object Parser ---
+class IncrementalJSONObjectParser:
+    """
+    Consumes a streamed JSON object chunk by chunk and reports each top-level member
+    as soon as its value is complete.
+
+    Every character is scanned exactly once, so total work is linear in the response size.
+    Anything before the first '{' (e.g. a ```json fence) is ignored, and literal newlines
+    inside string values are accepted, as LLMs frequently emit them.
+
+        parser = IncrementalJSONObjectParser()
+        for chunk in chunks:
+            for key, value in parser.feed(chunk):
+                ...
+    """
+    def __init__(self):
+        self.text = ""          # Everything received so far (callers often need the raw output too)
+        self.fields: dict = {}  # Completed members in arrival order
+        self.finished = False   # True once the closing brace of the top-level object was seen
+        self._pos = 0
+        self._started = False
+        self._depth = 0
+        self._in_string = False
+        self._escape = False
+        self._key_start = None
+        self._key = None
+        self._value_start = None
+
+    def feed(self, chunk: str) -> list[tuple[str, object]]:
+        """Adds a chunk and returns the (key, value) pairs completed by it."""
+        if not chunk or self.finished:
+            self.text += chunk or ""
+            return []
+        self.text += chunk
+        completed = []
+        text = self.text
+        pos = self._pos
+        end = len(text)
+
+        while pos < end:
+            ch = text[pos]
+
+            if not self._started:
+                if ch == "{":
+                    self._started = True
+                    self._depth = 1
+                pos += 1
+                continue
+
+            if self._in_string:
+                if self._escape:
+                    self._escape = False
+                elif ch == "\\":
+                    self._escape = True
+                elif ch == '"':
+                    self._in_string = False
+                    if self._depth == 1 and self._key is None and self._value_start is None and self._key_start is not None:
+                        self._key = self._decode_key(text[self._key_start:pos + 1])
+                pos += 1
+                continue
+
+            if ch == '"':
+                self._in_string = True
+                if self._depth == 1 and self._key is None and self._value_start is None:
+                    self._key_start = pos
+            elif ch in "{[":
+                self._depth += 1
+            elif ch in "}]":
+                self._depth -= 1
+                if self._depth == 0:
+                    self._complete_member(text[self._value_start:pos] if self._value_start is not None else None, completed)
+                    self.finished = True
+                    pos += 1
+                    break
+            elif self._depth == 1:
+                if ch == ":" and self._key is not None and self._value_start is None:
+                    self._value_start = pos + 1
+                elif ch == ",":
+                    self._complete_member(text[self._value_start:pos] if self._value_start is not None else None, completed)
+            pos += 1
+
+        self._pos = pos
+        return completed
+
+    def _decode_key(self, raw_key: str):
+        try:
+            return json.loads(raw_key, strict=False)
+        except json.JSONDecodeError:
+            return raw_key.strip('"')
+
+    def _complete_member(self, value_text: str | None, completed: list) -> None:
+        key = self._key
+        self._key = None
+        self._key_start = None
+        self._value_start = None
+        if key is None or value_text is None:
+            return
+        value_text = value_text.strip()
+        if not value_text:
+            return # Trailing comma: nothing to emit
+        try:
+            value = json.loads(value_text, strict=False)
+        except json.JSONDecodeError as e:
+            logging.debug(f"Streamed JSON member '{key}' could not be decoded yet: {e}")
+            return
+        self.fields[key] = value
+        completed.append((key, value))
@@ -0,0 +1,277 @@
+import os
+import json
+import time
+import sqlite3
+import asyncio
+import hashlib
+import logging
+import threading
+import contextvars
+from contextlib import contextmanager
+from langchain_core.messages import AIMessage, AIMessageChunk
+
+# Configure logging (can be configured centrally if preferred)
+logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+
+LLM_CACHE_DIR = os.getenv("LLM_CACHE_DIR", ".llm_cache")
+LLM_CACHE_MAX_ENTRIES = int(os.getenv("LLM_CACHE_MAX_ENTRIES", "2000"))
+LLM_CACHE_MAX_BYTES = int(os.getenv("LLM_CACHE_MAX_BYTES", str(200 * 1024 * 1024)))
+LLM_CACHE_TTL_SECONDS = int(os.getenv("LLM_CACHE_TTL_SECONDS", str(7 * 24 * 3600)))
+
+# Client attributes that change the response for identical messages
+_KEY_PARAMETERS = ("model_name", "temperature", "max_tokens", "top_p", "seed", "n", "frequency_penalty", "presence_penalty", "stop", "model_kwargs", "reasoning_effort")
+
+# Set by bypass_llm_cache(); inherited by every task spawned inside the block
+_bypass_cache_var = contextvars.ContextVar("bypass_llm_cache", default=False)
+
+
+@contextmanager
+def bypass_llm_cache(enabled: bool = True):
+    """Within this block every cached client goes to the model and refreshes the stored entry."""
+    token = _bypass_cache_var.set(enabled)
+    try:
+        yield
+    finally:
+        _bypass_cache_var.reset(token)
+
+
+def _message_payload(message) -> dict:
+    content = message.content
+    if not isinstance(content, str):
+        content = json.dumps(content, sort_keys=True, ensure_ascii=False, default=str)
+    return {"type": getattr(message, "type", type(message).__name__), "content": content}
+
+
+def build_cache_key(client, messages, call_kwargs: dict | None = None) -> str:
+    """Content address of a request: model parameters + message hash + per-call kwargs."""
+    params = {name: getattr(client, name, None) for name in _KEY_PARAMETERS}
+    payload = {
+        "params": params,
+        "messages": [_message_payload(m) for m in messages],
+        "call_kwargs": call_kwargs or {},
+    }
+    encoded = json.dumps(payload, sort_keys=True, ensure_ascii=False, default=str).encode("utf-8")
+    return hashlib.sha256(encoded).hexdigest()
+
+
+def _is_cacheable(content: str, finish_reason) -> bool:
+    """Empty or cut-off responses (max_tokens, content filter) would otherwise be replayed on every rerun."""
+    return bool(content.strip()) and (finish_reason is None or str(finish_reason).lower() == "stop")
+
+
+def llm_cache_key(response) -> str | None:
+    """The cache key a cached client attached to its response (or first streamed chunk), if any."""
+    return (getattr(response, "response_metadata", None) or {}).get("llm_cache_key")
+
+
+# --- On-disk Store ---
+class LLMResponseCache:
+    """
+    SQLite-backed response store with a TTL, an entry cap and a byte cap.
+    Eviction is least-recently-used (by last access time).
+    """
+    def __init__(self, directory: str = LLM_CACHE_DIR, max_entries: int = LLM_CACHE_MAX_ENTRIES,
+                 max_bytes: int = LLM_CACHE_MAX_BYTES, ttl_seconds: int = LLM_CACHE_TTL_SECONDS):
+        self.path = os.path.join(directory, "llm_responses.sqlite")
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.ttl_seconds = ttl_seconds
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+        os.makedirs(directory, exist_ok=True)
+        self._conn = sqlite3.connect(self.path, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS responses ("
+            " key TEXT PRIMARY KEY, model TEXT, content TEXT NOT NULL, usage TEXT,"
+            " size INTEGER NOT NULL, created_at REAL NOT NULL, last_access REAL NOT NULL)"
+        )
+        self._conn.execute("CREATE INDEX IF NOT EXISTS idx_responses_last_access ON responses(last_access)")
+        self._conn.commit()
+
+    def get(self, key: str) -> dict | None:
+        now = time.time()
+        with self._lock:
+            row = self._conn.execute("SELECT content, usage, created_at, model FROM responses WHERE key = ?", (key,)).fetchone()
+            if row is None:
+                self.misses += 1
+                return None
+            content, usage, created_at, model = row
+            if self.ttl_seconds and now - created_at > self.ttl_seconds:
+                self._conn.execute("DELETE FROM responses WHERE key = ?", (key,))
+                self._conn.commit()
+                self.misses += 1
+                return None
+            self._conn.execute("UPDATE responses SET last_access = ? WHERE key = ?", (now, key))
+            self._conn.commit()
+            self.hits += 1
+        return {"content": content, "usage": json.loads(usage) if usage else None, "model": model, "created_at": created_at}
+
+    def put(self, key: str, model: str | None, content: str, usage: dict | None = None) -> None:
+        now = time.time()
+        usage_json = json.dumps(usage) if usage else None
+        size = len(content.encode("utf-8")) + (len(usage_json) if usage_json else 0)
+        with self._lock:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO responses (key, model, content, usage, size, created_at, last_access) VALUES (?, ?, ?, ?, ?, ?, ?)",
+                (key, model, content, usage_json, size, now, now)
+            )
+            self._evict(now)
+            self._conn.commit()
+
+    def _evict(self, now: float) -> None:
+        if self.ttl_seconds:
+            self._conn.execute("DELETE FROM responses WHERE created_at < ?", (now - self.ttl_seconds,))
+        count, total_bytes = self._conn.execute("SELECT COUNT(*), COALESCE(SUM(size), 0) FROM responses").fetchone()
+        if count <= self.max_entries and total_bytes <= self.max_bytes:
+            return
+        evicted = 0
+        for key, size in self._conn.execute("SELECT key, size FROM responses ORDER BY last_access ASC").fetchall():
+            if count <= self.max_entries and total_bytes <= self.max_bytes:
+                break
+            self._conn.execute("DELETE FROM responses WHERE key = ?", (key,))
+            count -= 1
+            total_bytes -= size
+            evicted += 1
+        logging.info(f"LLM cache evicted {evicted} least-recently-used entr{'y' if evicted == 1 else 'ies'}.")
+
+    def invalidate(self, key: str) -> None:
+        with self._lock:
+            self._conn.execute("DELETE FROM responses WHERE key = ?", (key,))
+            self._conn.commit()
+
+    def clear(self) -> None:
+        with self._lock:
+            self._conn.execute("DELETE FROM responses")
+            self._conn.commit()
+
+    def stats(self) -> dict:
+        with self._lock:
+            count, total_bytes = self._conn.execute("SELECT COUNT(*), COALESCE(SUM(size), 0) FROM responses").fetchone()
+        return {"entries": count, "bytes": total_bytes, "hits": self.hits, "misses": self.misses, "path": self.path}
+
+
+# --- Client Wrapper ---
+class CachedChatModel:
+    """
+    Wraps a chat model (a role's model pool, or e.g. ChatOpenAI) and serves identical requests
+    from the response cache. Empty and truncated responses are not stored. Every response (or the
+    first chunk of a stream) carries its key as `response_metadata["llm_cache_key"]`, so a caller
+    that cannot parse it can drop the entry with `invalidate_llm_response`.
+    Anything other than ainvoke/astream is delegated to the wrapped client.
+    """
+    wraps_chat_model = True
+
+    def __init__(self, client, cache: LLMResponseCache):
+        self.client = client
+        self.cache = cache
+
+    def __getattr__(self, name):
+        return getattr(self.client, name)
+
+    async def ainvoke(self, messages, config=None, *, bypass_cache: bool = False, **kwargs):
+        bypass = bypass_cache or _bypass_cache_var.get()
+        key = build_cache_key(self.client, messages, kwargs)
+        model_name = getattr(self.client, "model_name", None)
+
+        if not bypass:
+            try:
+                cached = await asyncio.to_thread(self.cache.get, key)
+            except Exception as e:
+                logging.warning(f"LLM cache lookup failed ({e}); calling the model.")
+                cached = None
+            if cached is not None:
+                logging.info(f"LLM cache hit for model '{model_name}' (key {key[:12]}).")
+                return AIMessage(
+                    content=cached["content"],
+                    usage_metadata=cached["usage"],
+                    response_metadata={"model_name": cached["model"], "cache_hit": True, "llm_cache_key": key},
+                )
+
+        response = await self.client.ainvoke(messages, config, **kwargs)
+        response.response_metadata["llm_cache_key"] = key
+        finish_reason = response.response_metadata.get("finish_reason")
+        if isinstance(response.content, str) and not _is_cacheable(response.content, finish_reason):
+            logging.info(f"Not caching LLM response from model '{model_name}' (empty or finish_reason '{finish_reason}').")
+        elif isinstance(response.content, str):
+            try:
+                await asyncio.to_thread(self.cache.put, key, model_name, response.content, getattr(response, "usage_metadata", None))
+            except Exception as e:
+                logging.warning(f"Failed to store LLM response in cache: {e}")
+        return response
+
+    async def astream(self, messages, config=None, *, bypass_cache: bool = False, **kwargs):
+        """Streams from the model on a miss (storing the assembled text); a hit is replayed as a single chunk."""
+        bypass = bypass_cache or _bypass_cache_var.get()
+        key = build_cache_key(self.client, messages, kwargs)
+        model_name = getattr(self.client, "model_name", None)
+
+        if not bypass:
+            try:
+                cached = await asyncio.to_thread(self.cache.get, key)
+            except Exception as e:
+                logging.warning(f"LLM cache lookup failed ({e}); streaming from the model.")
+                cached = None
+            if cached is not None:
+                logging.info(f"LLM cache hit for streamed call to model '{model_name}' (key {key[:12]}).")
+                yield AIMessageChunk(
+                    content=cached["content"],
+                    usage_metadata=cached["usage"],
+                    response_metadata={"model_name": cached["model"], "cache_hit": True, "llm_cache_key": key},
+                )
+                return
+
+        pieces = []
+        usage = None
+        finish_reason = None
+        streamed_text_only = True
+        first = True
+        async for chunk in self.client.astream(messages, config, **kwargs):
+            if first:
+                chunk.response_metadata["llm_cache_key"] = key
+                first = False
+            if isinstance(chunk.content, str):
+                pieces.append(chunk.content)
+            else:
+                streamed_text_only = False
+            usage = getattr(chunk, "usage_metadata", None) or usage
+            finish_reason = chunk.response_metadata.get("finish_reason") or finish_reason
+            yield chunk
+
+        content = "".join(pieces)
+        if streamed_text_only and not _is_cacheable(content, finish_reason):
+            logging.info(f"Not caching streamed LLM response from model '{model_name}' (empty or finish_reason '{finish_reason}').")
+        elif streamed_text_only:
+            try:
+                await asyncio.to_thread(self.cache.put, key, model_name, content, usage)
+            except Exception as e:
+                logging.warning(f"Failed to store streamed LLM response in cache: {e}")
+
+
+_shared_cache: LLMResponseCache | None = None
+_shared_cache_lock = threading.Lock()
+
+
+def get_llm_cache() -> LLMResponseCache:
+    """Process-wide cache instance shared by all wrapped clients."""
+    global _shared_cache
+    with _shared_cache_lock:
+        if _shared_cache is None:
+            _shared_cache = LLMResponseCache()
+        return _shared_cache
+
+
+async def invalidate_llm_response(key: str | None) -> None:
+    """Drops a cached response the caller could not use (e.g. it failed to parse), so the next identical request goes to the model."""
+    if not key or _shared_cache is None:
+        return
+    try:
+        await asyncio.to_thread(_shared_cache.invalidate, key)
+        logging.info(f"Dropped unusable LLM response from cache (key {key[:12]}).")
+    except Exception as e:
+        logging.warning(f"Failed to drop LLM response from cache: {e}")
+
+
+def is_llm_cache_enabled() -> bool:
+    return os.getenv("LLM_CACHE_ENABLED", "true").strip().lower() in ("1", "true", "yes", "on")
@@ -0,0 +1,271 @@
+import os
+import json
+import time
+import random
+import asyncio
+import logging
+import threading
+from langchain_core.messages import AIMessage, AIMessageChunk
+from .llm_cache import build_cache_key
+
+# Configure logging (can be configured centrally if preferred)
+logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+
+# off: normal calls; record: call the model and append every exchange to the cassette;
+# replay: answer from the cassette only (no network, no API key needed)
+LLM_CASSETTE_MODE = os.getenv("LLM_CASSETTE_MODE", "off").strip().lower()
+LLM_CASSETTE_PATH = os.getenv("LLM_CASSETTE_PATH", os.path.join("cassettes", "llm.jsonl"))
+# Replay latency, e.g. "recorded", "none", "fixed:2", "uniform:1,4", "normal:8,2", "lognormal:12,0.5",
+# optionally per model: "gemini-2.5-pro=lognormal:25,0.4;gpt-4.1=uniform:2,6;*=recorded"
+LLM_CASSETTE_LATENCY = os.getenv("LLM_CASSETTE_LATENCY", "recorded")
+LLM_CASSETTE_LATENCY_SCALE = float(os.getenv("LLM_CASSETTE_LATENCY_SCALE", "1.0"))  # Multiplies every replay delay
+LLM_CASSETTE_SEED = os.getenv("LLM_CASSETTE_SEED", "0")                            # Empty for a different draw per run
+LLM_CASSETTE_STREAM_CHUNKS = int(os.getenv("LLM_CASSETTE_STREAM_CHUNKS", "20"))     # Max chunks a replayed stream is split into
+
+_MODES = ("off", "record", "replay")
+
+
+class CassetteMissError(LookupError):
+    """Raised in replay mode for a request the cassette has no recording of."""
+
+
+# --- Latency Distributions ---
+class LatencyModel:
+    """
+    Replay delay per call, drawn from a distribution given as `kind:params` per model (see
+    LLM_CASSETTE_LATENCY). "recorded" replays the latency measured when the call was recorded.
+    Draws come from one seeded generator, so a run's delays are reproducible.
+    """
+    def __init__(self, spec: str = LLM_CASSETTE_LATENCY, scale: float = LLM_CASSETTE_LATENCY_SCALE, seed: str | None = LLM_CASSETTE_SEED):
+        self.scale = scale
+        self._random = random.Random(int(seed) if seed not in (None, "") else None)
+        self._lock = threading.Lock()
+        self._by_model: dict[str, tuple[str, tuple[float, ...]]] = {}
+        self._default = ("recorded", ())
+        for part in (spec or "recorded").split(";"):
+            part = part.strip()
+            if not part:
+                continue
+            model, _, distribution = part.rpartition("=")
+            parsed = self._parse(distribution)
+            if model and model != "*":
+                self._by_model[model.strip()] = parsed
+            else:
+                self._default = parsed
+
+    @staticmethod
+    def _parse(distribution: str) -> tuple[str, tuple[float, ...]]:
+        kind, _, params = distribution.strip().lower().partition(":")
+        values = tuple(float(value) for value in params.split(",") if value.strip())
+        expected = {"recorded": 0, "none": 0, "fixed": 1, "uniform": 2, "normal": 2, "lognormal": 2}
+        if kind not in expected or len(values) != expected[kind]:
+            raise ValueError(f"Invalid LLM cassette latency '{distribution}' (expected e.g. recorded, none, fixed:S, uniform:A,B, normal:MEAN,SD, lognormal:MEDIAN,SIGMA)")
+        return kind, values
+
+    def sample(self, model_name: str | None, recorded_seconds: float | None) -> float:
+        kind, values = self._by_model.get(model_name or "", self._default)
+        with self._lock:
+            if kind == "recorded":
+                seconds = recorded_seconds or 0.0
+            elif kind == "none":
+                seconds = 0.0
+            elif kind == "fixed":
+                seconds = values[0]
+            elif kind == "uniform":
+                seconds = self._random.uniform(values[0], values[1])
+            elif kind == "normal":
+                seconds = self._random.gauss(values[0], values[1])
+            else: # lognormal, parameterized by its median so the numbers read as seconds
+                seconds = values[0] * self._random.lognormvariate(0.0, values[1])
+        return max(0.0, seconds) * self.scale
+
+
+# --- Cassette File ---
+class LLMCassette:
+    """
+    Recorded LLM exchanges, one JSON object per line (append-only, so recording runs can be
+    concatenated). Entries are keyed like the response cache (model parameters, messages and call
+    kwargs). A key recorded several times is replayed in recording order, then cycles.
+    """
+    def __init__(self, path: str = LLM_CASSETTE_PATH):
+        self.path = path
+        self._lock = threading.Lock()
+        self._entries: dict[str, list[dict]] = {}
+        self._cursors: dict[str, int] = {}
+        self.replayed = 0
+        self.recorded = 0
+        self.misses = 0
+        if os.path.exists(path):
+            with open(path, 'r', encoding='utf-8') as f:
+                for line_number, line in enumerate(f, 1):
+                    if not line.strip():
+                        continue
+                    try:
+                        entry = json.loads(line)
+                    except json.JSONDecodeError:
+                        logging.warning(f"LLM cassette: skipping unreadable line {line_number} of {path}.")
+                        continue
+                    self._entries.setdefault(entry["key"], []).append(entry)
+
+    def __len__(self) -> int:
+        return sum(len(entries) for entries in self._entries.values())
+
+    def append(self, entry: dict) -> None:
+        line = json.dumps(entry, ensure_ascii=False) + "\n"
+        with self._lock:
+            directory = os.path.dirname(self.path)
+            if directory:
+                os.makedirs(directory, exist_ok=True)
+            with open(self.path, 'a', encoding='utf-8') as f:
+                f.write(line)
+            self._entries.setdefault(entry["key"], []).append(entry)
+            self.recorded += 1
+
+    def next_entry(self, key: str) -> dict | None:
+        with self._lock:
+            entries = self._entries.get(key)
+            if not entries:
+                self.misses += 1
+                return None
+            cursor = self._cursors.get(key, 0)
+            self._cursors[key] = cursor + 1
+            self.replayed += 1
+            return entries[cursor % len(entries)]
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {"path": self.path, "entries": len(self), "recorded": self.recorded, "replayed": self.replayed, "misses": self.misses}
+
+
+# --- Client Wrapper ---
+def _prompt_preview(messages, limit: int = 200) -> str:
+    """The start of the last message, so a cassette line can be recognized by eye."""
+    if not messages:
+        return ""
+    content = messages[-1].content
+    return (content if isinstance(content, str) else json.dumps(content, ensure_ascii=False, default=str))[:limit]
+
+
+def _split_content(content: str, parts: int) -> list[str]:
+    parts = max(1, min(parts, len(content) or 1))
+    size = -(-len(content) // parts) if content else 0
+    return [content[i:i + size] for i in range(0, len(content), size)] if content else [""]
+
+
+class CassetteChatModel:
+    """
+    Wraps a ChatOpenAI client (innermost, below retries and pooling). In record mode each
+    ainvoke/astream goes to the model and is appended to the cassette with its latency, time to
+    first chunk and chunk count. In replay mode the client is never called: the recorded response
+    is returned after a delay drawn from `latency`, and a stream is re-chunked over that delay.
+    Anything other than ainvoke/astream is delegated to the wrapped client.
+    """
+    wraps_chat_model = True
+
+    def __init__(self, client, cassette: LLMCassette, mode: str, latency: LatencyModel | None = None):
+        self.client = client
+        self.cassette = cassette
+        self.mode = mode
+        self.latency = latency or LatencyModel()
+
+    def __getattr__(self, name):
+        return getattr(self.client, name)
+
+    def _key(self, messages, kwargs: dict) -> str:
+        return build_cache_key(self.client, messages, kwargs)
+
+    def _lookup(self, key: str) -> dict:
+        entry = self.cassette.next_entry(key)
+        if entry is None:
+            model_name = getattr(self.client, "model_name", None)
+            raise CassetteMissError(f"No recording for model '{model_name}' (key {key[:12]}) in {self.cassette.path}; record it with LLM_CASSETTE_MODE=record.")
+        return entry
+
+    async def _record(self, key: str, messages, call: str, content: str, usage, latency: float,
+                      first_chunk: float | None = None, chunks: int | None = None) -> None:
+        entry = {
+            "key": key,
+            "model": getattr(self.client, "model_name", None),
+            "call": call,
+            "prompt_preview": _prompt_preview(messages),
+            "content": content,
+            "usage": usage,
+            "latency_seconds": round(latency, 4),
+            "first_chunk_seconds": round(first_chunk, 4) if first_chunk is not None else None,
+            "chunks": chunks,
+            "recorded_at": time.time(),
+        }
+        try:
+            await asyncio.to_thread(self.cassette.append, entry)
+        except Exception as e:
+            logging.warning(f"Failed to append LLM exchange to cassette {self.cassette.path}: {e}")
+
+    async def ainvoke(self, messages, config=None, **kwargs):
+        key = self._key(messages, kwargs)
+        if self.mode == "replay":
+            entry = self._lookup(key)
+            await asyncio.sleep(self.latency.sample(entry.get("model"), entry.get("latency_seconds")))
+            return AIMessage(content=entry["content"], usage_metadata=entry.get("usage"),
+                             response_metadata={"model_name": entry.get("model"), "cassette_replay": True})
+
+        start = time.perf_counter()
+        response = await self.client.ainvoke(messages, config, **kwargs)
+        if isinstance(response.content, str):
+            await self._record(key, messages, "ainvoke", response.content, getattr(response, "usage_metadata", None), time.perf_counter() - start)
+        return response
+
+    async def astream(self, messages, config=None, **kwargs):
+        key = self._key(messages, kwargs)
+        if self.mode == "replay":
+            entry = self._lookup(key)
+            recorded_total = entry.get("latency_seconds")
+            total = self.latency.sample(entry.get("model"), recorded_total)
+            # Keep the recorded share of time spent before the first chunk (all of it for an ainvoke recording)
+            first_share = (entry.get("first_chunk_seconds") or 0.0) / recorded_total if entry.get("chunks") and recorded_total else 1.0
+            parts = _split_content(entry["content"], min(entry.get("chunks") or 1, LLM_CASSETTE_STREAM_CHUNKS))
+            await asyncio.sleep(total * first_share)
+            gap = total * (1.0 - first_share) / max(1, len(parts) - 1)
+            for index, part in enumerate(parts):
+                if index:
+                    await asyncio.sleep(gap)
+                last = index == len(parts) - 1
+                yield AIMessageChunk(content=part, usage_metadata=entry.get("usage") if last else None,
+                                     response_metadata={"model_name": entry.get("model"), "cassette_replay": True})
+            return
+
+        start = time.perf_counter()
+        first_chunk = None
+        pieces = []
+        usage = None
+        chunks = 0
+        async for chunk in self.client.astream(messages, config, **kwargs):
+            chunks += 1
+            if first_chunk is None:
+                first_chunk = time.perf_counter() - start
+            if isinstance(chunk.content, str):
+                pieces.append(chunk.content)
+            usage = getattr(chunk, "usage_metadata", None) or usage
+            yield chunk
+        await self._record(key, messages, "astream", "".join(pieces), usage, time.perf_counter() - start, first_chunk, chunks)
+
+
+_shared_cassette: LLMCassette | None = None
+_shared_cassette_lock = threading.Lock()
+
+
+def get_llm_cassette() -> LLMCassette:
+    """Process-wide cassette shared by every wrapped client."""
+    global _shared_cassette
+    with _shared_cassette_lock:
+        if _shared_cassette is None:
+            _shared_cassette = LLMCassette()
+            logging.info(f"LLM cassette '{_shared_cassette.path}' loaded with {len(_shared_cassette)} recorded exchange(s).")
+        return _shared_cassette
+
+
+def llm_cassette_mode() -> str:
+    """The configured cassette mode ('off', 'record' or 'replay'); unknown values mean 'off'."""
+    if LLM_CASSETTE_MODE not in _MODES:
+        logging.warning(f"Unknown LLM_CASSETTE_MODE '{LLM_CASSETTE_MODE}'; cassettes are off.")
+        return "off"
+    return LLM_CASSETTE_MODE
@@ -3,6 +3,12 @@ import logging
 from dotenv import load_dotenv
 from langchain_openai import ChatOpenAI
 from pydantic import SecretStr
+from .llm_cache import CachedChatModel, get_llm_cache, is_llm_cache_enabled
+from .tracing import TracedChatModel, TRACING_ENABLED
+from .llm_resilience import ResilientChatModel, LLM_RESILIENCE_ENABLED
+from .llm_pool import PooledChatModel
+from .http_transport import get_shared_async_http_client
+from .llm_cassette import CassetteChatModel, get_llm_cassette, llm_cassette_mode
 
 # Load environment variables
 load_dotenv()
@@ -11,17 +17,50 @@ load_dotenv()
 logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
 
 # --- LLM Client Initialization Function ---
+def _parse_model_list(value: str | None) -> list[str]:
+    return [name.strip() for name in (value or "").split(",") if name.strip()]
+
+
+def _build_model_client(model_name: str, api_key: SecretStr, base_url: str, timeout: float, max_retries: int, cassette_mode: str = "off"):
+    """One model's client chain: ChatOpenAI (or its cassette), then retries/hedging."""
+    client = ChatOpenAI(
+        model=model_name,
+        api_key=api_key,
+        base_url=base_url,
+        timeout=timeout,
+        max_retries=max_retries,
+        # One keep-alive pool for every model and every rerun, so back-to-back calls skip TCP/TLS setup
+        http_async_client=get_shared_async_http_client(),
+    )
+    # Record exchanges to, or replay them from, the LLM cassette; innermost, so every wrapper above still runs
+    if cassette_mode != "off":
+        client = CassetteChatModel(client, get_llm_cassette(), cassette_mode)
+    # Retry transient failures with backoff and hedge calls that run past the model's p95 latency
+    if LLM_RESILIENCE_ENABLED:
+        client = ResilientChatModel(client)
+    return client
+
+
 def initialize_llm_clients():
     llm_blog = None
     llm_image_prompt = None
     llm_instagram_text = None # Added new client
     GOOGLE_API_KEY = os.getenv("GOOGLE_API_KEY")
-    AVALAI_BASE_URL = "https://api.avalai.ir/v1"
+    AVALAI_BASE_URL = os.getenv("AVALAI_BASE_URL", "https://api.avalai.ir/v1") # Overridable, e.g. for the local stand-in server
     BLOG_MODEL_NAME = os.getenv("BLOG_MODEL_NAME", "gemini-2.5-pro")
     IMAGE_PROMPT_MODEL_NAME = os.getenv("IMAGE_PROMPT_MODEL_NAME", "gpt-4.1")
     INSTAGRAM_TEXT_MODEL_NAME = os.getenv("INSTAGRAM_TEXT_MODEL_NAME", "gemini-2.5-flash")
-    TIMEOUT = 90
+    # Comma-separated models tried in order when the primary fails or its circuit is open
+    BLOG_MODEL_FALLBACKS = _parse_model_list(os.getenv("BLOG_MODEL_FALLBACKS"))
+    IMAGE_PROMPT_MODEL_FALLBACKS = _parse_model_list(os.getenv("IMAGE_PROMPT_MODEL_FALLBACKS"))
+    INSTAGRAM_TEXT_MODEL_FALLBACKS = _parse_model_list(os.getenv("INSTAGRAM_TEXT_MODEL_FALLBACKS"))
+    TIMEOUT = float(os.getenv("LLM_TIMEOUT", "90"))
+    # The resilience wrapper owns retries; leaving the SDK's own retries on would multiply attempts
+    MAX_RETRIES = 0 if LLM_RESILIENCE_ENABLED else 2
 
+    cassette_mode = llm_cassette_mode()
+    if cassette_mode == "replay" and not GOOGLE_API_KEY:
+        GOOGLE_API_KEY = "cassette-replay" # Replay never reaches the API
     if not GOOGLE_API_KEY:
         logging.warning("GOOGLE_API_KEY not found in environment variables. Cannot initialize LLM clients.")
         return None, None, None # Adjusted return
@@ -29,38 +68,53 @@ def initialize_llm_clients():
     # Wrap GOOGLE_API_KEY in SecretStr
     google_api_key_secret = SecretStr(GOOGLE_API_KEY)
 
-    try:
-        logging.info(f"Initializing ChatOpenAI (Blog) with model='{BLOG_MODEL_NAME}', base_url='{AVALAI_BASE_URL}'...")
-        llm_blog = ChatOpenAI(
-            model=BLOG_MODEL_NAME,
-            api_key=google_api_key_secret,
-            base_url=AVALAI_BASE_URL,
-            timeout=TIMEOUT,
-        )
-        logging.info("ChatOpenAI client (Blog) initialized successfully.")
+    cache = None
+    if cassette_mode != "off":
+        # A cache hit would hide calls from the cassette (record) or skip the replayed latency (replay)
+        logging.info(f"LLM cassette mode '{cassette_mode}' ({get_llm_cassette().path}); the LLM response cache is not used.")
+    elif is_llm_cache_enabled():
+        try:
+            cache = get_llm_cache()
+            logging.info(f"LLM response cache enabled at '{cache.path}'.")
+        except Exception as cache_e:
+            logging.exception(f"Could not open LLM response cache, continuing without it: {cache_e}")
 
-        logging.info(f"Initializing ChatOpenAI (Image Prompt) with model='{IMAGE_PROMPT_MODEL_NAME}', base_url='{AVALAI_BASE_URL}'...")
-        llm_image_prompt = ChatOpenAI(
-            model=IMAGE_PROMPT_MODEL_NAME,
-            api_key=google_api_key_secret,
-            base_url=AVALAI_BASE_URL,
-            timeout=TIMEOUT,
-        )
-        logging.info("ChatOpenAI client (Image Prompt) initialized successfully.")
-
-        logging.info(f"Initializing ChatOpenAI (Instagram Text) with model='{INSTAGRAM_TEXT_MODEL_NAME}', base_url='{AVALAI_BASE_URL}'...") # New client initialization
-        llm_instagram_text = ChatOpenAI(
-            model=INSTAGRAM_TEXT_MODEL_NAME,
-            api_key=google_api_key_secret,
-            base_url=AVALAI_BASE_URL,
-            timeout=TIMEOUT,
-        )
-        logging.info("ChatOpenAI client (Instagram Text) initialized successfully.")
+    roles = {
+        "blog": [BLOG_MODEL_NAME, *BLOG_MODEL_FALLBACKS],
+        "image_prompt": [IMAGE_PROMPT_MODEL_NAME, *IMAGE_PROMPT_MODEL_FALLBACKS],
+        "instagram_text": [INSTAGRAM_TEXT_MODEL_NAME, *INSTAGRAM_TEXT_MODEL_FALLBACKS],
+    }
+    pools = {}
+    try:
+        for role, model_names in roles.items():
+            logging.info(f"Initializing ChatOpenAI pool ({role}) with models={model_names}, base_url='{AVALAI_BASE_URL}'...")
+            members = [
+                _build_model_client(model_name, google_api_key_secret, AVALAI_BASE_URL, TIMEOUT, MAX_RETRIES, cassette_mode)
+                for model_name in dict.fromkeys(model_names) # Drop repeats, keep order
+            ]
+            # Per-model concurrency caps and circuit breakers, failing over down the list
+            pools[role] = PooledChatModel(role, members)
+            # Serve identical requests (same model, messages and parameters) from the local response cache.
+            # Above the pool, so a hit never waits for a model slot or counts towards its breaker.
+            if cache is not None:
+                pools[role] = CachedChatModel(pools[role], cache)
+            logging.info(f"ChatOpenAI pool ({role}) initialized successfully.")
 
     except Exception as e:
         logging.exception(f"Error initializing ChatOpenAI clients: {e}")
         llm_blog = None 
         llm_image_prompt = None
         llm_instagram_text = None # Ensure it's None on error
+        return llm_blog, llm_image_prompt, llm_instagram_text
+
+    llm_blog = pools["blog"]
+    llm_image_prompt = pools["image_prompt"]
+    llm_instagram_text = pools["instagram_text"]
+
+    # Outermost wrapper, so every call (including cache hits) is recorded as a span
+    if TRACING_ENABLED:
+        llm_blog = TracedChatModel(llm_blog)
+        llm_image_prompt = TracedChatModel(llm_image_prompt)
+        llm_instagram_text = TracedChatModel(llm_instagram_text)
     
     return llm_blog, llm_image_prompt, llm_instagram_text # Adjusted return 
\ No newline at end of file
@@ -0,0 +1,289 @@
+import os
+import time
+import asyncio
+import logging
+import threading
+from .tracing import trace_span
+from .rate_limiter import parse_rate_limits
+from .llm_resilience import is_transient_error, get_latency_histogram
+
+# Configure logging (can be configured centrally if preferred)
+logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+
+# Concurrent calls allowed per model, e.g. "gemini-2.5-pro=2,gpt-4.1=6" ('*' applies to any other model)
+LLM_MODEL_CONCURRENCY = os.getenv("LLM_MODEL_CONCURRENCY", "")
+LLM_MODEL_MAX_CONCURRENCY = int(os.getenv("LLM_MODEL_MAX_CONCURRENCY", "4"))
+# Consecutive failed (or slow) calls that open a model's breaker; 0 disables circuit breaking
+LLM_BREAKER_FAILURE_THRESHOLD = int(os.getenv("LLM_BREAKER_FAILURE_THRESHOLD", "3"))
+LLM_BREAKER_COOLDOWN = float(os.getenv("LLM_BREAKER_COOLDOWN", "60"))           # Seconds open before a trial call
+LLM_BREAKER_SLOW_CALL_SECONDS = float(os.getenv("LLM_BREAKER_SLOW_CALL_SECONDS", "120"))  # Slower calls count as failures
+
+
+class ModelPoolExhaustedError(RuntimeError):
+    """Raised when every model of a role has failed or has its breaker open."""
+
+
+# --- Circuit Breaker ---
+class CircuitBreaker:
+    """
+    Per-model breaker. `failure_threshold` consecutive failures (transient errors, or calls slower
+    than `slow_call_seconds`) open it; after `cooldown` seconds a single trial call is let through
+    (half-open) and its outcome closes or re-opens the breaker.
+    """
+    CLOSED = "closed"
+    OPEN = "open"
+    HALF_OPEN = "half_open"
+
+    def __init__(self, failure_threshold: int = LLM_BREAKER_FAILURE_THRESHOLD, cooldown: float = LLM_BREAKER_COOLDOWN,
+                 slow_call_seconds: float = LLM_BREAKER_SLOW_CALL_SECONDS):
+        self.failure_threshold = failure_threshold
+        self.cooldown = cooldown
+        self.slow_call_seconds = slow_call_seconds
+        self._state = self.CLOSED
+        self._consecutive_failures = 0
+        self._opened_at = None
+        self._trial_in_flight = False
+        self._times_opened = 0
+        self._last_failure = None
+        self._lock = threading.Lock()
+
+    @property
+    def state(self) -> str:
+        with self._lock:
+            if self._state == self.OPEN and time.monotonic() - self._opened_at >= self.cooldown:
+                return self.HALF_OPEN
+            return self._state
+
+    def allow_request(self) -> bool:
+        """True if a call may go to this model now (claims the trial slot when half-open)."""
+        if self.failure_threshold <= 0:
+            return True
+        with self._lock:
+            if self._state == self.OPEN:
+                if time.monotonic() - self._opened_at < self.cooldown:
+                    return False
+                self._state = self.HALF_OPEN
+                self._trial_in_flight = False
+            if self._state == self.HALF_OPEN:
+                if self._trial_in_flight:
+                    return False
+                self._trial_in_flight = True
+            return True
+
+    def record_success(self, latency: float) -> None:
+        if latency > self.slow_call_seconds:
+            self.record_failure(f"slow call ({latency:.1f}s > {self.slow_call_seconds:g}s)")
+            return
+        with self._lock:
+            self._state = self.CLOSED
+            self._consecutive_failures = 0
+            self._trial_in_flight = False
+
+    def record_failure(self, reason: str) -> None:
+        with self._lock:
+            self._consecutive_failures += 1
+            self._last_failure = reason
+            self._trial_in_flight = False
+            if self.failure_threshold <= 0:
+                return
+            if self._state == self.HALF_OPEN or self._consecutive_failures >= self.failure_threshold:
+                if self._state != self.OPEN:
+                    self._times_opened += 1
+                self._state = self.OPEN
+                self._opened_at = time.monotonic()
+
+    def release(self) -> None:
+        """Gives back a half-open trial slot without an outcome (e.g. the call was cancelled)."""
+        with self._lock:
+            self._trial_in_flight = False
+
+    def snapshot(self) -> dict:
+        state = self.state
+        with self._lock:
+            retry_in = None
+            if state == self.OPEN:
+                retry_in = round(max(0.0, self.cooldown - (time.monotonic() - self._opened_at)), 1)
+            return {
+                "state": state,
+                "consecutive_failures": self._consecutive_failures,
+                "times_opened": self._times_opened,
+                "retry_in_seconds": retry_in,
+                "last_failure": self._last_failure,
+            }
+
+
+# --- Per-Model Health ---
+class ModelHealth:
+    """Concurrency cap, breaker and call counters for one model, shared by every role that uses it."""
+    def __init__(self, model_name: str, max_concurrency: int):
+        self.model_name = model_name
+        self.max_concurrency = max(1, max_concurrency)
+        self.breaker = CircuitBreaker()
+        self.in_flight = 0
+        self.calls = 0
+        self.failures = 0
+        self.fallback_calls = 0
+        self._semaphore: asyncio.Semaphore | None = None
+        self._loop = None
+
+    def _get_semaphore(self) -> asyncio.Semaphore:
+        # Semaphores are bound to one event loop; the UI starts a fresh loop per generation
+        loop = asyncio.get_running_loop()
+        if self._semaphore is None or self._loop is not loop:
+            self._semaphore = asyncio.Semaphore(self.max_concurrency)
+            self._loop = loop
+        return self._semaphore
+
+    def snapshot(self) -> dict:
+        return {
+            "max_concurrency": self.max_concurrency,
+            "in_flight": self.in_flight,
+            "calls": self.calls,
+            "failures": self.failures,
+            "fallback_calls": self.fallback_calls,
+            **self.breaker.snapshot(),
+            "latency": get_latency_histogram(self.model_name).snapshot(),
+        }
+
+
+_health: dict[str, ModelHealth] = {}
+_roles: dict[str, list[str]] = {}
+_registry_lock = threading.Lock()
+
+
+def get_model_health(model_name: str) -> ModelHealth:
+    """One health record per model, kept for the life of the process (and across UI reruns)."""
+    with _registry_lock:
+        health = _health.get(model_name)
+        if health is None:
+            limits = parse_rate_limits(LLM_MODEL_CONCURRENCY)
+            cap = int(limits.get(model_name, limits.get("*", LLM_MODEL_MAX_CONCURRENCY)))
+            health = _health[model_name] = ModelHealth(model_name, cap)
+        return health
+
+
+def pool_state() -> dict:
+    """
+    Snapshot for dashboards: {"roles": {role: [models in order]}, "models": {model: {state, in_flight,
+    calls, failures, latency, ...}}}.
+    """
+    with _registry_lock:
+        roles = {role: list(models) for role, models in _roles.items()}
+        health = list(_health.items())
+    return {"roles": roles, "models": {name: record.snapshot() for name, record in health}}
+
+
+# --- Pooled Client ---
+class PooledChatModel:
+    """
+    A role's client: an ordered list of model clients (primary first). Each call goes to the first
+    model whose breaker admits it, waiting for a slot under that model's concurrency cap; if the
+    call fails with a transient error it falls over to the next model, and any other error is
+    raised unchanged. Streams fail over only before their first chunk.
+    Anything else (e.g. `model_name`) is delegated to the primary.
+    """
+    wraps_chat_model = True
+    pools_chat_models = True
+
+    def __init__(self, role: str, clients: list):
+        if not clients:
+            raise ValueError(f"Model pool '{role}' needs at least one client")
+        self.role = role
+        self.clients = list(clients)
+        with _registry_lock:
+            _roles[role] = [self._model_name(client) for client in self.clients]
+
+    @staticmethod
+    def _model_name(client) -> str:
+        return getattr(client, "model_name", None) or "unknown"
+
+    @property
+    def client(self):
+        return self.clients[0]
+
+    def __getattr__(self, name):
+        if name == "clients":
+            raise AttributeError(name)
+        return getattr(self.clients[0], name)
+
+    def _candidates(self):
+        """Yields (position, client, health) for each model currently admitted by its breaker."""
+        for position, client in enumerate(self.clients):
+            health = get_model_health(self._model_name(client))
+            if health.breaker.allow_request():
+                yield position, client, health
+            else:
+                logging.info(f"Model pool '{self.role}': skipping '{health.model_name}' (circuit {health.breaker.state}).")
+
+    def _record_failure(self, health: ModelHealth, error: Exception) -> None:
+        health.failures += 1
+        # Only failures that say something about the model's health count towards opening its breaker
+        if is_transient_error(error):
+            health.breaker.record_failure(f"{type(error).__name__}: {error}")
+        else:
+            health.breaker.release()
+        logging.warning(f"Model pool '{self.role}': '{health.model_name}' failed ({type(error).__name__}: {error}).")
+
+    def _exhausted(self, errors: list[str]) -> ModelPoolExhaustedError:
+        detail = "; ".join(errors) if errors else "every circuit is open"
+        return ModelPoolExhaustedError(f"No model in pool '{self.role}' could serve the request ({detail}).")
+
+    async def ainvoke(self, messages, config=None, **kwargs):
+        errors = []
+        last_error = None
+        for position, client, health in self._candidates():
+            with trace_span("llm.route", kind="llm_route", role=self.role, model=health.model_name, position=position):
+                async with health._get_semaphore():
+                    health.in_flight += 1
+                    health.calls += 1
+                    health.fallback_calls += position > 0
+                    start = time.perf_counter()
+                    try:
+                        response = await client.ainvoke(messages, config, **kwargs)
+                    except asyncio.CancelledError:
+                        health.breaker.release()
+                        raise
+                    except Exception as e:
+                        self._record_failure(health, e)
+                        if not is_transient_error(e):
+                            raise # A bad request or bad credentials would fail the same way on every model
+                        errors.append(f"{health.model_name}: {type(e).__name__}: {e}")
+                        last_error = e
+                        continue
+                    finally:
+                        health.in_flight -= 1
+            health.breaker.record_success(time.perf_counter() - start)
+            if position > 0:
+                logging.info(f"Model pool '{self.role}': served by fallback '{health.model_name}'.")
+            return response
+        raise self._exhausted(errors) from last_error
+
+    async def astream(self, messages, config=None, **kwargs):
+        errors = []
+        last_error = None
+        for position, client, health in self._candidates():
+            started = False
+            async with health._get_semaphore():
+                health.in_flight += 1
+                health.calls += 1
+                health.fallback_calls += position > 0
+                start = time.perf_counter()
+                try:
+                    async for chunk in client.astream(messages, config, **kwargs):
+                        started = True
+                        yield chunk
+                except (asyncio.CancelledError, GeneratorExit):
+                    health.breaker.release()
+                    raise
+                except Exception as e:
+                    self._record_failure(health, e)
+                    if started or not is_transient_error(e):
+                        raise # Chunks were already handed out, or another model would fail the same way
+                    errors.append(f"{health.model_name}: {type(e).__name__}: {e}")
+                    last_error = e
+                    continue
+                finally:
+                    health.in_flight -= 1
+            health.breaker.record_success(time.perf_counter() - start)
+            return
+        raise self._exhausted(errors) from last_error
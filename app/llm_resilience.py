@@ -0,0 +1,241 @@
+import os
+import math
+import time
+import random
+import asyncio
+import logging
+import threading
+from collections import deque
+import httpx
+import openai
+from .tracing import trace_span
+
+# Configure logging (can be configured centrally if preferred)
+logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+
+LLM_RESILIENCE_ENABLED = os.getenv("LLM_RESILIENCE_ENABLED", "true").strip().lower() in ("1", "true", "yes", "on")
+LLM_MAX_ATTEMPTS = int(os.getenv("LLM_MAX_ATTEMPTS", "4"))            # First try + retries
+LLM_RETRY_BASE_DELAY = float(os.getenv("LLM_RETRY_BASE_DELAY", "1.0"))
+LLM_RETRY_MAX_DELAY = float(os.getenv("LLM_RETRY_MAX_DELAY", "30.0"))
+LLM_HEDGE_ENABLED = os.getenv("LLM_HEDGE_ENABLED", "true").strip().lower() in ("1", "true", "yes", "on")
+LLM_HEDGE_PERCENTILE = float(os.getenv("LLM_HEDGE_PERCENTILE", "95"))
+LLM_HEDGE_MIN_SAMPLES = int(os.getenv("LLM_HEDGE_MIN_SAMPLES", "20"))  # No hedging until the model has this much history
+LLM_HEDGE_MIN_DELAY = float(os.getenv("LLM_HEDGE_MIN_DELAY", "2.0"))   # Never hedge sooner than this (seconds)
+LLM_LATENCY_WINDOW = int(os.getenv("LLM_LATENCY_WINDOW", "200"))
+
+# HTTP statuses worth retrying: timeouts, conflicts, rate limits and upstream failures
+_RETRYABLE_STATUSES = {408, 409, 429, 500, 502, 503, 504}
+
+
+def is_transient_error(error: BaseException) -> bool:
+    """True for failures that a retry can fix (timeouts, dropped connections, 429 and 5xx responses)."""
+    if isinstance(error, (openai.APITimeoutError, openai.APIConnectionError, asyncio.TimeoutError, httpx.TimeoutException, httpx.NetworkError)):
+        return True
+    if isinstance(error, openai.APIStatusError):
+        return error.status_code in _RETRYABLE_STATUSES
+    return False
+
+
+def _retry_after_seconds(error: BaseException) -> float | None:
+    response = getattr(error, "response", None)
+    headers = getattr(response, "headers", None)
+    if not headers:
+        return None
+    try:
+        return float(headers.get("retry-after"))
+    except (TypeError, ValueError):
+        return None
+
+
+def retry_delay(attempt: int, error: BaseException, cap: float = LLM_RETRY_MAX_DELAY) -> float | None:
+    """Backoff before the next attempt, honouring Retry-After; None if the server asks for longer than `cap`."""
+    retry_after = _retry_after_seconds(error)
+    if retry_after is not None and retry_after > cap:
+        return None
+    return max(backoff_delay(attempt, cap=cap), retry_after or 0.0)
+
+
+def backoff_delay(attempt: int, base: float = LLM_RETRY_BASE_DELAY, cap: float = LLM_RETRY_MAX_DELAY) -> float:
+    """Full-jitter exponential backoff: uniform in [0, min(cap, base * 2**(attempt-1))]."""
+    return random.uniform(0, min(cap, base * (2 ** (attempt - 1))))
+
+
+# --- Latency Tracking ---
+class LatencyHistogram:
+    """Rolling window of the most recent successful call latencies for one model."""
+    def __init__(self, window: int = LLM_LATENCY_WINDOW):
+        self._samples: deque[float] = deque(maxlen=window)
+        self._lock = threading.Lock()
+
+    def record(self, seconds: float) -> None:
+        with self._lock:
+            self._samples.append(seconds)
+
+    def __len__(self) -> int:
+        return len(self._samples)
+
+    def percentile(self, p: float) -> float | None:
+        with self._lock:
+            samples = sorted(self._samples)
+        if not samples:
+            return None
+        # Nearest-rank percentile
+        rank = max(1, min(len(samples), math.ceil(p / 100 * len(samples))))
+        return samples[rank - 1]
+
+    def snapshot(self) -> dict:
+        return {
+            "count": len(self),
+            "p50": self.percentile(50),
+            "p95": self.percentile(95),
+            "p99": self.percentile(99),
+        }
+
+
+_histograms: dict[str, LatencyHistogram] = {}
+_histograms_lock = threading.Lock()
+
+
+def get_latency_histogram(model_name: str) -> LatencyHistogram:
+    """Process-wide histogram per model, shared by every client for that model (and across UI reruns)."""
+    with _histograms_lock:
+        histogram = _histograms.get(model_name)
+        if histogram is None:
+            histogram = _histograms[model_name] = LatencyHistogram()
+        return histogram
+
+
+def latency_snapshot() -> dict:
+    """{model: {count, p50, p95, p99}} for every model seen so far."""
+    with _histograms_lock:
+        items = list(_histograms.items())
+    return {model: histogram.snapshot() for model, histogram in items}
+
+
+# --- Client Wrapper ---
+class ResilientChatModel:
+    """
+    Wraps a chat model with retries and request hedging.
+
+    Transient failures are retried up to `max_attempts` times with full-jitter exponential
+    backoff (honouring Retry-After, up to LLM_RETRY_MAX_DELAY; a longer Retry-After is raised at
+    once so the model pool can fail over). Within an attempt, if the call is still running after the
+    model's observed p95 latency and the model has a free slot under its pool concurrency cap, an
+    identical request is fired; whichever succeeds first wins and the other is cancelled. Streams are retried only before their first chunk and are not hedged.
+    """
+    wraps_chat_model = True
+
+    def __init__(self, client, max_attempts: int = LLM_MAX_ATTEMPTS, hedge: bool = LLM_HEDGE_ENABLED,
+                 hedge_percentile: float = LLM_HEDGE_PERCENTILE, hedge_min_samples: int = LLM_HEDGE_MIN_SAMPLES,
+                 hedge_min_delay: float = LLM_HEDGE_MIN_DELAY):
+        self.client = client
+        self.max_attempts = max(1, max_attempts)
+        self.hedge = hedge
+        self.hedge_percentile = hedge_percentile
+        self.hedge_min_samples = hedge_min_samples
+        self.hedge_min_delay = hedge_min_delay
+        self.model_key = getattr(client, "model_name", None) or "unknown"
+        self.latency = get_latency_histogram(self.model_key)
+
+    def __getattr__(self, name):
+        return getattr(self.client, name)
+
+    def hedge_delay(self) -> float | None:
+        """Seconds to wait before hedging, or None if hedging is off or there is not enough history yet."""
+        if not self.hedge or len(self.latency) < self.hedge_min_samples:
+            return None
+        threshold = self.latency.percentile(self.hedge_percentile)
+        return max(self.hedge_min_delay, threshold) if threshold is not None else None
+
+    async def _claim_hedge_slot(self):
+        """Takes a free slot under the model's pool concurrency cap for a hedge; None (without waiting) if there is none."""
+        from .llm_pool import get_model_health # Imported here: the pool imports this module
+        health = get_model_health(self.model_key)
+        semaphore = health._get_semaphore()
+        if semaphore.locked():
+            return None
+        await semaphore.acquire() # Free, so this does not wait
+        health.in_flight += 1
+
+        def release(_task):
+            health.in_flight -= 1
+            semaphore.release()
+        return release
+
+    async def _timed_call(self, messages, config, kwargs, attempt: int, hedged: bool):
+        with trace_span("llm.attempt", kind="llm_attempt", model=self.model_key, attempt=attempt, hedged=hedged):
+            start = time.perf_counter()
+            response = await self.client.ainvoke(messages, config, **kwargs)
+            self.latency.record(time.perf_counter() - start)
+            return response
+
+    async def _hedged_call(self, messages, config, kwargs, attempt: int):
+        start = time.perf_counter()
+        original = asyncio.ensure_future(self._timed_call(messages, config, kwargs, attempt, hedged=False))
+        tasks = {original}
+        hedge = None
+        try:
+            delay = self.hedge_delay()
+            if delay is not None:
+                done, _ = await asyncio.wait(tasks, timeout=delay)
+                release_slot = await self._claim_hedge_slot() if not done else None
+                if release_slot is not None:
+                    logging.info(f"Model '{self.model_key}' exceeded its p{self.hedge_percentile:g} latency ({delay:.1f}s); sending a hedged request.")
+                    hedge = asyncio.ensure_future(self._timed_call(messages, config, kwargs, attempt, hedged=True))
+                    hedge.add_done_callback(release_slot)
+                    tasks.add(hedge)
+                elif not done:
+                    logging.info(f"Model '{self.model_key}' exceeded its p{self.hedge_percentile:g} latency ({delay:.1f}s) but is at its concurrency cap; not hedging.")
+
+            last_error = None
+            while tasks:
+                done, tasks = await asyncio.wait(tasks, return_when=asyncio.FIRST_COMPLETED)
+                winner = None
+                for task in done:
+                    error = task.exception()
+                    if error is None:
+                        winner = winner or task
+                    else:
+                        last_error = error
+                if winner is not None:
+                    if winner is hedge and not original.done():
+                        # The original lost to its hedge, so it was at least this slow; dropping it would hide the tail
+                        self.latency.record(max(delay, time.perf_counter() - start))
+                    return winner.result()
+            raise last_error
+        finally:
+            for task in tasks:
+                task.cancel() # The slower duplicate
+            if tasks:
+                await asyncio.gather(*tasks, return_exceptions=True)
+
+    async def ainvoke(self, messages, config=None, **kwargs):
+        for attempt in range(1, self.max_attempts + 1):
+            try:
+                return await self._hedged_call(messages, config, kwargs, attempt)
+            except Exception as e:
+                if attempt >= self.max_attempts or not is_transient_error(e):
+                    raise
+                delay = retry_delay(attempt, e)
+                if delay is None:
+                    raise # Retry-After is past LLM_RETRY_MAX_DELAY; let the pool fail over instead of waiting
+                logging.warning(f"Transient error from model '{self.model_key}' (attempt {attempt}/{self.max_attempts}): {type(e).__name__}: {e}. Retrying in {delay:.1f}s.")
+                await asyncio.sleep(delay)
+
+    async def astream(self, messages, config=None, **kwargs):
+        for attempt in range(1, self.max_attempts + 1):
+            started = False
+            try:
+                async for chunk in self.client.astream(messages, config, **kwargs):
+                    started = True
+                    yield chunk
+                return
+            except Exception as e:
+                # Once chunks have been handed out a retry would duplicate them
+                if started or attempt >= self.max_attempts or not is_transient_error(e):
+                    raise
+                delay = retry_delay(attempt, e)
+                if delay is None:
+                    raise
+                logging.warning(f"Transient error opening stream from model '{self.model_key}' (attempt {attempt}/{self.max_attempts}): {type(e).__name__}: {e}. Retrying in {delay:.1f}s.")
+                await asyncio.sleep(delay)
@@ -0,0 +1,252 @@
+import os
+import re
+import sys
+import json
+import lzma
+import zlib
+import struct
+import logging
+import argparse
+import threading
+
+# Configure logging (can be configured centrally if preferred)
+logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+
+# Saves append to the archive instead of writing one JSON file per package
+OUTPUT_ARCHIVE_ENABLED = os.getenv("OUTPUT_ARCHIVE_ENABLED", "false").strip().lower() in ("1", "true", "yes", "on")
+OUTPUT_ARCHIVE_DIR = os.getenv("OUTPUT_ARCHIVE_DIR", os.path.join("answers", "archive"))
+OUTPUT_ARCHIVE_SEGMENT_BYTES = int(os.getenv("OUTPUT_ARCHIVE_SEGMENT_BYTES", str(64 * 1024 * 1024)))  # A new segment is started past this size
+OUTPUT_ARCHIVE_LZMA_PRESET = int(os.getenv("OUTPUT_ARCHIVE_LZMA_PRESET", "1"))  # 0-9; higher is smaller but slower to write
+
+# Frame: magic, record id, payload length, CRC32 of payload, codec; the payload follows
+_FRAME = struct.Struct("<4sQIIB")
+_FRAME_MAGIC = b"PPR1"
+_CODEC_LZMA = 1
+# Index entry (one per frame, in the segment's .idx sidecar): record id, frame offset, frame length
+_INDEX_ENTRY = struct.Struct("<QQI")
+_SEGMENT_NAME = re.compile(r"^segment-(\d{6})\.log$")
+
+
+def _compress(data: bytes, preset: int) -> bytes:
+    # LZMA's dictionary spans the whole record, so the raw blog output and the parsed package that
+    # repeats it cost little more than one copy. The frame carries its own CRC, so xz's is skipped.
+    return lzma.compress(data, format=lzma.FORMAT_XZ, check=lzma.CHECK_NONE, preset=preset)
+
+
+def _decompress(payload: bytes) -> bytes:
+    return lzma.decompress(payload, format=lzma.FORMAT_XZ)
+
+
+# --- Segment Archive ---
+class OutputArchive:
+    """
+    Append-only archive of saved records. Each record is one LZMA-compressed, CRC-checked frame in
+    a segment file (`segment-NNNNNN.log`), and each segment has a `.idx` sidecar of fixed-size
+    (id, offset, length) entries for random access. A process only appends to segments it created
+    itself (exclusive create), so concurrent writers never interleave.
+    """
+    def __init__(self, directory: str = OUTPUT_ARCHIVE_DIR, segment_bytes: int = OUTPUT_ARCHIVE_SEGMENT_BYTES,
+                 preset: int = OUTPUT_ARCHIVE_LZMA_PRESET):
+        self.directory = directory
+        self.segment_bytes = segment_bytes
+        self.preset = preset
+        self._lock = threading.Lock()
+        self._segment_path: str | None = None
+        self._segment = None
+        self._index_file = None
+        self._locations: dict[int, tuple[str, int, int]] = {}
+        self._index_sizes: dict[str, int] = {}
+        os.makedirs(directory, exist_ok=True)
+
+    def segment_paths(self) -> list[str]:
+        return sorted(os.path.join(self.directory, name) for name in os.listdir(self.directory) if _SEGMENT_NAME.match(name))
+
+    def _open_new_segment(self) -> None:
+        if self._segment is not None:
+            self._segment.close()
+            self._index_file.close()
+        numbers = [int(_SEGMENT_NAME.match(os.path.basename(path)).group(1)) for path in self.segment_paths()]
+        number = max(numbers, default=0) + 1
+        while True:
+            path = os.path.join(self.directory, f"segment-{number:06d}.log")
+            try:
+                self._segment = open(path, 'xb')
+                break
+            except FileExistsError: # Another process took this number first
+                number += 1
+        self._index_file = open(path[:-len(".log")] + ".idx", 'ab')
+        self._segment_path = path
+        logging.info(f"Output archive: started segment {path}.")
+
+    def append(self, record_id: int, record: dict, record_json: bytes | None = None, fsync: bool = False) -> str:
+        """
+        Compresses and appends one record; returns its reference (`<segment path>#<id>`). `record_json`
+        is the record already serialized as UTF-8 JSON, to skip encoding it again.
+        """
+        payload = _compress(record_json if record_json is not None else json.dumps(record, ensure_ascii=False).encode("utf-8"), self.preset)
+        frame = _FRAME.pack(_FRAME_MAGIC, record_id, len(payload), zlib.crc32(payload), _CODEC_LZMA) + payload
+        with self._lock:
+            if self._segment is None or (self._segment.tell() > 0 and self._segment.tell() + len(frame) > self.segment_bytes):
+                self._open_new_segment()
+            offset = self._segment.tell()
+            self._segment.write(frame)
+            self._segment.flush()
+            self._index_file.write(_INDEX_ENTRY.pack(record_id, offset, len(frame)))
+            self._index_file.flush()
+            if fsync:
+                os.fsync(self._segment.fileno())
+                os.fsync(self._index_file.fileno())
+            self._locations[record_id] = (self._segment_path, offset, len(frame))
+            return f"{self._segment_path}#{record_id}"
+
+    def _refresh_index(self) -> None:
+        """Reads index entries appended since the last refresh (including other processes' segments)."""
+        for segment_path in self.segment_paths():
+            index_path = segment_path[:-len(".log")] + ".idx"
+            try:
+                size = os.path.getsize(index_path)
+            except FileNotFoundError:
+                continue
+            seen = self._index_sizes.get(index_path, 0)
+            usable = size - (size - seen) % _INDEX_ENTRY.size # Ignore an entry still being written
+            if usable <= seen:
+                continue
+            with open(index_path, 'rb') as f:
+                f.seek(seen)
+                for record_id, offset, length in _INDEX_ENTRY.iter_unpack(f.read(usable - seen)):
+                    self._locations[record_id] = (segment_path, offset, length)
+            self._index_sizes[index_path] = usable
+
+    def read(self, record_id: int) -> dict | None:
+        """Random access to one record by ID (None if it is not in the archive)."""
+        with self._lock:
+            location = self._locations.get(record_id)
+            if location is None:
+                self._refresh_index()
+                location = self._locations.get(record_id)
+        if location is None:
+            return None
+        segment_path, offset, length = location
+        with open(segment_path, 'rb') as f:
+            f.seek(offset)
+            frame = f.read(length)
+        return json.loads(self._decode_frame(frame, segment_path, offset)[1])
+
+    @staticmethod
+    def _decode_frame(frame: bytes, segment_path: str, offset: int) -> tuple[int, bytes]:
+        magic, record_id, length, crc, codec = _FRAME.unpack_from(frame)
+        payload = frame[_FRAME.size:_FRAME.size + length]
+        if magic != _FRAME_MAGIC or len(payload) != length or zlib.crc32(payload) != crc or codec != _CODEC_LZMA:
+            raise ValueError(f"Corrupt archive frame at {segment_path}:{offset}")
+        return record_id, _decompress(payload)
+
+    def iter_records(self):
+        """
+        Streams (record_id, record) for every archived record, segment by segment in write order.
+        Reads frames sequentially without the index; a torn frame at a segment's end is skipped.
+        """
+        for segment_path in self.segment_paths():
+            with open(segment_path, 'rb') as f:
+                offset = 0
+                while True:
+                    header = f.read(_FRAME.size)
+                    if len(header) < _FRAME.size:
+                        if header:
+                            logging.warning(f"Output archive: ignoring a truncated frame at {segment_path}:{offset}.")
+                        break
+                    payload = f.read(_FRAME.unpack(header)[2])
+                    try:
+                        record_id, data = self._decode_frame(header + payload, segment_path, offset)
+                    except ValueError as e:
+                        logging.warning(f"Output archive: {e}; skipping the rest of the segment.")
+                        break
+                    offset += len(header) + len(payload)
+                    yield record_id, json.loads(data)
+
+    def stats(self) -> dict:
+        with self._lock:
+            self._refresh_index()
+            segments = self.segment_paths()
+            return {
+                "segments": len(segments),
+                "records": len(self._locations),
+                "bytes": sum(os.path.getsize(path) for path in segments),
+            }
+
+    def close(self) -> None:
+        with self._lock:
+            if self._segment is not None:
+                self._segment.close()
+                self._index_file.close()
+                self._segment = self._index_file = self._segment_path = None
+
+
+_shared_archive: OutputArchive | None = None
+_shared_archive_lock = threading.Lock()
+
+
+def get_output_archive() -> OutputArchive:
+    """The process-wide output archive (its first segment is only created on the first append)."""
+    global _shared_archive
+    with _shared_archive_lock:
+        if _shared_archive is None:
+            _shared_archive = OutputArchive()
+        return _shared_archive
+
+
+# --- Migration ---
+def migrate_json_files(keep_files: bool = False) -> dict:
+    """
+    Moves every answers/*.json record known to the output store into the archive under its
+    existing ID, repoints the store and the near-duplicate index at it and, unless
+    `keep_files`, deletes the JSON file. Returns counts and bytes before/after.
+    """
+    from .output_store import get_output_store
+    from .source_dedup import get_source_index
+
+    store = get_output_store()
+    archive = get_output_archive()
+    source_index = get_source_index()
+    summary = {"migrated": 0, "failed": 0, "json_bytes": 0, "archive_bytes_added": 0}
+    bytes_before = archive.stats()["bytes"]
+    for output_id, local_file in store.json_file_rows():
+        try:
+            with open(local_file, 'rb') as f:
+                raw = f.read()
+            record = json.loads(raw)
+            reference = archive.append(output_id, record)
+            store.mark_archived(output_id, reference)
+            source_index.relocate(local_file, reference)
+        except Exception as e:
+            logging.error(f"Could not migrate {local_file} into the output archive: {e}")
+            summary["failed"] += 1
+            continue
+        summary["migrated"] += 1
+        summary["json_bytes"] += len(raw)
+        if not keep_files:
+            os.remove(local_file)
+    if summary["migrated"]:
+        store.vacuum()
+    summary["archive_bytes_added"] = archive.stats()["bytes"] - bytes_before
+    logging.info(f"Output archive migration: {summary}")
+    return summary
+
+
+def main(argv: list[str] | None = None) -> int:
+    parser = argparse.ArgumentParser(description="Manage the compressed answers/ archive.")
+    subcommands = parser.add_subparsers(dest="command", required=True)
+    migrate = subcommands.add_parser("migrate", help="Move existing answers/*.json records into the archive")
+    migrate.add_argument("--keep-files", action="store_true", help="Leave the JSON files in place after archiving them")
+    subcommands.add_parser("stats", help="Show segment, record and byte counts")
+    args = parser.parse_args(argv)
+
+    if args.command == "migrate":
+        summary = migrate_json_files(keep_files=args.keep_files)
+        print(json.dumps(summary, indent=2))
+        return 1 if summary["failed"] else 0
+    print(json.dumps(get_output_archive().stats(), indent=2))
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
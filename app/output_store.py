@@ -0,0 +1,248 @@
+import os
+import re
+import json
+import time
+import sqlite3
+import logging
+import threading
+
+# Configure logging (can be configured centrally if preferred)
+logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+
+ANSWERS_DIR = "answers"
+OUTPUT_STORE_PATH = os.getenv("OUTPUT_STORE_PATH", os.path.join(ANSWERS_DIR, "outputs.sqlite"))
+
+# Legacy file names: {username}_{id:04d}_{slug}_{YYYYmmdd_HHMMSS}.json
+_LEGACY_FILENAME = re.compile(r"^(?P<username>.+?)_(?P<id>\d{4,})_(?P<slug>.*)_(?P<timestamp>\d{8}_\d{6})\.json$")
+_SUMMARY_COLUMNS = ("id", "username", "slug", "status", "timestamp", "created_at", "source_url", "source_title", "local_file", "pantry_basket_name")
+
+
+# --- Output Store ---
+class OutputStore:
+    """
+    Index of every saved output record (WAL-mode SQLite). IDs come from the table's
+    AUTOINCREMENT key, so concurrent saves (threads or processes) can never be handed the same
+    ID. User, slug, status, timestamp and source URL are indexed for paged listing and queries.
+    The record itself lives only in its answers/ JSON file (or segment archive); `get` reads it there.
+    """
+    def __init__(self, path: str = OUTPUT_STORE_PATH):
+        self.path = path
+        self._lock = threading.Lock()
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self._conn = sqlite3.connect(path, check_same_thread=False, timeout=30)
+        self._conn.row_factory = sqlite3.Row
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS outputs ("
+            " id INTEGER PRIMARY KEY AUTOINCREMENT,"
+            " username TEXT, slug TEXT, status TEXT NOT NULL, timestamp TEXT, created_at REAL NOT NULL,"
+            " source_url TEXT, source_title TEXT, local_file TEXT, pantry_basket_name TEXT, record TEXT,"
+            " archived INTEGER NOT NULL DEFAULT 0)"
+        )
+        columns = {row["name"] for row in self._conn.execute("PRAGMA table_info(outputs)")}
+        if "archived" not in columns: # Stores created before the segment archive existed
+            self._conn.execute("ALTER TABLE outputs ADD COLUMN archived INTEGER NOT NULL DEFAULT 0")
+        for column in ("username", "slug", "status", "created_at", "source_url"):
+            self._conn.execute(f"CREATE INDEX IF NOT EXISTS idx_outputs_{column} ON outputs ({column})")
+        self._conn.commit()
+
+    def allocate(self, username: str, slug: str, timestamp: str,
+                 source_url: str | None = None, source_title: str | None = None) -> int:
+        """Reserves the next output ID with a 'pending' row; the record is attached by `complete`."""
+        with self._lock:
+            cursor = self._conn.execute(
+                "INSERT INTO outputs (username, slug, status, timestamp, created_at, source_url, source_title) VALUES (?, ?, ?, ?, ?, ?, ?)",
+                (username, slug, "pending", timestamp, time.time(), source_url, source_title)
+            )
+            self._conn.commit()
+            return cursor.lastrowid
+
+    def complete(self, output_id: int, record: dict, local_file: str, archived: bool = False) -> None:
+        """
+        Marks a previously allocated ID as saved at `local_file` (its JSON file, or its segment
+        archive reference when `archived`).
+        """
+        with self._lock:
+            self._conn.execute(
+                "UPDATE outputs SET status = ?, local_file = ?, pantry_basket_name = ?, archived = ? WHERE id = ?",
+                (record.get("status"), local_file, record.get("pantry_basket_name"), int(archived), output_id)
+            )
+            self._conn.commit()
+
+    def mark_failed(self, output_id: int, reason: str) -> None:
+        with self._lock:
+            self._conn.execute("UPDATE outputs SET status = ?, record = ? WHERE id = ?",
+                               ("save_failed", json.dumps({"error_message": reason}), output_id))
+            self._conn.commit()
+
+    def set_pantry_basket(self, output_id: int, basket_name: str) -> None:
+        with self._lock:
+            self._conn.execute("UPDATE outputs SET pantry_basket_name = ? WHERE id = ?", (basket_name, output_id))
+            self._conn.commit()
+
+    def mark_archived(self, output_id: int, reference: str) -> None:
+        """Points a record at its segment archive copy (dropping any copy kept here by older versions)."""
+        with self._lock:
+            self._conn.execute("UPDATE outputs SET local_file = ?, record = NULL, archived = 1 WHERE id = ?", (reference, output_id))
+            self._conn.commit()
+
+    def vacuum(self) -> None:
+        """Returns the space of dropped rows and record copies to the filesystem."""
+        with self._lock:
+            self._conn.execute("VACUUM")
+
+    def json_file_rows(self) -> list[tuple[int, str]]:
+        """(id, local_file) of completed records still stored as answers/ JSON files."""
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT id, local_file FROM outputs WHERE archived = 0 AND local_file LIKE '%.json' ORDER BY id"
+            ).fetchall()
+        return [(row["id"], row["local_file"]) for row in rows]
+
+    def get(self, output_id: int) -> dict | None:
+        """The full saved record for an ID, read from its JSON file or archive (None if unknown, never completed or deleted)."""
+        with self._lock:
+            row = self._conn.execute("SELECT local_file, record, archived FROM outputs WHERE id = ?", (output_id,)).fetchone()
+        if row is None:
+            return None
+        if row["archived"]:
+            from .output_archive import get_output_archive
+            return get_output_archive().read(output_id)
+        if row["local_file"]:
+            try:
+                with open(row["local_file"], 'r', encoding='utf-8') as f:
+                    return json.load(f)
+            except FileNotFoundError:
+                logging.warning(f"Saved output {output_id} is missing its file {row['local_file']}.")
+        # Failure reasons, and copies kept by older versions of the store
+        return json.loads(row["record"]) if row["record"] else None
+
+    def list(self, page: int = 1, page_size: int = 20, username: str | None = None, slug: str | None = None,
+             status: str | None = None, source_url: str | None = None, since: float | None = None,
+             until: float | None = None, search: str | None = None) -> dict:
+        """
+        Newest-first page of record summaries matching every given filter. `search` matches
+        slug or source title (substring). Returns {"items", "total", "page", "page_size", "pages"}.
+        """
+        clauses, params = [], []
+        for column, value in (("username", username), ("slug", slug), ("status", status), ("source_url", source_url)):
+            if value:
+                clauses.append(f"{column} = ?")
+                params.append(value)
+        if since is not None:
+            clauses.append("created_at >= ?")
+            params.append(since)
+        if until is not None:
+            clauses.append("created_at < ?")
+            params.append(until)
+        if search:
+            clauses.append("(slug LIKE ? OR source_title LIKE ?)")
+            params += [f"%{search}%", f"%{search}%"]
+        where = f"WHERE {' AND '.join(clauses)}" if clauses else ""
+        page = max(1, page)
+        page_size = max(1, min(page_size, 200))
+        with self._lock:
+            total = self._conn.execute(f"SELECT COUNT(*) FROM outputs {where}", params).fetchone()[0]
+            rows = self._conn.execute(
+                f"SELECT {', '.join(_SUMMARY_COLUMNS)} FROM outputs {where} ORDER BY id DESC LIMIT ? OFFSET ?",
+                params + [page_size, (page - 1) * page_size]
+            ).fetchall()
+        return {
+            "items": [dict(row) for row in rows],
+            "total": total,
+            "page": page,
+            "page_size": page_size,
+            "pages": (total + page_size - 1) // page_size,
+        }
+
+    def iter_records(self, after_id: int = 0, batch_size: int = 200):
+        """Yields (id, local_file, record) for completed records with an ID above `after_id`, oldest first."""
+        last_id = after_id
+        while True:
+            with self._lock:
+                rows = self._conn.execute(
+                    "SELECT id, local_file FROM outputs WHERE id > ? AND local_file IS NOT NULL ORDER BY id LIMIT ?",
+                    (last_id, batch_size)
+                ).fetchall()
+            if not rows:
+                return
+            for row in rows:
+                last_id = row["id"]
+                record = self.get(row["id"])
+                if record is not None:
+                    yield row["id"], row["local_file"], record
+
+    def is_empty(self) -> bool:
+        with self._lock:
+            return self._conn.execute("SELECT 1 FROM outputs LIMIT 1").fetchone() is None
+
+    def import_legacy(self, directory: str = ANSWERS_DIR) -> int:
+        """
+        One-time migration: indexes the JSON files and counter.txt written before the store existed,
+        keeping their IDs where they are unique, so new IDs continue after the old counter.
+        """
+        try:
+            names = sorted(name for name in os.listdir(directory) if name.endswith(".json"))
+        except FileNotFoundError:
+            names = []
+        imported = 0
+        with self._lock:
+            for name in names:
+                path = os.path.join(directory, name)
+                try:
+                    with open(path, 'r', encoding='utf-8') as f:
+                        record = json.load(f)
+                except Exception as e:
+                    logging.warning(f"Skipping unreadable output file {path} during import: {e}")
+                    continue
+                if not isinstance(record, dict):
+                    continue
+                match = _LEGACY_FILENAME.match(name)
+                package = record.get("final_parsed_package") or {}
+                source = record.get("source") or {}
+                legacy_id = record.get("id") if isinstance(record.get("id"), int) else None
+                taken = legacy_id is not None and self._conn.execute("SELECT 1 FROM outputs WHERE id = ?", (legacy_id,)).fetchone()
+                self._conn.execute(
+                    "INSERT INTO outputs (id, username, slug, status, timestamp, created_at, source_url, source_title, local_file, pantry_basket_name)"
+                    " VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                    (None if taken else legacy_id, match.group("username") if match else None,
+                     package.get("slug") or (match.group("slug") if match else None), record.get("status") or "unknown",
+                     record.get("timestamp"), os.path.getmtime(path), source.get("url"), source.get("title"),
+                     path, record.get("pantry_basket_name"))
+                )
+                imported += 1
+
+            # Continue numbering after the legacy counter even if its files were deleted
+            try:
+                with open(os.path.join(directory, "counter.txt"), 'r') as f_count:
+                    legacy_count = int(f_count.read().strip())
+            except (FileNotFoundError, ValueError):
+                legacy_count = 0
+            current = self._conn.execute("SELECT seq FROM sqlite_sequence WHERE name = 'outputs'").fetchone()
+            if legacy_count > (current[0] if current else 0):
+                if current:
+                    self._conn.execute("UPDATE sqlite_sequence SET seq = ? WHERE name = 'outputs'", (legacy_count,))
+                else:
+                    self._conn.execute("INSERT INTO sqlite_sequence (name, seq) VALUES ('outputs', ?)", (legacy_count,))
+            self._conn.commit()
+        if imported:
+            logging.info(f"Output store: imported {imported} earlier output file(s) from {directory}.")
+        return imported
+
+
+_shared_store: OutputStore | None = None
+_shared_store_lock = threading.Lock()
+
+
+def get_output_store() -> OutputStore:
+    """The process-wide output store; on first creation it imports any pre-existing answers/ files."""
+    global _shared_store
+    with _shared_store_lock:
+        if _shared_store is None:
+            store = OutputStore()
+            if store.is_empty():
+                store.import_legacy()
+            _shared_store = store
+        return _shared_store
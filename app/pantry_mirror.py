@@ -0,0 +1,189 @@
+import os
+import json
+import time
+import sqlite3
+import asyncio
+import logging
+import threading
+from .file_utils import get_io_runtime, list_pantry_baskets_async, get_pantry_basket_content_async
+
+# Configure logging (can be configured centrally if preferred)
+logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+
+PANTRY_MIRROR_ENABLED = os.getenv("PANTRY_MIRROR_ENABLED", "true").strip().lower() in ("1", "true", "yes", "on")
+PANTRY_MIRROR_PATH = os.getenv("PANTRY_MIRROR_PATH", os.path.join("answers", "pantry_mirror.sqlite"))
+PANTRY_MIRROR_CONCURRENCY = int(os.getenv("PANTRY_MIRROR_CONCURRENCY", "3"))           # Basket downloads in flight during a sync
+PANTRY_MIRROR_REFRESH_SECONDS = float(os.getenv("PANTRY_MIRROR_REFRESH_SECONDS", "300"))  # Background sync interval; 0 disables it
+
+
+# --- Mirror ---
+class PantryMirror:
+    """
+    Local copy of a Pantry account (SQLite). A sync lists the account once, downloads only baskets
+    it has not stored yet (in parallel, up to `concurrency` at a time), and marks baskets that
+    disappeared remotely as removed. Listing and loading are then served locally; a basket not yet
+    downloaded is fetched on demand. Baskets are treated as immutable (every save gets a new name).
+    """
+    def __init__(self, path: str = PANTRY_MIRROR_PATH, concurrency: int = PANTRY_MIRROR_CONCURRENCY):
+        self.path = path
+        self.concurrency = max(1, concurrency)
+        self._lock = threading.Lock()
+        self._refresh_futures: dict = {}
+        self._sync_locks: dict[str, asyncio.Lock] = {}
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self._conn = sqlite3.connect(path, check_same_thread=False, timeout=30)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS baskets ("
+            " pantry_id TEXT NOT NULL, name TEXT NOT NULL, content TEXT, fetched_at REAL, listed_at REAL,"
+            " removed INTEGER NOT NULL DEFAULT 0, PRIMARY KEY (pantry_id, name))"
+        )
+        self._conn.execute("CREATE TABLE IF NOT EXISTS syncs (pantry_id TEXT PRIMARY KEY, synced_at REAL, result TEXT)")
+        self._conn.commit()
+
+    # --- Local Reads ---
+    def list_baskets(self, pantry_id: str) -> list[str]:
+        """Names of every mirrored basket still present remotely, sorted like the Pantry listing."""
+        with self._lock:
+            rows = self._conn.execute("SELECT name FROM baskets WHERE pantry_id = ? AND removed = 0 ORDER BY name", (pantry_id,)).fetchall()
+        return [row[0] for row in rows]
+
+    def get_basket(self, pantry_id: str, basket_name: str) -> dict | None:
+        """A basket's mirrored content (None if it has not been downloaded yet)."""
+        with self._lock:
+            row = self._conn.execute("SELECT content FROM baskets WHERE pantry_id = ? AND name = ? AND content IS NOT NULL",
+                                     (pantry_id, basket_name)).fetchone()
+        return json.loads(row[0]) if row else None
+
+    def put(self, pantry_id: str, basket_name: str, content: dict) -> None:
+        """Stores a basket's content, e.g. right after this process uploaded it."""
+        now = time.time()
+        with self._lock:
+            self._conn.execute(
+                "INSERT INTO baskets (pantry_id, name, content, fetched_at, listed_at, removed) VALUES (?, ?, ?, ?, ?, 0)"
+                " ON CONFLICT (pantry_id, name) DO UPDATE SET content = excluded.content, fetched_at = excluded.fetched_at, removed = 0",
+                (pantry_id, basket_name, json.dumps(content, ensure_ascii=False), now, now)
+            )
+            self._conn.commit()
+
+    def state(self, pantry_id: str) -> dict:
+        """Basket counts and the time and outcome of the last sync."""
+        with self._lock:
+            listed, downloaded = self._conn.execute(
+                "SELECT COUNT(*), COUNT(content) FROM baskets WHERE pantry_id = ? AND removed = 0", (pantry_id,)
+            ).fetchone()
+            sync = self._conn.execute("SELECT synced_at, result FROM syncs WHERE pantry_id = ?", (pantry_id,)).fetchone()
+        return {
+            "baskets": listed,
+            "downloaded": downloaded,
+            "synced_at": sync[0] if sync else None,
+            "last_sync": json.loads(sync[1]) if sync and sync[1] else None,
+        }
+
+    def _apply_listing(self, pantry_id: str, names: list[str]) -> tuple[list[str], int]:
+        """Records the remote listing; returns (baskets still to download, baskets removed remotely)."""
+        now = time.time()
+        with self._lock:
+            self._conn.executemany(
+                "INSERT INTO baskets (pantry_id, name, listed_at) VALUES (?, ?, ?)"
+                " ON CONFLICT (pantry_id, name) DO UPDATE SET listed_at = excluded.listed_at, removed = 0",
+                [(pantry_id, name, now) for name in names]
+            )
+            removed = self._conn.execute(
+                "UPDATE baskets SET removed = 1 WHERE pantry_id = ? AND removed = 0 AND (listed_at IS NULL OR listed_at < ?)",
+                (pantry_id, now)
+            ).rowcount
+            missing = [row[0] for row in self._conn.execute(
+                "SELECT name FROM baskets WHERE pantry_id = ? AND removed = 0 AND content IS NULL ORDER BY name DESC", (pantry_id,)
+            )]
+            self._conn.commit()
+        return missing, removed
+
+    def _record_sync(self, pantry_id: str, result: dict) -> None:
+        with self._lock:
+            self._conn.execute("INSERT OR REPLACE INTO syncs (pantry_id, synced_at, result) VALUES (?, ?, ?)",
+                               (pantry_id, time.time(), json.dumps(result)))
+            self._conn.commit()
+
+    # --- Network ---
+    async def sync(self, pantry_id: str) -> dict:
+        """
+        Delta sync with the Pantry account (runs on the I/O runtime loop, awaitable from any loop).
+        Returns {"listed", "downloaded", "failed", "removed", "elapsed_seconds"}, or {"error": ...}
+        if the account could not be listed.
+        """
+        return await get_io_runtime().run_async(self._sync(pantry_id))
+
+    async def _sync(self, pantry_id: str) -> dict:
+        lock = self._sync_locks.setdefault(pantry_id, asyncio.Lock())
+        async with lock: # A manual sync and the background refresh never overlap
+            start = time.perf_counter()
+            names = await list_pantry_baskets_async(pantry_id)
+            if names is None:
+                return {"error": "Could not list the Pantry baskets; the mirror was left unchanged."}
+            missing, removed = await asyncio.to_thread(self._apply_listing, pantry_id, names)
+
+            slots = asyncio.Semaphore(self.concurrency)
+
+            async def download(basket_name: str) -> bool:
+                async with slots:
+                    content = await get_pantry_basket_content_async(pantry_id, basket_name)
+                if not isinstance(content, dict):
+                    return False
+                await asyncio.to_thread(self.put, pantry_id, basket_name, content)
+                return True
+
+            downloaded = sum(await asyncio.gather(*(download(name) for name in missing)))
+            result = {
+                "listed": len(names),
+                "downloaded": downloaded,
+                "failed": len(missing) - downloaded,
+                "removed": removed,
+                "elapsed_seconds": round(time.perf_counter() - start, 3),
+            }
+            await asyncio.to_thread(self._record_sync, pantry_id, result)
+            logging.info(f"Pantry mirror sync for {pantry_id}: {result}")
+            return result
+
+    async def load_basket(self, pantry_id: str, basket_name: str) -> dict | None:
+        """A basket's content from the mirror, downloading (and mirroring) it first if needed."""
+        content = await asyncio.to_thread(self.get_basket, pantry_id, basket_name)
+        if content is not None:
+            return content
+        content = await get_io_runtime().run_async(get_pantry_basket_content_async(pantry_id, basket_name))
+        if isinstance(content, dict):
+            await asyncio.to_thread(self.put, pantry_id, basket_name, content)
+        return content
+
+    def start_background_refresh(self, pantry_id: str, interval: float = PANTRY_MIRROR_REFRESH_SECONDS) -> None:
+        """Syncs now and then every `interval` seconds on the I/O runtime loop (once per Pantry ID per process)."""
+        if interval <= 0:
+            return
+        with self._lock:
+            future = self._refresh_futures.get(pantry_id)
+            if future is not None and not future.done():
+                return
+            self._refresh_futures[pantry_id] = get_io_runtime().submit(self._refresh_forever(pantry_id, interval))
+
+    async def _refresh_forever(self, pantry_id: str, interval: float) -> None:
+        while True:
+            try:
+                await self._sync(pantry_id)
+            except Exception as e:
+                logging.exception(f"Background Pantry mirror sync failed: {e}")
+            await asyncio.sleep(interval)
+
+
+_shared_mirror: PantryMirror | None = None
+_shared_mirror_lock = threading.Lock()
+
+
+def get_pantry_mirror() -> PantryMirror:
+    """The process-wide Pantry mirror."""
+    global _shared_mirror
+    with _shared_mirror_lock:
+        if _shared_mirror is None:
+            _shared_mirror = PantryMirror()
+        return _shared_mirror
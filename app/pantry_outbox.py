@@ -0,0 +1,236 @@
+import os
+import time
+import random
+import sqlite3
+import asyncio
+import logging
+import threading
+import aiohttp
+from .tracing import start_trace
+from .output_store import get_output_store
+from .file_utils import PANTRY_BASE_URL, get_io_runtime, _traced_pantry_request
+from .pantry_mirror import PANTRY_MIRROR_ENABLED, get_pantry_mirror
+
+# Configure logging (can be configured centrally if preferred)
+logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+
+# Saves queue their Pantry upload here and return at once; false uploads inline as before
+PANTRY_OUTBOX_ENABLED = os.getenv("PANTRY_OUTBOX_ENABLED", "true").strip().lower() in ("1", "true", "yes", "on")
+PANTRY_OUTBOX_PATH = os.getenv("PANTRY_OUTBOX_PATH", os.path.join("answers", "pantry_outbox.sqlite"))
+PANTRY_OUTBOX_CONCURRENCY = int(os.getenv("PANTRY_OUTBOX_CONCURRENCY", "2"))      # Uploads in flight at once
+PANTRY_OUTBOX_MAX_ATTEMPTS = int(os.getenv("PANTRY_OUTBOX_MAX_ATTEMPTS", "6"))    # Then the upload is marked failed
+PANTRY_OUTBOX_BACKOFF_BASE = float(os.getenv("PANTRY_OUTBOX_BACKOFF_BASE", "2"))  # Seconds before the first retry; doubles per attempt
+PANTRY_OUTBOX_BACKOFF_MAX = float(os.getenv("PANTRY_OUTBOX_BACKOFF_MAX", "300"))
+PANTRY_OUTBOX_DRAIN_TIMEOUT = float(os.getenv("PANTRY_OUTBOX_DRAIN_TIMEOUT", "60"))  # Seconds a batch run waits for queued uploads
+
+PENDING = "pending"
+UPLOADING = "uploading"
+DONE = "done"
+FAILED = "failed"
+_ENTRY_COLUMNS = ("id", "output_id", "basket_name", "status", "attempts", "next_attempt_at", "last_error", "created_at", "updated_at")
+
+
+def _is_permanent(error: Exception) -> bool:
+    """4xx responses (other than timeouts and rate limits) will fail the same way on every retry."""
+    return isinstance(error, aiohttp.ClientResponseError) and 400 <= error.status < 500 and error.status not in (408, 429)
+
+
+# --- Outbox ---
+class PantryOutbox:
+    """
+    Persistent write-behind queue of Pantry uploads (SQLite). Entries only reference the saved
+    output by ID; the record is read back from the output store at upload time. A drain task on
+    the I/O runtime loop uploads due entries, at most `concurrency` at a time, retrying transient
+    failures with jittered exponential backoff. Entries left by an earlier process are resumed.
+    """
+    def __init__(self, path: str = PANTRY_OUTBOX_PATH, concurrency: int = PANTRY_OUTBOX_CONCURRENCY,
+                 max_attempts: int = PANTRY_OUTBOX_MAX_ATTEMPTS, backoff_base: float = PANTRY_OUTBOX_BACKOFF_BASE,
+                 backoff_max: float = PANTRY_OUTBOX_BACKOFF_MAX):
+        self.path = path
+        self.concurrency = max(1, concurrency)
+        self.max_attempts = max(1, max_attempts)
+        self.backoff_base = backoff_base
+        self.backoff_max = backoff_max
+        self._lock = threading.Lock()
+        self._wake: asyncio.Event | None = None
+        self._loop: asyncio.AbstractEventLoop | None = None
+        self._drain_future = None
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self._conn = sqlite3.connect(path, check_same_thread=False, timeout=30)
+        self._conn.row_factory = sqlite3.Row
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS outbox ("
+            " id INTEGER PRIMARY KEY AUTOINCREMENT, output_id INTEGER NOT NULL, pantry_id TEXT NOT NULL,"
+            " basket_name TEXT NOT NULL, status TEXT NOT NULL, attempts INTEGER NOT NULL DEFAULT 0,"
+            " next_attempt_at REAL NOT NULL, last_error TEXT, created_at REAL NOT NULL, updated_at REAL NOT NULL)"
+        )
+        self._conn.execute("CREATE INDEX IF NOT EXISTS idx_outbox_due ON outbox (status, next_attempt_at)")
+        # Uploads interrupted by a restart are simply sent again (same basket name, so it overwrites)
+        self._conn.execute("UPDATE outbox SET status = ? WHERE status = ?", (PENDING, UPLOADING))
+        self._conn.commit()
+
+    # --- Queue State ---
+    def enqueue(self, output_id: int, pantry_id: str, basket_name: str) -> int:
+        """Queues the upload of a saved output and wakes the drain task; returns the entry ID."""
+        now = time.time()
+        with self._lock:
+            cursor = self._conn.execute(
+                "INSERT INTO outbox (output_id, pantry_id, basket_name, status, next_attempt_at, created_at, updated_at)"
+                " VALUES (?, ?, ?, ?, ?, ?, ?)",
+                (output_id, pantry_id, basket_name, PENDING, now, now, now)
+            )
+            self._conn.commit()
+        self._notify()
+        return cursor.lastrowid
+
+    def _claim_due(self, limit: int) -> list[dict]:
+        now = time.time()
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT id, output_id, pantry_id, basket_name, attempts FROM outbox"
+                " WHERE status = ? AND next_attempt_at <= ? ORDER BY next_attempt_at LIMIT ?",
+                (PENDING, now, limit)
+            ).fetchall()
+            self._conn.executemany("UPDATE outbox SET status = ?, updated_at = ? WHERE id = ?",
+                                   [(UPLOADING, now, row["id"]) for row in rows])
+            self._conn.commit()
+        return [dict(row) for row in rows]
+
+    def _seconds_until_next_due(self) -> float | None:
+        with self._lock:
+            row = self._conn.execute("SELECT MIN(next_attempt_at) FROM outbox WHERE status = ?", (PENDING,)).fetchone()
+        return None if row[0] is None else max(0.0, row[0] - time.time())
+
+    def _finish(self, entry_id: int, status: str, attempts: int, error: str | None = None, next_attempt_at: float | None = None) -> None:
+        now = time.time()
+        with self._lock:
+            self._conn.execute(
+                "UPDATE outbox SET status = ?, attempts = ?, last_error = ?, next_attempt_at = COALESCE(?, next_attempt_at), updated_at = ? WHERE id = ?",
+                (status, attempts, error, next_attempt_at, now, entry_id)
+            )
+            self._conn.commit()
+
+    def status(self, limit: int = 20) -> dict:
+        """Counts per state plus the oldest pending and the most recent failed uploads."""
+        columns = ", ".join(_ENTRY_COLUMNS)
+        with self._lock:
+            counts = {PENDING: 0, UPLOADING: 0, DONE: 0, FAILED: 0}
+            counts.update({row[0]: row[1] for row in self._conn.execute("SELECT status, COUNT(*) FROM outbox GROUP BY status")})
+            pending = self._conn.execute(f"SELECT {columns} FROM outbox WHERE status IN (?, ?) ORDER BY id LIMIT ?",
+                                         (PENDING, UPLOADING, limit)).fetchall()
+            failed = self._conn.execute(f"SELECT {columns} FROM outbox WHERE status = ? ORDER BY id DESC LIMIT ?",
+                                        (FAILED, limit)).fetchall()
+        return {"counts": counts, "pending": [dict(row) for row in pending], "failed": [dict(row) for row in failed]}
+
+    def retry_failed(self, entry_id: int | None = None) -> int:
+        """Re-queues one failed upload (or all of them) with a fresh attempt budget; returns how many."""
+        now = time.time()
+        with self._lock:
+            if entry_id is None:
+                cursor = self._conn.execute("UPDATE outbox SET status = ?, attempts = 0, next_attempt_at = ?, updated_at = ? WHERE status = ?",
+                                            (PENDING, now, now, FAILED))
+            else:
+                cursor = self._conn.execute("UPDATE outbox SET status = ?, attempts = 0, next_attempt_at = ?, updated_at = ? WHERE status = ? AND id = ?",
+                                            (PENDING, now, now, FAILED, entry_id))
+            self._conn.commit()
+        self._notify()
+        return cursor.rowcount
+
+    # --- Uploader ---
+    def start(self) -> None:
+        """Starts the drain task on the I/O runtime loop (once per process)."""
+        with self._lock:
+            if self._drain_future is not None and not self._drain_future.done():
+                return
+            runtime = get_io_runtime()
+            self._loop = runtime.loop
+            self._drain_future = runtime.submit(self._drain_forever())
+
+    def _notify(self) -> None:
+        loop, wake = self._loop, self._wake
+        if loop is not None and wake is not None and not loop.is_closed():
+            loop.call_soon_threadsafe(wake.set)
+
+    async def _drain_forever(self) -> None:
+        self._wake = asyncio.Event()
+        in_flight: set[asyncio.Task] = set()
+
+        def on_done(task: asyncio.Task) -> None:
+            in_flight.discard(task)
+            self._wake.set()
+
+        while True:
+            self._wake.clear()
+            try:
+                free = self.concurrency - len(in_flight)
+                entries = await asyncio.to_thread(self._claim_due, free) if free > 0 else []
+                for entry in entries:
+                    task = asyncio.create_task(self._upload(entry))
+                    in_flight.add(task)
+                    task.add_done_callback(on_done)
+                if entries and len(in_flight) < self.concurrency:
+                    continue # More may be due
+                delay = await asyncio.to_thread(self._seconds_until_next_due) if len(in_flight) < self.concurrency else None
+            except Exception as e:
+                logging.exception(f"Pantry outbox could not read its queue: {e}")
+                delay = 5.0
+            try:
+                await asyncio.wait_for(self._wake.wait(), timeout=delay)
+            except asyncio.TimeoutError:
+                pass
+
+    async def _upload(self, entry: dict) -> None:
+        attempts = entry["attempts"] + 1
+        basket_name = entry["basket_name"]
+        try:
+            with start_trace("pantry.outbox_upload", output_id=entry["output_id"], basket=basket_name, attempt=attempts):
+                record = await asyncio.to_thread(get_output_store().get, entry["output_id"])
+                if record is None:
+                    raise LookupError(f"Saved output {entry['output_id']} no longer exists locally")
+                record["pantry_basket_name"] = basket_name
+                await _traced_pantry_request("POST", "save_basket", f"{PANTRY_BASE_URL}/{entry['pantry_id']}/basket/{basket_name}",
+                                             expect_json=False, span_attributes={"basket": basket_name},
+                                             json=record, headers={"Content-Type": "application/json"})
+        except Exception as e:
+            error = f"{e.status} - {e.message}" if isinstance(e, aiohttp.ClientResponseError) else f"{type(e).__name__}: {e}"
+            if _is_permanent(e) or isinstance(e, LookupError) or attempts >= self.max_attempts:
+                await asyncio.to_thread(self._finish, entry["id"], FAILED, attempts, error)
+                logging.error(f"Pantry upload of basket {basket_name} failed after {attempts} attempt(s): {error}")
+            else:
+                delay = min(self.backoff_max, self.backoff_base * 2 ** (attempts - 1)) * random.uniform(0.5, 1.0)
+                await asyncio.to_thread(self._finish, entry["id"], PENDING, attempts, error, time.time() + delay)
+                logging.warning(f"Pantry upload of basket {basket_name} failed (attempt {attempts}/{self.max_attempts}): {error}; retrying in {delay:.1f}s.")
+            return
+        await asyncio.to_thread(self._finish, entry["id"], DONE, attempts)
+        await asyncio.to_thread(get_output_store().set_pantry_basket, entry["output_id"], basket_name)
+        if PANTRY_MIRROR_ENABLED: # Loading it back later needs no download
+            await asyncio.to_thread(get_pantry_mirror().put, entry["pantry_id"], basket_name, record)
+        logging.info(f"Successfully saved output to Pantry. Basket: {basket_name}")
+
+    async def wait_idle(self, timeout: float = PANTRY_OUTBOX_DRAIN_TIMEOUT) -> bool:
+        """Waits (from any loop) until nothing is pending or uploading; False if `timeout` passed first."""
+        deadline = time.monotonic() + timeout
+        while True:
+            counts = (await asyncio.to_thread(self.status, 0))["counts"]
+            if counts[PENDING] + counts[UPLOADING] == 0:
+                return True
+            if time.monotonic() >= deadline:
+                return False
+            await asyncio.sleep(0.2)
+
+
+_shared_outbox: PantryOutbox | None = None
+_shared_outbox_lock = threading.Lock()
+
+
+def get_pantry_outbox() -> PantryOutbox:
+    """The process-wide outbox; created and started on first use, resuming uploads left by earlier runs."""
+    global _shared_outbox
+    with _shared_outbox_lock:
+        if _shared_outbox is None:
+            _shared_outbox = PantryOutbox()
+            _shared_outbox.start()
+        return _shared_outbox
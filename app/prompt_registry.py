@@ -0,0 +1,130 @@
+import os
+import time
+import logging
+import threading
+from string import Formatter
+
+# Configure logging (can be configured centrally if preferred)
+logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+
+# Resolved relative to this package, not the current working directory
+PROMPTS_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "prompts")
+# How often (seconds) a cached template re-checks its file's mtime; 0 checks on every access
+PROMPT_RELOAD_CHECK_INTERVAL = float(os.getenv("PROMPT_RELOAD_CHECK_INTERVAL", "2.0"))
+
+
+# --- Pre-split Template ---
+class PromptTemplate:
+    """
+    A prompt file split once into static text and `{placeholder}` parts.
+
+    `format(**kwargs)` produces exactly what `str.format` would for the original text,
+    but only joins the pre-split pieces instead of re-parsing the template on every call.
+    """
+    def __init__(self, name: str, text: str, mtime: float):
+        self.name = name
+        self.text = text
+        self.mtime = mtime
+        self.last_checked = time.monotonic()
+        self._parts: list[tuple[str, str | None]] = []
+        self._needs_full_format = False # Format specs, conversions or attribute/index lookups
+
+        try:
+            for literal, field_name, format_spec, conversion in Formatter().parse(text):
+                if field_name is not None and (format_spec or conversion or not field_name.isidentifier()):
+                    self._needs_full_format = True
+                self._parts.append((literal, field_name))
+        except ValueError:
+            # Not a valid format string (e.g. system prompts with raw JSON braces); it is only ever used verbatim
+            self._parts = [(text, None)]
+            self._needs_full_format = True
+        self.placeholders = frozenset(field for _, field in self._parts if field)
+
+    def format(self, **kwargs) -> str:
+        if self._needs_full_format:
+            return self.text.format(**kwargs)
+        pieces = []
+        for literal, field_name in self._parts:
+            pieces.append(literal)
+            if field_name is not None:
+                pieces.append(str(kwargs[field_name])) # KeyError on a missing value, like str.format
+        return "".join(pieces)
+
+    def __repr__(self):
+        return f"PromptTemplate({self.name!r}, placeholders={sorted(self.placeholders)})"
+
+
+# --- Registry ---
+class PromptRegistry:
+    """Keeps every prompt file in memory, keyed by file name, and reloads a file only when its mtime changes."""
+    def __init__(self, directory: str = PROMPTS_DIR, check_interval: float = PROMPT_RELOAD_CHECK_INTERVAL):
+        self.directory = directory
+        self.check_interval = check_interval
+        self._templates: dict[str, PromptTemplate] = {}
+        self._lock = threading.Lock()
+
+    def _load(self, name: str) -> PromptTemplate:
+        filepath = os.path.join(self.directory, name)
+        mtime = os.stat(filepath).st_mtime # Raises FileNotFoundError for unknown prompts
+        with open(filepath, 'r', encoding='utf-8') as f:
+            text = f.read()
+        template = PromptTemplate(name, text, mtime)
+        self._templates[name] = template
+        return template
+
+    def preload(self) -> int:
+        """Loads every prompt file in the directory. Returns how many templates were loaded."""
+        loaded = 0
+        with self._lock:
+            try:
+                names = sorted(entry for entry in os.listdir(self.directory) if entry.endswith(".txt"))
+            except FileNotFoundError:
+                logging.error(f"Prompt directory not found: {self.directory}")
+                return 0
+            for name in names:
+                try:
+                    self._load(name)
+                    loaded += 1
+                except Exception as e:
+                    logging.exception(f"Error preloading prompt file {name}: {e}")
+        logging.info(f"Preloaded {loaded} prompt template(s) from {self.directory}.")
+        return loaded
+
+    def get(self, name: str) -> PromptTemplate:
+        template = self._templates.get(name)
+        now = time.monotonic()
+        if template is not None and now - template.last_checked < self.check_interval:
+            return template
+
+        with self._lock:
+            template = self._templates.get(name)
+            if template is None:
+                logging.info(f"Loading prompt template on demand: {name}")
+                return self._load(name)
+            try:
+                current_mtime = os.stat(os.path.join(self.directory, name)).st_mtime
+            except FileNotFoundError:
+                logging.warning(f"Prompt file {name} disappeared from disk; keeping the cached copy.")
+                template.last_checked = now
+                return template
+            if current_mtime != template.mtime:
+                logging.info(f"Prompt file {name} changed on disk; reloading.")
+                return self._load(name)
+            template.last_checked = now
+            return template
+
+    def names(self) -> list[str]:
+        return sorted(self._templates)
+
+
+prompt_registry = PromptRegistry()
+
+
+def get_prompt_template(name: str) -> PromptTemplate:
+    """Returns the cached template for a prompt file in app/prompts (e.g. 'system_prompt_blog_generation.txt')."""
+    return prompt_registry.get(name)
+
+
+def preload_prompt_templates() -> int:
+    """Loads all prompt files into memory; called once at package import."""
+    return prompt_registry.preload()
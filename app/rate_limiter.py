@@ -0,0 +1,151 @@
+import os
+import time
+import asyncio
+import logging
+import threading
+
+# Configure logging (can be configured centrally if preferred)
+logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+
+# Requests per minute per model, e.g. "gemini-2.5-pro=10,gpt-4.1=60,*=30" ('*' applies to any other model)
+LLM_RATE_LIMITS = os.getenv("LLM_RATE_LIMITS", "")
+
+
+def parse_rate_limits(spec: str | list[str] | None) -> dict[str, float]:
+    """Parses 'model=rpm' pairs (comma-separated string or list) into {model: requests_per_minute}."""
+    if not spec:
+        return {}
+    entries = spec.split(",") if isinstance(spec, str) else [part for item in spec for part in item.split(",")]
+    limits = {}
+    for entry in entries:
+        entry = entry.strip()
+        if not entry:
+            continue
+        model, sep, rpm = entry.rpartition("=")
+        if not sep or not model.strip():
+            raise ValueError(f"Invalid rate limit '{entry}'; expected MODEL=REQUESTS_PER_MINUTE")
+        rate = float(rpm)
+        if rate <= 0:
+            raise ValueError(f"Rate limit for '{model.strip()}' must be positive, got {rpm}")
+        limits[model.strip()] = rate
+    return limits
+
+
+# --- Token Bucket ---
+class AsyncRateLimiter:
+    """
+    Token bucket shared by every call to one model: `requests_per_minute` sustained,
+    up to `burst` back-to-back. Waiters are served in arrival order.
+    """
+    def __init__(self, requests_per_minute: float, burst: int = 1):
+        self.requests_per_minute = requests_per_minute
+        self.rate = requests_per_minute / 60.0
+        self.capacity = float(max(1, burst))
+        self._tokens = self.capacity
+        self._updated = time.monotonic()
+        self._lock: asyncio.Lock | None = None
+        self._loop = None
+
+    def _get_lock(self) -> asyncio.Lock:
+        loop = asyncio.get_running_loop()
+        if self._lock is None or self._loop is not loop:
+            self._lock = asyncio.Lock()
+            self._loop = loop
+        return self._lock
+
+    async def acquire(self) -> float:
+        """Waits for a token; returns how long the caller was held back (seconds)."""
+        waited = 0.0
+        async with self._get_lock():
+            while True:
+                now = time.monotonic()
+                self._tokens = min(self.capacity, self._tokens + (now - self._updated) * self.rate)
+                self._updated = now
+                if self._tokens >= 1:
+                    self._tokens -= 1
+                    return waited
+                delay = (1 - self._tokens) / self.rate
+                waited += delay
+                await asyncio.sleep(delay)
+
+
+# --- Client Wrapper ---
+class RateLimitedChatModel:
+    """
+    Wraps a chat model so every ainvoke/astream first takes a token from its model's limiter.
+    Anything else is delegated to the wrapped client.
+    """
+    wraps_chat_model = True
+
+    def __init__(self, client, limiter: AsyncRateLimiter):
+        self.client = client
+        self.limiter = limiter
+
+    def __getattr__(self, name):
+        return getattr(self.client, name)
+
+    async def ainvoke(self, messages, config=None, **kwargs):
+        waited = await self.limiter.acquire()
+        if waited:
+            logging.info(f"Rate limit for model '{getattr(self.client, 'model_name', None)}' delayed a call by {waited:.2f}s.")
+        return await self.client.ainvoke(messages, config, **kwargs)
+
+    async def astream(self, messages, config=None, **kwargs):
+        waited = await self.limiter.acquire()
+        if waited:
+            logging.info(f"Rate limit for model '{getattr(self.client, 'model_name', None)}' delayed a streamed call by {waited:.2f}s.")
+        async for chunk in self.client.astream(messages, config, **kwargs):
+            yield chunk
+
+
+_limiters: dict[str, AsyncRateLimiter] = {}
+_limiters_lock = threading.Lock()
+
+
+def get_rate_limiter(model_name: str, requests_per_minute: float) -> AsyncRateLimiter:
+    """One limiter per model, so clients that share a model also share its budget."""
+    with _limiters_lock:
+        limiter = _limiters.get(model_name)
+        if limiter is None or limiter.requests_per_minute != requests_per_minute:
+            limiter = AsyncRateLimiter(requests_per_minute)
+            _limiters[model_name] = limiter
+        return limiter
+
+
+def _is_wrapper(client) -> bool:
+    # Checked on the class: instances delegate unknown attributes to the model they wrap
+    return bool(getattr(type(client), "wraps_chat_model", False))
+
+
+def apply_rate_limits(client, limits: dict[str, float]):
+    """
+    Returns `client` with its model's rate limit applied (or unchanged if none is configured).
+    The limiter is inserted directly around the underlying model, beneath any cache or tracing
+    wrappers, so cache hits are never delayed.
+    """
+    if client is None or not limits:
+        return client
+
+    # Find the innermost wrapper (its .client is the real model)
+    parent = None
+    node = client
+    while _is_wrapper(node):
+        if isinstance(node, RateLimitedChatModel):
+            break # Re-applying replaces the previous limit instead of stacking
+        if getattr(type(node), "pools_chat_models", False):
+            # A model pool: limit each member by its own model's budget
+            node.clients = [apply_rate_limits(member, limits) for member in node.clients]
+            return client
+        parent, node = node, node.client
+    target = node.client if isinstance(node, RateLimitedChatModel) else node
+
+    model_name = getattr(target, "model_name", None) or "unknown"
+    rpm = limits.get(model_name, limits.get("*"))
+    if rpm is None:
+        return client
+    limited = RateLimitedChatModel(target, get_rate_limiter(model_name, rpm))
+    logging.info(f"Rate limiting model '{model_name}' to {rpm:g} requests/minute.")
+    if parent is None:
+        return limited
+    parent.client = limited
+    return client
@@ -0,0 +1,178 @@
+import os
+import re
+import time
+import sqlite3
+import logging
+import threading
+from .output_store import get_output_store
+
+# Configure logging (can be configured centrally if preferred)
+logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+
+SEARCH_INDEX_ENABLED = os.getenv("SEARCH_INDEX_ENABLED", "true").strip().lower() in ("1", "true", "yes", "on")
+SEARCH_INDEX_PATH = os.getenv("SEARCH_INDEX_PATH", os.path.join("answers", "search_index.sqlite"))
+
+# bm25 weights per column: a match in the title counts most, one in the body least
+_COLUMNS = ("title", "keywords", "tags", "slug", "content")
+_WEIGHTS = (10.0, 6.0, 4.0, 3.0, 1.0)
+
+
+# --- Persian Normalization ---
+_CHAR_MAP = str.maketrans({
+    "\u064a": "\u06cc", "\u0649": "\u06cc",  # Arabic yeh / alef maksura -> Persian yeh
+    "\u0643": "\u06a9",                      # Arabic kaf -> Persian kaf
+    "\u0629": "\u0647", "\u06c0": "\u0647",  # Teh marbuta / heh with yeh -> heh
+    "\u0623": "\u0627", "\u0625": "\u0627", "\u0671": "\u0627",  # Alef with hamza / wasla -> alef
+    "\u0624": "\u0648",                      # Waw with hamza -> waw
+    "\u200c": " ", "\u200d": "",             # ZWNJ joins the parts of one word: index them as separate terms
+    "\u0640": "",                            # Tatweel
+    **{chr(0x06f0 + d): str(d) for d in range(10)},  # Persian digits
+    **{chr(0x0660 + d): str(d) for d in range(10)},  # Arabic-Indic digits
+})
+_DIACRITICS = re.compile("[\u064b-\u065f\u0670\u06d6-\u06ed]")  # Harakat, superscript alef, Quranic marks
+
+
+def normalize_persian(text: str) -> str:
+    """Folds the spelling variants a Persian reader treats as equal, so index and queries agree."""
+    return _DIACRITICS.sub("", (text or "").translate(_CHAR_MAP)).lower()
+
+
+def tokenize(text: str) -> list[str]:
+    return re.findall(r"\w+", normalize_persian(text))
+
+
+def _index_terms(text: str) -> list[str]:
+    """Terms to index: the normalized tokens, plus each ZWNJ compound written solid (میشود), as users also type it."""
+    compounds = re.findall(r"\w+(?:\u200c\w+)+", text)
+    return tokenize(text) + tokenize(" ".join(compound.replace("\u200c", "") for compound in compounds))
+
+
+def _as_text(value) -> str:
+    if isinstance(value, (list, tuple)):
+        return " ".join(str(item) for item in value if item)
+    return str(value) if value else ""
+
+
+def _document(package: dict) -> tuple[str, ...]:
+    """The indexed columns of a package, normalized."""
+    fields = (
+        (package.get("title"), package.get("seo_title")),
+        (package.get("primary_focus_keyword"), package.get("secondary_focus_keyword"), package.get("additional_focus_keywords")),
+        (package.get("tags"),),
+        ((package.get("slug") or "").replace("-", " "),),
+        (package.get("meta_description"), package.get("content")),
+    )
+    return tuple(" ".join(_index_terms(" ".join(_as_text(value) for value in column))) for column in fields)
+
+
+# --- Search Index ---
+class PackageSearchIndex:
+    """
+    SQLite FTS5 inverted index over the title, keywords, tags, slug and content of every saved
+    package, keyed by output ID. Text is normalized by `normalize_persian` on both sides. The FTS
+    table is contentless (the packages live in the output store), so it holds only the index.
+    """
+    def __init__(self, path: str = SEARCH_INDEX_PATH):
+        self.path = path
+        self._lock = threading.Lock()
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self._conn = sqlite3.connect(path, check_same_thread=False, timeout=30)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute(
+            f"CREATE VIRTUAL TABLE IF NOT EXISTS packages_fts USING fts5({', '.join(_COLUMNS)}, content='', tokenize='unicode61')"
+        )
+        self._conn.execute("CREATE TABLE IF NOT EXISTS documents (output_id INTEGER PRIMARY KEY, title TEXT, slug TEXT, timestamp TEXT)")
+        self._conn.execute("CREATE TABLE IF NOT EXISTS sync_state (key TEXT PRIMARY KEY, value INTEGER)")
+        self._conn.commit()
+
+    def add_record(self, output_id: int, record: dict, commit: bool = True) -> bool:
+        """Indexes a saved record's package (successful saves only); returns True if it was added."""
+        package = record.get("final_parsed_package")
+        if record.get("status") != "success" or not isinstance(package, dict):
+            return False
+        document = _document(package)
+        with self._lock:
+            # Outputs are never rewritten under the same ID, so an indexed ID is simply skipped
+            if self._conn.execute("SELECT 1 FROM documents WHERE output_id = ?", (output_id,)).fetchone():
+                return False
+            self._conn.execute(f"INSERT INTO packages_fts (rowid, {', '.join(_COLUMNS)}) VALUES (?, ?, ?, ?, ?, ?)", (output_id, *document))
+            self._conn.execute("INSERT INTO documents (output_id, title, slug, timestamp) VALUES (?, ?, ?, ?)",
+                               (output_id, package.get("title"), package.get("slug"), record.get("timestamp")))
+            if commit:
+                self._conn.commit()
+        return True
+
+    def sync_store(self) -> int:
+        """Indexes output-store records saved since the last sync (earlier history, other processes)."""
+        with self._lock:
+            row = self._conn.execute("SELECT value FROM sync_state WHERE key = 'last_output_id'").fetchone()
+        seen_from = row[0] if row else 0
+        last_id, added = seen_from, 0
+        for output_id, _, record in get_output_store().iter_records(after_id=seen_from):
+            last_id = output_id
+            added += self.add_record(output_id, record, commit=False) # Committed in batches below
+            if added and added % 500 == 0:
+                self._commit_sync_state(last_id)
+        if last_id != seen_from:
+            self._commit_sync_state(last_id)
+        if added:
+            logging.info(f"Package search index: added {added} saved package(s) from the output store.")
+        return added
+
+    def _commit_sync_state(self, last_id: int) -> None:
+        with self._lock:
+            self._conn.execute("INSERT OR REPLACE INTO sync_state (key, value) VALUES ('last_output_id', ?)", (last_id,))
+            self._conn.commit()
+
+    def search(self, query: str, limit: int = 20) -> dict:
+        """
+        Ranked (bm25, title-weighted) packages matching every query term; the last term also
+        matches as a prefix, so partial words work while typing. Returns {"results", "elapsed_ms"}.
+        """
+        start = time.perf_counter()
+        terms = tokenize(query)
+        if not terms:
+            return {"results": [], "elapsed_ms": 0.0}
+        match = " ".join(f'"{term}"' for term in terms[:-1]) + f' "{terms[-1]}"*'
+        with self._lock:
+            rows = self._conn.execute(
+                f"SELECT f.rowid, bm25(packages_fts, {', '.join(str(w) for w in _WEIGHTS)}) AS score, d.title, d.slug, d.timestamp"
+                " FROM packages_fts AS f JOIN documents AS d ON d.output_id = f.rowid"
+                " WHERE packages_fts MATCH ? ORDER BY score LIMIT ?",
+                (match.strip(), limit)
+            ).fetchall()
+        results = [{"id": row[0], "score": round(-row[1], 3), "title": row[2], "slug": row[3], "timestamp": row[4]} for row in rows]
+        return {"results": results, "elapsed_ms": round((time.perf_counter() - start) * 1000, 2)}
+
+    def count(self) -> int:
+        with self._lock:
+            return self._conn.execute("SELECT COUNT(*) FROM documents").fetchone()[0]
+
+
+_shared_index: PackageSearchIndex | None = None
+_shared_index_lock = threading.Lock()
+
+
+def get_search_index() -> PackageSearchIndex:
+    """The process-wide search index; the first call also indexes packages saved before it existed."""
+    global _shared_index
+    with _shared_index_lock:
+        if _shared_index is None:
+            _shared_index = PackageSearchIndex()
+            _shared_index.sync_store()
+        return _shared_index
+
+
+def search_packages(query: str, limit: int = 20) -> dict:
+    """Ranked search over every saved package (picking up saves from other processes first)."""
+    if not SEARCH_INDEX_ENABLED:
+        return {"results": [], "elapsed_ms": 0.0, "error": "Package search is disabled (SEARCH_INDEX_ENABLED=false)."}
+    try:
+        index = get_search_index()
+        index.sync_store()
+        return index.search(query, limit)
+    except sqlite3.Error as e:
+        logging.error(f"Package search failed for '{query}': {e}")
+        return {"results": [], "elapsed_ms": 0.0, "error": str(e)}
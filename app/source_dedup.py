@@ -0,0 +1,209 @@
+import os
+import re
+import json
+import time
+import random
+import sqlite3
+import hashlib
+import logging
+import threading
+from array import array
+from .output_store import get_output_store
+
+# Configure logging (can be configured centrally if preferred)
+logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+
+SOURCE_DEDUP_ENABLED = os.getenv("SOURCE_DEDUP_ENABLED", "true").strip().lower() in ("1", "true", "yes", "on")
+# Estimated Jaccard similarity (of 3-word shingles) at which an earlier source counts as the same story
+SOURCE_DEDUP_THRESHOLD = float(os.getenv("SOURCE_DEDUP_THRESHOLD", "0.5"))
+SOURCE_DEDUP_INDEX = os.getenv("SOURCE_DEDUP_INDEX", os.path.join("answers", "source_fingerprints.sqlite"))
+
+_SHINGLE_WORDS = 3
+_NUM_PERM = 128
+_BANDS = 42            # 42 bands x 3 rows: a pair at similarity 0.5 becomes a candidate >99% of the time, at 0.1 ~4%
+_ROWS = 3
+_PRIME = (1 << 61) - 1
+_MAX_HASH = (1 << 64) - 1
+# Fixed seed so signatures stay comparable across processes and restarts
+_rng = random.Random(0x5EED)
+_PERMUTATIONS = [(_rng.randrange(1, _PRIME), _rng.randrange(0, _PRIME)) for _ in range(_NUM_PERM)]
+
+
+# --- MinHash ---
+def _shingles(text: str) -> set[str]:
+    words = re.findall(r"\w+", (text or "").lower())
+    if len(words) < _SHINGLE_WORDS:
+        return {" ".join(words)} if words else set()
+    return {" ".join(words[i:i + _SHINGLE_WORDS]) for i in range(len(words) - _SHINGLE_WORDS + 1)}
+
+
+def minhash_signature(text: str) -> list[int]:
+    """128-value MinHash signature of the text's 3-word shingles."""
+    hashes = [int.from_bytes(hashlib.blake2b(s.encode("utf-8"), digest_size=8).digest(), "big") for s in _shingles(text)]
+    if not hashes:
+        return [_MAX_HASH] * _NUM_PERM
+    return [min((a * h + b) % _PRIME for h in hashes) for a, b in _PERMUTATIONS]
+
+
+def estimate_similarity(signature_a: list[int], signature_b: list[int]) -> float:
+    """Share of matching MinHash values, an unbiased estimate of the Jaccard similarity."""
+    return sum(1 for x, y in zip(signature_a, signature_b) if x == y) / _NUM_PERM
+
+
+def _band_keys(signature: list[int]) -> list[str]:
+    return [
+        hashlib.blake2b(array("Q", signature[band * _ROWS:(band + 1) * _ROWS]).tobytes(), digest_size=8).hexdigest()
+        for band in range(_BANDS)
+    ]
+
+
+# --- Fingerprint Index ---
+class SourceFingerprintIndex:
+    """
+    MinHash + LSH index of every source body saved under answers/. Lookups only compare against
+    sources sharing at least one LSH band, so checks stay fast as the history grows. Records are
+    added as they are saved, and output-store records not yet indexed are picked up on open.
+    """
+    def __init__(self, path: str = SOURCE_DEDUP_INDEX):
+        self.path = path
+        self._lock = threading.Lock()
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS sources ("
+            " local_file TEXT PRIMARY KEY, title TEXT, url TEXT, slug TEXT, saved_at TEXT, signature BLOB NOT NULL)"
+        )
+        self._conn.execute("CREATE TABLE IF NOT EXISTS bands (band INTEGER NOT NULL, bucket TEXT NOT NULL, local_file TEXT NOT NULL)")
+        self._conn.execute("CREATE INDEX IF NOT EXISTS idx_bands_bucket ON bands (band, bucket)")
+        self._conn.execute("CREATE TABLE IF NOT EXISTS scanned (local_file TEXT PRIMARY KEY)")
+        self._conn.execute("CREATE TABLE IF NOT EXISTS sync_state (key TEXT PRIMARY KEY, value INTEGER)")
+        self._conn.commit()
+
+    def add(self, local_file: str, source_body: str, title: str | None = None, url: str | None = None,
+            slug: str | None = None, saved_at: str | None = None) -> None:
+        signature = minhash_signature(source_body)
+        with self._lock:
+            self._conn.execute("DELETE FROM bands WHERE local_file = ?", (local_file,))
+            self._conn.execute(
+                "INSERT OR REPLACE INTO sources (local_file, title, url, slug, saved_at, signature) VALUES (?, ?, ?, ?, ?, ?)",
+                (local_file, title, url, slug, saved_at, array("Q", signature).tobytes())
+            )
+            self._conn.executemany(
+                "INSERT INTO bands (band, bucket, local_file) VALUES (?, ?, ?)",
+                [(band, key, local_file) for band, key in enumerate(_band_keys(signature))]
+            )
+            self._conn.execute("INSERT OR IGNORE INTO scanned (local_file) VALUES (?)", (local_file,))
+            self._conn.commit()
+
+    def add_record(self, record: dict, local_file: str) -> bool:
+        """Indexes a saved answers/ record if it succeeded and carries its source; returns True if indexed."""
+        source = record.get("source") or {}
+        package = record.get("final_parsed_package") or {}
+        if record.get("status") != "success" or not source.get("body"):
+            with self._lock:
+                self._conn.execute("INSERT OR IGNORE INTO scanned (local_file) VALUES (?)", (local_file,))
+                self._conn.commit()
+            return False
+        self.add(local_file, source["body"], title=source.get("title"), url=source.get("url"),
+                 slug=package.get("slug"), saved_at=record.get("timestamp"))
+        return True
+
+    def relocate(self, old_file: str, new_file: str) -> None:
+        """Repoints an indexed source at the record's new location (e.g. after it moved into the segment archive)."""
+        with self._lock:
+            for table in ("sources", "bands", "scanned"):
+                self._conn.execute(f"UPDATE OR REPLACE {table} SET local_file = ? WHERE local_file = ?", (new_file, old_file))
+            self._conn.commit()
+
+    def sync_store(self) -> int:
+        """
+        Indexes output-store records saved since the last sync (e.g. by another process); only the
+        store's new rows are read, never the answers/ directory. Returns how many were added.
+        """
+        with self._lock:
+            row = self._conn.execute("SELECT value FROM sync_state WHERE key = 'last_output_id'").fetchone()
+            seen_from = row[0] if row else 0
+        last_id, added = seen_from, 0
+        for output_id, local_file, record in get_output_store().iter_records(after_id=seen_from):
+            last_id = output_id
+            key = local_file or f"output:{output_id}"
+            with self._lock:
+                seen = self._conn.execute("SELECT 1 FROM scanned WHERE local_file = ?", (key,)).fetchone()
+            if not seen:
+                added += self.add_record(record, key)
+        if last_id != seen_from:
+            with self._lock:
+                self._conn.execute("INSERT OR REPLACE INTO sync_state (key, value) VALUES ('last_output_id', ?)", (last_id,))
+                self._conn.commit()
+        if added:
+            logging.info(f"Source fingerprint index: added {added} earlier source(s) from the output store.")
+        return added
+
+    def find_similar(self, source_body: str, threshold: float = SOURCE_DEDUP_THRESHOLD, limit: int = 3) -> list[dict]:
+        """Earlier sources at or above `threshold` estimated similarity, most similar first."""
+        signature = minhash_signature(source_body)
+        keys = _band_keys(signature)
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT local_file, title, url, slug, saved_at, signature FROM sources WHERE local_file IN ("
+                " SELECT DISTINCT local_file FROM bands WHERE " + " OR ".join(["(band = ? AND bucket = ?)"] * _BANDS) + ")",
+                [value for band, key in enumerate(keys) for value in (band, key)]
+            ).fetchall()
+        matches = []
+        for local_file, title, url, slug, saved_at, blob in rows:
+            similarity = estimate_similarity(signature, array("Q", blob).tolist())
+            if similarity >= threshold:
+                matches.append({"similarity": round(similarity, 3), "local_file": local_file, "title": title,
+                                "url": url, "slug": slug, "saved_at": saved_at})
+        matches.sort(key=lambda match: match["similarity"], reverse=True)
+        return matches[:limit]
+
+
+_shared_index: SourceFingerprintIndex | None = None
+_shared_index_lock = threading.Lock()
+
+
+def get_source_index() -> SourceFingerprintIndex:
+    """The process-wide index; the first call also picks up records saved before it existed."""
+    global _shared_index
+    with _shared_index_lock:
+        if _shared_index is None:
+            _shared_index = SourceFingerprintIndex()
+            _shared_index.sync_store()
+        return _shared_index
+
+
+def find_duplicate_sources(source_body: str, threshold: float | None = None, limit: int = 3) -> list[dict]:
+    """
+    Checks a source against every earlier saved source before any LLM call is made. Returns the
+    matches (most similar first, with `local_file` pointing at the earlier package), or [] when
+    dedup is disabled or the index cannot be read.
+    """
+    if not SOURCE_DEDUP_ENABLED or not source_body:
+        return []
+    start = time.perf_counter()
+    try:
+        index = get_source_index()
+        index.sync_store() # Records saved by other processes since the last check
+        matches = index.find_similar(source_body, SOURCE_DEDUP_THRESHOLD if threshold is None else threshold, limit)
+    except Exception as e:
+        logging.warning(f"Near-duplicate source check failed, continuing without it: {e}")
+        return []
+    logging.info(f"Near-duplicate source check found {len(matches)} match(es) in {time.perf_counter() - start:.3f}s.")
+    return matches
+
+
+def load_package_from_record(local_file: str) -> dict | None:
+    """The `final_parsed_package` of an earlier record: an answers/ JSON file or a segment archive reference (None if it cannot be read)."""
+    try:
+        archived = re.fullmatch(r".+\.log#(\d+)", local_file)
+        if archived:
+            return (get_output_store().get(int(archived.group(1))) or {}).get("final_parsed_package")
+        with open(local_file, 'r', encoding='utf-8') as f:
+            return json.load(f).get("final_parsed_package")
+    except Exception as e:
+        logging.error(f"Could not load earlier package from {local_file}: {e}")
+        return None
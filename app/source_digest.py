@@ -0,0 +1,92 @@
+import os
+import math
+import time
+import sqlite3
+import hashlib
+import logging
+import threading
+from .llm_cache import LLM_CACHE_DIR
+
+# Configure logging (can be configured centrally if preferred)
+logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+
+SOURCE_DIGEST_ENABLED = os.getenv("SOURCE_DIGEST_ENABLED", "false").strip().lower() in ("1", "true", "yes", "on")
+# Sources shorter than this are sent as-is; a digest would not save anything
+SOURCE_DIGEST_MIN_CHARS = int(os.getenv("SOURCE_DIGEST_MIN_CHARS", "2000"))
+SOURCE_DIGEST_MAX_WORDS = int(os.getenv("SOURCE_DIGEST_MAX_WORDS", "180"))
+
+
+def source_hash(source_title: str, source_body: str) -> str:
+    return hashlib.sha256(f"{source_title}\n\0\n{source_body}".encode("utf-8")).hexdigest()
+
+
+def estimate_tokens(text: str) -> int:
+    """Rough token count (~4 characters per token for English); good enough for before/after comparisons."""
+    return math.ceil(len(text or "") / 4)
+
+
+# --- Digest Store ---
+class SourceDigestStore:
+    """Digests keyed by source hash, so re-running a source (with any model or prompt settings) reuses its digest."""
+    def __init__(self, directory: str = LLM_CACHE_DIR):
+        self.path = os.path.join(directory, "source_digests.sqlite")
+        self._lock = threading.Lock()
+        os.makedirs(directory, exist_ok=True)
+        self._conn = sqlite3.connect(self.path, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS digests ("
+            " source_hash TEXT PRIMARY KEY, digest TEXT NOT NULL, model TEXT, created_at REAL NOT NULL)"
+        )
+        self._conn.commit()
+
+    def get(self, key: str) -> str | None:
+        with self._lock:
+            row = self._conn.execute("SELECT digest FROM digests WHERE source_hash = ?", (key,)).fetchone()
+        return row[0] if row else None
+
+    def put(self, key: str, digest: str, model: str | None = None) -> None:
+        with self._lock:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO digests (source_hash, digest, model, created_at) VALUES (?, ?, ?, ?)",
+                (key, digest, model, time.time())
+            )
+            self._conn.commit()
+
+
+_shared_store: SourceDigestStore | None = None
+_shared_store_lock = threading.Lock()
+
+
+def get_source_digest_store() -> SourceDigestStore:
+    global _shared_store
+    with _shared_store_lock:
+        if _shared_store is None:
+            _shared_store = SourceDigestStore()
+        return _shared_store
+
+
+def build_digest_report(source_body: str, digest: dict, consumers: int) -> dict:
+    """
+    Compares what the image/video prompt calls sent with the digest against what they would have
+    sent with the full source body. The digest call's own input is counted against the savings.
+    """
+    source_bytes = len(source_body.encode("utf-8"))
+    sent_bytes = len(digest["description"].encode("utf-8"))
+    digest_call_bytes = source_bytes if digest.get("digest_used") and not digest.get("cached") else 0
+    before_bytes = source_bytes * consumers
+    after_bytes = sent_bytes * consumers + digest_call_bytes
+    return {
+        "digest_used": digest.get("digest_used", False),
+        "cached": digest.get("cached", False),
+        "reason": digest.get("reason"),
+        "consumers": consumers,
+        "source_bytes": source_bytes,
+        "digest_bytes": sent_bytes if digest.get("digest_used") else None,
+        "bytes_before": before_bytes,
+        "bytes_after": after_bytes,
+        "bytes_saved": before_bytes - after_bytes,
+        "estimated_tokens_before": estimate_tokens(source_body) * consumers,
+        "estimated_tokens_after": estimate_tokens(digest["description"]) * consumers + (estimate_tokens(source_body) if digest_call_bytes else 0),
+        "digest_call_usage": digest.get("usage"),
+    }
@@ -0,0 +1,153 @@
+import os
+import time
+import asyncio
+import logging
+from .tracing import trace_span, record_span
+
+# Configure logging (can be configured centrally if preferred)
+logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+
+DEFAULT_MAX_IN_FLIGHT = int(os.getenv("LLM_MAX_IN_FLIGHT", "4"))
+
+# --- Stage Definition ---
+class Stage:
+    """
+    One node of a generation DAG.
+
+    `func` is an async callable that receives a dict of results keyed by the names in
+    `requires` and returns the stage result. `enabled=False` turns the stage into a no-op
+    whose result is `skip_result` (dependents still run and can inspect that value).
+    """
+    def __init__(self, name: str, func, requires: tuple[str, ...] | list[str] = (), enabled: bool = True, skip_result=None):
+        self.name = name
+        self.func = func
+        self.requires = tuple(requires)
+        self.enabled = enabled
+        self.skip_result = skip_result
+
+    def __repr__(self):
+        return f"Stage({self.name!r}, requires={self.requires!r}, enabled={self.enabled})"
+
+
+def _validate_stage_graph(stages: list[Stage]) -> None:
+    """Checks for duplicate names, unknown dependencies and cycles before anything is started."""
+    names = [stage.name for stage in stages]
+    duplicates = {name for name in names if names.count(name) > 1}
+    if duplicates:
+        raise ValueError(f"Duplicate stage names in graph: {sorted(duplicates)}")
+
+    known = set(names)
+    for stage in stages:
+        unknown = [dep for dep in stage.requires if dep not in known]
+        if unknown:
+            raise ValueError(f"Stage '{stage.name}' requires unknown stage(s): {unknown}")
+
+    # Kahn's algorithm: if we cannot drain every node the graph has a cycle
+    remaining = {stage.name: set(stage.requires) for stage in stages}
+    while remaining:
+        ready = [name for name, deps in remaining.items() if not deps]
+        if not ready:
+            raise ValueError(f"Stage graph contains a cycle between: {sorted(remaining)}")
+        for name in ready:
+            del remaining[name]
+        for deps in remaining.values():
+            deps.difference_update(ready)
+
+
+# --- Scheduler ---
+async def run_stage_graph(stages: list[Stage], max_in_flight: int | None = None, on_event=None) -> dict:
+    """
+    Runs every stage as soon as all of its requirements have produced a result.
+
+    At most `max_in_flight` stage functions execute concurrently (disabled stages never take
+    a slot). If a stage raises, all in-flight stages are cancelled and the exception propagates,
+    so callers keep the fail-fast behaviour of sequential code.
+
+    `on_event`, if given, is called synchronously with a dict
+    `{"stage", "event", "elapsed"}` where event is one of "pending" (every stage, once, before
+    anything runs), "started", "finished", "skipped" or "failed".
+
+    Returns a dict mapping stage name -> result.
+    """
+    _validate_stage_graph(stages)
+    limit = max_in_flight if max_in_flight and max_in_flight > 0 else DEFAULT_MAX_IN_FLIGHT
+    semaphore = asyncio.Semaphore(limit)
+    by_name = {stage.name: stage for stage in stages}
+    results: dict = {}
+    pending = dict(by_name)
+    running: dict[asyncio.Task, str] = {}
+    in_flight = 0
+    graph_start = time.perf_counter()
+
+    def emit(stage_name: str, event: str, stage_start: float | None = None):
+        if on_event is None:
+            return
+        elapsed = time.perf_counter() - (stage_start if stage_start is not None else graph_start)
+        try:
+            on_event({"stage": stage_name, "event": event, "elapsed": elapsed})
+        except Exception as cb_err:
+            logging.warning(f"Stage event callback failed for '{stage_name}' ({event}): {cb_err}")
+
+    async def run_one(stage: Stage):
+        nonlocal in_flight
+        inputs = {dep: results[dep] for dep in stage.requires}
+        ready_at = time.perf_counter()
+        async with semaphore:
+            in_flight += 1
+            stage_start = time.perf_counter()
+            emit(stage.name, "started")
+            logging.info(f"Stage '{stage.name}' started ({in_flight} in flight, limit {limit}).")
+            try:
+                with trace_span(stage.name, kind="stage", queued_for=round(stage_start - ready_at, 6), requires=list(stage.requires)):
+                    result = await stage.func(inputs)
+            except asyncio.CancelledError:
+                raise
+            except Exception:
+                emit(stage.name, "failed", stage_start)
+                raise
+            finally:
+                in_flight -= 1
+            logging.info(f"Stage '{stage.name}' finished in {time.perf_counter() - stage_start:.2f}s.")
+            emit(stage.name, "finished", stage_start)
+            return result
+
+    def schedule_ready():
+        # Disabled stages resolve instantly, which can unblock further stages, so loop until stable
+        progressed = True
+        while progressed:
+            progressed = False
+            for name, stage in list(pending.items()):
+                if not all(dep in results for dep in stage.requires):
+                    continue
+                del pending[name]
+                if not stage.enabled:
+                    results[name] = stage.skip_result
+                    emit(name, "skipped")
+                    record_span(name, kind="stage", outcome="skipped")
+                    progressed = True
+                else:
+                    running[asyncio.create_task(run_one(stage), name=f"stage:{name}")] = name
+
+    for stage in stages:
+        emit(stage.name, "pending")
+
+    try:
+        schedule_ready()
+        while running:
+            done, _ = await asyncio.wait(running.keys(), return_when=asyncio.FIRST_COMPLETED)
+            for task in done:
+                name = running.pop(task)
+                results[name] = task.result() # Re-raises the stage's exception (fail fast)
+            schedule_ready()
+    finally:
+        for task in running:
+            task.cancel()
+        if running:
+            await asyncio.gather(*running.keys(), return_exceptions=True)
+
+    if pending:
+        # Only reachable if validation missed something; keep it loud rather than silently dropping stages
+        raise RuntimeError(f"Stages never became ready: {sorted(pending)}")
+
+    logging.info(f"Stage graph completed {len(results)} stage(s) in {time.perf_counter() - graph_start:.2f}s.")
+    return results
@@ -0,0 +1,403 @@
+import os
+import sys
+import json
+import time
+import random
+import hashlib
+import asyncio
+import re
+import logging
+import argparse
+from aiohttp import web
+from .llm_cassette import LatencyModel
+from .rate_limiter import parse_rate_limits
+
+# Configure logging (can be configured centrally if preferred)
+logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+
+STAND_IN_HOST = os.getenv("STAND_IN_HOST", "127.0.0.1")
+STAND_IN_PORT = int(os.getenv("STAND_IN_PORT", "8787"))
+# Per service (wordpress, rank_math, pantry, llm); same syntax as LLM_CASSETTE_LATENCY, e.g. "pantry=uniform:0.2,0.6;*=fixed:0.1"
+STAND_IN_LATENCY = os.getenv("STAND_IN_LATENCY", "none")
+STAND_IN_ERROR_RATES = os.getenv("STAND_IN_ERROR_RATES", "")    # Share of requests failed, e.g. "pantry=0.05,*=0.01"
+STAND_IN_ERROR_STATUS = int(os.getenv("STAND_IN_ERROR_STATUS", "503"))
+STAND_IN_RATE_LIMITS = os.getenv("STAND_IN_RATE_LIMITS", "")    # Requests per minute before 429s, e.g. "pantry=120,*=600"
+STAND_IN_SEED = os.getenv("STAND_IN_SEED", "0")
+STAND_IN_LLM_CONTENT_CHARS = int(os.getenv("STAND_IN_LLM_CONTENT_CHARS", "6000"))  # Size of a synthetic blog `content` field
+
+
+def parse_error_rates(spec: str | None) -> dict[str, float]:
+    """Parses 'service=share' pairs (comma-separated, shares 0-1) into {service: share}."""
+    rates = {}
+    for entry in (spec or "").split(","):
+        entry = entry.strip()
+        if not entry:
+            continue
+        service, sep, share = entry.rpartition("=")
+        if not sep or not service.strip() or not 0 <= float(share) <= 1:
+            raise ValueError(f"Invalid error rate '{entry}'; expected SERVICE=SHARE with SHARE between 0 and 1")
+        rates[service.strip()] = float(share)
+    return rates
+
+
+class _Bucket:
+    """Non-blocking token bucket: a request over the limit is refused (429) instead of waiting."""
+    def __init__(self, requests_per_minute: float):
+        self.rate = requests_per_minute / 60.0
+        self.capacity = max(1.0, self.rate)
+        self._tokens = self.capacity
+        self._updated = time.monotonic()
+
+    def take(self) -> float | None:
+        """Takes a token; returns None on success, else the seconds until one is available."""
+        now = time.monotonic()
+        self._tokens = min(self.capacity, self._tokens + (now - self._updated) * self.rate)
+        self._updated = now
+        if self._tokens >= 1:
+            self._tokens -= 1
+            return None
+        return (1 - self._tokens) / self.rate
+
+
+# --- Synthetic LLM Responses ---
+# JSON fields the app's prompts ask for, by kind of synthetic value. A prompt that names any of
+# them (as `"key"` or `key`) is answered with a JSON object holding those fields; others get text.
+_SYNTHETIC_FIELDS = {
+    "primary_focus_keyword": "phrase", "secondary_focus_keyword": "phrase", "additional_focus_keywords": "list",
+    "title": "phrase", "seo_title": "phrase", "slug": "slug", "meta_description": "sentence", "alt_text": "sentence",
+    "tags": "list", "content": "content",
+    "derived_blog_topic": "phrase", "derived_key_takeaways": "list", "derived_core_emotion": "phrase", "derived_cta_word": "phrase",
+    "instagram_post_title": "phrase", "instagram_post_caption": "paragraph",
+    "story_main_title": "phrase", "story_subtitle": "phrase", "story_body_text": "paragraph",
+    "image_prompt": "prompt", "realistic_image_prompt": "prompt",
+    "instagram_static_image_prompt": "prompt", "instagram_video_ready_image_prompt": "prompt",
+}
+_FIELD_MENTION = re.compile(r"[`\"](" + "|".join(sorted(_SYNTHETIC_FIELDS, key=len, reverse=True)) + r")[`\"]")
+_PERSIAN_WORDS = "هوش مصنوعی مدل زبانی داده پژوهش فناوری شرکت کاربران امنیت آینده توسعه ابزار رسانه تولید محتوا".split()
+_PROMPT_WORDS = "cinematic wide shot of a futuristic research lab soft light detailed 8k photorealistic neon city".split()
+
+
+def synthetic_completion(prompt: str, content_chars: int = STAND_IN_LLM_CONTENT_CHARS) -> str:
+    """A plausible response for `prompt`, deterministic per prompt (so reruns and cassettes line up)."""
+    rng = random.Random(hashlib.sha256(prompt.encode("utf-8")).digest())
+
+    def words(vocabulary, count):
+        return " ".join(rng.choice(vocabulary) for _ in range(count))
+
+    fields = dict.fromkeys(_FIELD_MENTION.findall(prompt))
+    if not fields:
+        return words(_PROMPT_WORDS, 60)
+    makers = {
+        "phrase": lambda: words(_PERSIAN_WORDS, 4),
+        "sentence": lambda: words(_PERSIAN_WORDS, 20),
+        "paragraph": lambda: words(_PERSIAN_WORDS, 60),
+        "list": lambda: [words(_PERSIAN_WORDS, 2) for _ in range(3)],
+        "slug": lambda: f"stand-in-{rng.getrandbits(32):08x}",
+        "prompt": lambda: words(_PROMPT_WORDS, 60),
+        "content": lambda: "\n\n".join(f"## {words(_PERSIAN_WORDS, 3)}\n\n{words(_PERSIAN_WORDS, 80)}"
+                                       for _ in range(max(1, content_chars // 800))),
+    }
+    return "```json\n" + json.dumps({name: makers[_SYNTHETIC_FIELDS[name]]() for name in fields}, ensure_ascii=False, indent=2) + "\n```"
+
+
+# --- Emulated State ---
+class StandInState:
+    """In-memory WordPress posts, tags and media, and Pantry accounts, plus request counters."""
+    def __init__(self):
+        self.posts: dict[int, dict] = {}
+        self.tags: dict[int, dict] = {46: {"id": 46, "name": "اخبار هوش مصنوعی", "slug": "ai-news"}}
+        self.media: dict[int, dict] = {}
+        self.pantries: dict[str, dict[str, dict]] = {}
+        self._next_id = 1000
+        self.requests: dict[str, dict[str, int]] = {}
+
+    def next_id(self) -> int:
+        self._next_id += 1
+        return self._next_id
+
+    def count(self, route: str, status: int) -> None:
+        by_status = self.requests.setdefault(route, {})
+        by_status[str(status)] = by_status.get(str(status), 0) + 1
+
+    def snapshot(self) -> dict:
+        return {
+            "posts": len(self.posts),
+            "tags": len(self.tags),
+            "media": len(self.media),
+            "pantry_baskets": {pantry_id: len(baskets) for pantry_id, baskets in self.pantries.items()},
+            "requests": self.requests,
+        }
+
+
+# --- Server ---
+class StandInServer:
+    """
+    Local stand-in for the parts of WordPress REST (posts, tags, media), the Rank Math
+    `update-meta` endpoint and Pantry that this app calls, plus an OpenAI-compatible chat endpoint
+    answering with synthetic packages. Each service can be given synthetic latency, a random error
+    share and a rate limit, so generation, publishing and persistence can be load-tested offline.
+    Point WP_URL at the server, PANTRY_BASE_URL at `<server>/apiv1/pantry` and AVALAI_BASE_URL at `<server>/v1`.
+    """
+    def __init__(self, latency: str = STAND_IN_LATENCY, error_rates: str = STAND_IN_ERROR_RATES,
+                 error_status: int = STAND_IN_ERROR_STATUS, rate_limits: str = STAND_IN_RATE_LIMITS, seed: str | None = STAND_IN_SEED,
+                 llm_content_chars: int = STAND_IN_LLM_CONTENT_CHARS):
+        self.latency = LatencyModel(latency, 1.0, seed)
+        self.error_rates = parse_error_rates(error_rates)
+        self.error_status = error_status
+        self.llm_content_chars = llm_content_chars
+        self._buckets = {service: _Bucket(rpm) for service, rpm in parse_rate_limits(rate_limits).items()}
+        self._random = random.Random(int(seed) if seed not in (None, "") else None)
+        self.state = StandInState()
+        self._services: dict = {}
+        self._runner: web.AppRunner | None = None
+
+    def _setting(self, table: dict, service: str):
+        return table.get(service, table.get("*"))
+
+    @web.middleware
+    async def _faults(self, request: web.Request, handler):
+        """Applies the service's latency, rate limit and error share before the handler, and counts the outcome."""
+        service = self._services.get(request.match_info.handler)
+        if service is None: # Control endpoints and unknown paths
+            return await handler(request)
+        resource = request.match_info.route.resource
+        route_key = f"{request.method} {resource.canonical if resource is not None else request.path}"
+        bucket = self._setting(self._buckets, service)
+        retry_after = bucket.take() if bucket is not None else None
+        delay = self.latency.sample(service, None)
+        if delay:
+            await asyncio.sleep(delay)
+        if retry_after is not None:
+            response = web.json_response({"code": "rate_limited", "message": "Too many requests"}, status=429,
+                                         headers={"Retry-After": str(max(1, round(retry_after)))})
+        elif self._random.random() < (self._setting(self.error_rates, service) or 0.0):
+            response = web.json_response({"code": "injected_error", "message": "Injected failure"}, status=self.error_status)
+        else:
+            try:
+                response = await handler(request)
+            except web.HTTPException as e:
+                self.state.count(route_key, e.status)
+                raise
+        self.state.count(route_key, response.status)
+        return response
+
+    @staticmethod
+    def _require_basic_auth(request: web.Request) -> None:
+        if not request.headers.get("Authorization", "").startswith("Basic "):
+            raise web.HTTPUnauthorized(text=json.dumps({"code": "rest_not_logged_in", "message": "You are not currently logged in."}),
+                                       content_type="application/json")
+
+    # --- WordPress ---
+    async def create_post(self, request: web.Request) -> web.Response:
+        self._require_basic_auth(request)
+        data = await request.json()
+        post_id = self.state.next_id()
+        post = {"id": post_id, "status": data.get("status", "draft"), "slug": data.get("slug") or str(post_id),
+                "title": {"raw": data.get("title", "")}, "content": {"raw": data.get("content", "")},
+                "categories": data.get("categories", []), "tags": data.get("tags", []), "featured_media": 0, "meta": {},
+                "link": f"{request.url.origin()}/?p={post_id}"}
+        self.state.posts[post_id] = post
+        return web.json_response(post, status=201)
+
+    async def update_post(self, request: web.Request) -> web.Response:
+        self._require_basic_auth(request)
+        post = self.state.posts.get(int(request.match_info["post_id"]))
+        if post is None:
+            return web.json_response({"code": "rest_post_invalid_id", "message": "Invalid post ID."}, status=404)
+        post.update({key: value for key, value in (await request.json()).items() if key in ("featured_media", "status", "slug", "tags", "categories")})
+        return web.json_response(post)
+
+    async def get_post(self, request: web.Request) -> web.Response:
+        post = self.state.posts.get(int(request.match_info["post_id"]))
+        if post is None:
+            return web.json_response({"code": "rest_post_invalid_id", "message": "Invalid post ID."}, status=404)
+        return web.json_response(post)
+
+    async def search_tags(self, request: web.Request) -> web.Response:
+        search = request.query.get("search", "").lower()
+        per_page = int(request.query.get("per_page", "10"))
+        matches = [tag for tag in self.state.tags.values() if search in tag["name"].lower()]
+        return web.json_response(matches[:per_page])
+
+    async def create_tag(self, request: web.Request) -> web.Response:
+        self._require_basic_auth(request)
+        name = (await request.json()).get("name", "").strip()
+        if not name:
+            return web.json_response({"code": "rest_missing_callback_param", "message": "Missing parameter(s): name"}, status=400)
+        existing = next((tag for tag in self.state.tags.values() if tag["name"] == name), None)
+        if existing is not None:
+            return web.json_response({"code": "term_exists", "message": "A term with the name provided already exists.",
+                                      "data": {"status": 400, "term_id": existing["id"]}}, status=400)
+        tag_id = self.state.next_id()
+        self.state.tags[tag_id] = {"id": tag_id, "name": name, "slug": name.lower().replace(" ", "-")}
+        return web.json_response(self.state.tags[tag_id], status=201)
+
+    async def upload_media(self, request: web.Request) -> web.Response:
+        self._require_basic_auth(request)
+        body = await request.read()
+        if not body:
+            return web.json_response({"code": "rest_upload_no_data", "message": "No data supplied."}, status=400)
+        disposition = request.headers.get("Content-Disposition", "")
+        filename = disposition.split("filename=")[-1].strip('"') if "filename=" in disposition else "upload"
+        media_id = self.state.next_id()
+        self.state.media[media_id] = {"id": media_id, "source_url": f"{request.url.origin()}/wp-content/uploads/{filename}",
+                                      "mime_type": request.content_type, "bytes": len(body), "alt_text": ""}
+        return web.json_response(self.state.media[media_id], status=201)
+
+    async def update_media(self, request: web.Request) -> web.Response:
+        self._require_basic_auth(request)
+        media = self.state.media.get(int(request.match_info["media_id"]))
+        if media is None:
+            return web.json_response({"code": "rest_post_invalid_id", "message": "Invalid post ID."}, status=404)
+        media["alt_text"] = (await request.json()).get("alt_text", media["alt_text"])
+        return web.json_response(media)
+
+    # --- Rank Math ---
+    async def update_rank_math(self, request: web.Request) -> web.Response:
+        self._require_basic_auth(request)
+        data = await request.json()
+        post = self.state.posts.get(data.get("post_id"))
+        if post is None:
+            return web.json_response({"code": "invalid_post", "message": "Invalid post ID."}, status=404)
+        fields = {key: value for key, value in data.items() if key.startswith("rank_math_")}
+        post["meta"].update(fields)
+        return web.json_response({"success": True, "updated": sorted(fields)})
+
+    # --- Pantry ---
+    async def pantry_details(self, request: web.Request) -> web.Response:
+        pantry_id = request.match_info["pantry_id"]
+        baskets = self.state.pantries.get(pantry_id, {})
+        return web.json_response({"name": "stand-in", "description": "Local Pantry stand-in", "errors": [], "notifications": True,
+                                  "percentFull": 0, "baskets": [{"name": name, "ttl": 2592000} for name in baskets]})
+
+    async def get_basket(self, request: web.Request) -> web.Response:
+        pantry_id, name = request.match_info["pantry_id"], request.match_info["basket"]
+        content = self.state.pantries.get(pantry_id, {}).get(name)
+        if content is None:
+            return web.Response(text=f"Could not get basket: {name} does not exist", status=400)
+        return web.json_response(content)
+
+    async def save_basket(self, request: web.Request) -> web.Response:
+        pantry_id, name = request.match_info["pantry_id"], request.match_info["basket"]
+        try:
+            content = await request.json()
+        except json.JSONDecodeError:
+            return web.Response(text="Invalid JSON body", status=400)
+        self.state.pantries.setdefault(pantry_id, {})[name] = content
+        return web.Response(text=f"Your Pantry was updated with basket: {name}!")
+
+    # --- LLM (OpenAI-compatible chat completions) ---
+    async def chat_completions(self, request: web.Request) -> web.StreamResponse:
+        data = await request.json()
+        prompt = "\n".join(message.get("content") if isinstance(message.get("content"), str) else json.dumps(message.get("content"))
+                           for message in data.get("messages", []))
+        content = synthetic_completion(prompt, self.llm_content_chars)
+        model = data.get("model", "stand-in")
+        created = int(time.time())
+        completion_id = f"chatcmpl-{hashlib.sha1(f'{prompt}{time.time_ns()}'.encode()).hexdigest()[:24]}"
+        usage = {"prompt_tokens": len(prompt) // 4, "completion_tokens": len(content) // 4}
+        usage["total_tokens"] = usage["prompt_tokens"] + usage["completion_tokens"]
+        if not data.get("stream"):
+            return web.json_response({
+                "id": completion_id, "object": "chat.completion", "created": created, "model": model,
+                "choices": [{"index": 0, "message": {"role": "assistant", "content": content}, "finish_reason": "stop"}],
+                "usage": usage,
+            })
+
+        response = web.StreamResponse(headers={"Content-Type": "text/event-stream", "Cache-Control": "no-cache"})
+        await response.prepare(request)
+
+        async def send(choices, **extra):
+            chunk = {"id": completion_id, "object": "chat.completion.chunk", "created": created, "model": model, "choices": choices, **extra}
+            await response.write(f"data: {json.dumps(chunk, ensure_ascii=False)}\n\n".encode("utf-8"))
+
+        step = max(1, len(content) // 40)
+        for start in range(0, len(content), step):
+            await send([{"index": 0, "delta": {"content": content[start:start + step]}, "finish_reason": None}])
+        await send([{"index": 0, "delta": {}, "finish_reason": "stop"}])
+        if (data.get("stream_options") or {}).get("include_usage"):
+            await send([], usage=usage)
+        await response.write(b"data: [DONE]\n\n")
+        await response.write_eof()
+        return response
+
+    # --- Control ---
+    async def stats(self, request: web.Request) -> web.Response:
+        return web.json_response(self.state.snapshot())
+
+    async def reset(self, request: web.Request) -> web.Response:
+        self.state = StandInState()
+        return web.json_response({"reset": True})
+
+    def build_app(self) -> web.Application:
+        app = web.Application(middlewares=[self._faults], client_max_size=64 * 1024 * 1024)
+        wp = "/wp-json/wp/v2"
+        routes = [
+            ("POST", f"{wp}/posts", self.create_post, "wordpress"),
+            ("POST", f"{wp}/posts/{{post_id:\\d+}}", self.update_post, "wordpress"),
+            ("GET", f"{wp}/posts/{{post_id:\\d+}}", self.get_post, "wordpress"),
+            ("GET", f"{wp}/tags", self.search_tags, "wordpress"),
+            ("POST", f"{wp}/tags", self.create_tag, "wordpress"),
+            ("POST", f"{wp}/media", self.upload_media, "wordpress"),
+            ("POST", f"{wp}/media/{{media_id:\\d+}}", self.update_media, "wordpress"),
+            ("POST", "/wp-json/rank-math-api/v1/update-meta", self.update_rank_math, "rank_math"),
+            ("GET", "/apiv1/pantry/{pantry_id}", self.pantry_details, "pantry"),
+            ("GET", "/apiv1/pantry/{pantry_id}/basket/{basket}", self.get_basket, "pantry"),
+            ("POST", "/apiv1/pantry/{pantry_id}/basket/{basket}", self.save_basket, "pantry"),
+            ("POST", "/v1/chat/completions", self.chat_completions, "llm"),
+        ]
+        # Faults are applied per service; the control endpoints below are never delayed or failed
+        self._services = {handler: service for _, _, handler, service in routes}
+        for method, path, handler, _ in routes:
+            app.router.add_route(method, path, handler)
+        app.router.add_get("/_stand_in/stats", self.stats)
+        app.router.add_post("/_stand_in/reset", self.reset)
+        return app
+
+    async def start(self, host: str = STAND_IN_HOST, port: int = STAND_IN_PORT) -> str:
+        """Serves on the current loop (port 0 picks a free port); returns the base URL."""
+        self._runner = web.AppRunner(self.build_app(), access_log=None)
+        await self._runner.setup()
+        site = web.TCPSite(self._runner, host, port)
+        await site.start()
+        bound_port = site._server.sockets[0].getsockname()[1]
+        base_url = f"http://{host}:{bound_port}"
+        logging.info(f"Stand-in server listening on {base_url} (WP_URL={base_url}, PANTRY_BASE_URL={base_url}/apiv1/pantry, AVALAI_BASE_URL={base_url}/v1).")
+        return base_url
+
+    async def stop(self) -> None:
+        if self._runner is not None:
+            await self._runner.cleanup()
+            self._runner = None
+
+
+def main(argv: list[str] | None = None) -> int:
+    parser = argparse.ArgumentParser(description="Run local stand-ins for WordPress REST, Rank Math, Pantry and the LLM API.")
+    parser.add_argument("--host", default=STAND_IN_HOST)
+    parser.add_argument("--port", type=int, default=STAND_IN_PORT)
+    parser.add_argument("--latency", default=STAND_IN_LATENCY, help="Per-service latency, e.g. 'pantry=uniform:0.2,0.6;*=fixed:0.1'")
+    parser.add_argument("--error-rates", default=STAND_IN_ERROR_RATES, help="Per-service failure share, e.g. 'pantry=0.05,*=0.01'")
+    parser.add_argument("--error-status", type=int, default=STAND_IN_ERROR_STATUS, help="HTTP status of injected failures")
+    parser.add_argument("--rate-limits", default=STAND_IN_RATE_LIMITS, help="Per-service requests per minute, e.g. 'pantry=120,*=600'")
+    parser.add_argument("--llm-content-chars", type=int, default=STAND_IN_LLM_CONTENT_CHARS, help="Size of a synthetic blog body")
+    parser.add_argument("--seed", default=STAND_IN_SEED, help="Seed for latency and failure draws (empty for a new draw each run)")
+    args = parser.parse_args(argv)
+
+    server = StandInServer(args.latency, args.error_rates, args.error_status, args.rate_limits, args.seed, args.llm_content_chars)
+
+    async def serve():
+        await server.start(args.host, args.port)
+        try:
+            await asyncio.Event().wait()
+        finally:
+            await server.stop()
+
+    try:
+        asyncio.run(serve())
+    except KeyboardInterrupt:
+        pass
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,267 @@
+import re
+import json
+import logging
+
+# Configure logging (can be configured centrally if preferred)
+logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+
+# Characters inside a string that need attention; everything else is copied in bulk
+_STRING_SPECIAL = re.compile(r'[\\"\x00-\x1f]')
+_BARE_TOKEN = re.compile(r'[^\s,:\[\]{}"]+')
+_NUMBER = re.compile(r'-?(?:0|[1-9]\d*)(?:\.\d+)?(?:[eE][+-]?\d+)?')
+_HEX4 = re.compile(r'[0-9a-fA-F]{4}')
+_CONTROL_ESCAPES = {"\n": "\\n", "\r": "\\r", "\t": "\\t", "\b": "\\b", "\f": "\\f"}
+_PYTHON_LITERALS = {"True": "true", "False": "false", "None": "null"}
+
+# What may legitimately follow a closing quote, by the role of the string
+_CLOSERS = {"key": ":", "obj_value": ",}", "arr_value": ",]"}
+# What may start the next element after a comma, by the role of the string before it
+_AFTER_COMMA = {"obj_value": '"}', "arr_value": '"{[]-0123456789tfn'}
+
+
+def _skip_whitespace(text: str, index: int) -> tuple[int, bool]:
+    """Returns the index of the next non-whitespace character and whether a newline was skipped."""
+    n = len(text)
+    saw_newline = False
+    while index < n and text[index] in " \t\r\n":
+        saw_newline = saw_newline or text[index] == "\n"
+        index += 1
+    return index, saw_newline
+
+
+def _quote_closes_string(text: str, quote_index: int, role: str) -> bool:
+    """
+    Decides whether the quote at `quote_index` ends the current string or is an unescaped
+    quote inside it, by checking that what follows is valid JSON structure for this string's role.
+    A comma only counts if the element after it also looks like JSON, so prose such as
+    `"he said "hi", then left"` stays inside the string.
+    """
+    look, saw_newline = _skip_whitespace(text, quote_index + 1)
+    if look >= len(text):
+        return True
+    following = text[look]
+    if following not in _CLOSERS[role]:
+        # Two values separated only by a line break: a missing comma, not an inner quote
+        return role != "key" and following == '"' and saw_newline
+    if following != ",":
+        return True
+    after_comma, _ = _skip_whitespace(text, look + 1)
+    return after_comma >= len(text) or text[after_comma] in _AFTER_COMMA[role]
+
+
+def repair_json(text: str) -> str:
+    """
+    Rewrites typical LLM JSON output into strict JSON in a single left-to-right pass.
+
+    Handles: prose or ``` fences around the value, literal newlines/control characters inside
+    strings, unescaped quotes inside strings (a quote only closes a string when what follows
+    could legally follow it), invalid backslash escapes, trailing and missing commas, Python
+    literals, and truncated output (open strings, dangling keys and open containers are closed).
+
+    Every input character is visited once; the lookahead after a quote only skips whitespace
+    and at most one comma, so each character is examined a bounded number of times and the
+    cost is linear in len(text).
+    """
+    start = -1
+    for index, ch in enumerate(text):
+        if ch == "{" or ch == "[":
+            start = index
+            break
+    if start < 0:
+        raise json.JSONDecodeError("No JSON object or array found", text, 0)
+
+    n = len(text)
+    out: list[str] = []
+    stack: list[str] = []          # '{' or '['
+    states: list[str] = []         # object: key/colon/value/comma, array: value/comma
+    member_starts: list[int] = []  # output index where the current object member began
+    i = start
+
+    def begin_value() -> None:
+        # Repairs what precedes a value: a missing ':' after a key or a missing ',' in an array
+        if not stack:
+            return
+        state = states[-1]
+        if stack[-1] == "{" and state == "colon":
+            out.append(":")
+        elif stack[-1] == "[" and state == "comma":
+            out.append(",")
+
+    def value_done() -> None:
+        if stack:
+            states[-1] = "comma"
+
+    def close_top() -> None:
+        frame, state = stack[-1], states[-1]
+        if frame == "{":
+            if state == "colon":
+                del out[member_starts[-1]:] # Dangling key without a value
+            elif state == "value":
+                out.append("null")          # Dangling ':'
+        if out and out[-1] == ",":
+            out.pop()                       # Trailing comma
+        out.append("}" if frame == "{" else "]")
+        stack.pop()
+        states.pop()
+        member_starts.pop()
+        value_done()
+
+    while i < n:
+        ch = text[i]
+
+        if ch in " \t\r\n":
+            i += 1
+            continue
+
+        if ch == '"':
+            if stack and stack[-1] == "{":
+                state = states[-1]
+                if state == "comma":
+                    out.append(",")         # Missing comma between members
+                    state = "key"
+                if state == "key":
+                    role = "key"
+                    member_starts[-1] = len(out)
+                else:
+                    role = "obj_value"
+                    if state == "colon":
+                        out.append(":")
+            else:
+                role = "arr_value"
+                begin_value()
+
+            out.append('"')
+            j = i + 1
+            closed = False
+            while j < n:
+                match = _STRING_SPECIAL.search(text, j)
+                if match is None:
+                    out.append(text[j:])
+                    j = n
+                    break
+                k = match.start()
+                if k > j:
+                    out.append(text[j:k])
+                c = text[k]
+                if c == "\\":
+                    nxt = text[k + 1] if k + 1 < n else ""
+                    if nxt and nxt in '"\\/bfnrt':
+                        out.append(text[k:k + 2])
+                        j = k + 2
+                    elif nxt == "u" and _HEX4.match(text, k + 2):
+                        out.append(text[k:k + 6])
+                        j = k + 6
+                    else:
+                        out.append("\\\\")    # Lone or invalid escape: keep the backslash literally
+                        j = k + 1
+                elif c == '"':
+                    if _quote_closes_string(text, k, role):
+                        out.append('"')
+                        j = k + 1
+                        closed = True
+                        break
+                    out.append('\\"')         # Unescaped quote inside the value
+                    j = k + 1
+                else:
+                    out.append(_CONTROL_ESCAPES.get(c) or f"\\u{ord(c):04x}")
+                    j = k + 1
+            if not closed:
+                out.append('"')               # Truncated inside a string
+            i = j
+            if role == "key":
+                states[-1] = "colon"
+            else:
+                value_done()
+            continue
+
+        if ch == "{" or ch == "[":
+            begin_value()
+            stack.append(ch)
+            states.append("key" if ch == "{" else "value")
+            member_starts.append(len(out) + 1)
+            out.append(ch)
+            i += 1
+            continue
+
+        if ch == "}" or ch == "]":
+            close_top() # Mismatched closers close whatever is actually open
+            i += 1
+            if not stack:
+                break
+            continue
+
+        if ch == ":":
+            if stack[-1] == "{" and states[-1] == "colon":
+                out.append(":")
+                states[-1] = "value"
+            i += 1
+            continue
+
+        if ch == ",":
+            if states[-1] == "comma":
+                out.append(",")
+                states[-1] = "key" if stack[-1] == "{" else "value"
+            i += 1
+            continue
+
+        # Bare token: number, literal, or something unquoted
+        match = _BARE_TOKEN.match(text, i)
+        token = match.group()
+        i = match.end()
+        if stack[-1] == "{" and states[-1] in ("key", "comma"):
+            # Unquoted key
+            if states[-1] == "comma":
+                out.append(",")
+            member_starts[-1] = len(out)
+            out.append(json.dumps(token, ensure_ascii=False))
+            states[-1] = "colon"
+            continue
+        begin_value()
+        if token in ("true", "false", "null") or _NUMBER.fullmatch(token):
+            out.append(token)
+        elif token in _PYTHON_LITERALS:
+            out.append(_PYTHON_LITERALS[token])
+        elif i >= n:
+            out.append("null")                # Truncated literal such as 'tru' or '12e'
+        else:
+            out.append(json.dumps(token, ensure_ascii=False))
+        value_done()
+
+    while stack:
+        close_top()
+
+    return "".join(out)
+
+
+def strip_code_fences(text: str) -> str:
+    """Removes a surrounding ```json ... ``` (or bare ```) fence, if present."""
+    stripped = text.strip()
+    if stripped.startswith("```"):
+        newline = stripped.find("\n")
+        stripped = stripped[newline + 1:] if newline >= 0 else stripped[3:]
+        if stripped.rstrip().endswith("```"):
+            stripped = stripped.rstrip()[:-3]
+    return stripped.strip()
+
+
+def loads_tolerant(text: str):
+    """
+    Decodes LLM JSON output. Well-formed input goes straight through `json.loads`;
+    anything else is passed once through `repair_json` and decoded again.
+
+    Raises json.JSONDecodeError if no JSON value can be recovered.
+    """
+    if not isinstance(text, str):
+        raise TypeError(f"Expected str, got {type(text)}")
+    candidate = strip_code_fences(text)
+    try:
+        return json.loads(candidate, strict=False)
+    except json.JSONDecodeError as first_err:
+        repaired = repair_json(candidate)
+        try:
+            value = json.loads(repaired)
+        except json.JSONDecodeError:
+            logging.warning(f"Tolerant JSON repair failed; original error: {first_err}")
+            raise
+        logging.info(f"Recovered malformed JSON ({first_err.msg} at char {first_err.pos}) with a single repair pass.")
+        return value
@@ -0,0 +1,313 @@
+import os
+import json
+import time
+import uuid
+import queue
+import atexit
+import asyncio
+import logging
+import functools
+import threading
+import contextvars
+from contextlib import contextmanager
+
+# Configure logging (can be configured centrally if preferred)
+logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+
+TRACING_ENABLED = os.getenv("TRACING_ENABLED", "true").strip().lower() in ("1", "true", "yes", "on")
+# Every finished span is appended here as one JSON line (tagged with its trace id)
+TRACE_FILE = os.getenv("TRACE_FILE", os.path.join("answers", "traces.jsonl"))
+
+_current_trace = contextvars.ContextVar("current_trace", default=None)
+_current_span_id = contextvars.ContextVar("current_span_id", default=None)
+_trace_file_lock = threading.Lock()
+
+
+# --- Spans ---
+class Span:
+    """One timed step: a pipeline stage, an LLM call, an HTTP request or a file write."""
+    def __init__(self, name: str, kind: str, parent_id: str | None = None, attributes: dict | None = None):
+        self.span_id = uuid.uuid4().hex[:16]
+        self.parent_id = parent_id
+        self.name = name
+        self.kind = kind
+        self.start = time.time()
+        self.duration = None
+        self.outcome = None
+        self.error = None
+        self.model = None
+        self.input_tokens = None
+        self.output_tokens = None
+        self.attributes = {}
+        self.set(**(attributes or {}))
+        self._start_perf = time.perf_counter()
+
+    def set(self, **attributes) -> None:
+        """Adds attributes (e.g. status code, cache_hit); `model` is promoted to its own field."""
+        if "model" in attributes:
+            self.model = attributes.pop("model")
+        self.attributes.update(attributes)
+
+    def fail(self, reason: str) -> None:
+        """Marks the span as failed without an exception (e.g. an HTTP error status that is handled)."""
+        self.outcome = "error"
+        self.error = reason
+
+    def record_usage(self, usage: dict | None) -> None:
+        """Takes token counts from a LangChain `usage_metadata` dict."""
+        if not usage:
+            return
+        self.input_tokens = (self.input_tokens or 0) + (usage.get("input_tokens") or 0)
+        self.output_tokens = (self.output_tokens or 0) + (usage.get("output_tokens") or 0)
+
+    def finish(self, outcome: str, error: BaseException | str | None = None) -> None:
+        self.duration = time.perf_counter() - self._start_perf
+        self.outcome = outcome
+        if error is not None:
+            self.error = str(error) if not isinstance(error, BaseException) else f"{type(error).__name__}: {error}"
+
+    def to_dict(self) -> dict:
+        return {
+            "span_id": self.span_id,
+            "parent_id": self.parent_id,
+            "name": self.name,
+            "kind": self.kind,
+            "start": self.start,
+            "duration": round(self.duration, 6) if self.duration is not None else None,
+            "outcome": self.outcome,
+            "error": self.error,
+            "model": self.model,
+            "input_tokens": self.input_tokens,
+            "output_tokens": self.output_tokens,
+            "attributes": self.attributes,
+        }
+
+
+class Trace:
+    """All spans of one run (one package generation or one WordPress upload)."""
+    def __init__(self, name: str, attributes: dict | None = None):
+        self.trace_id = uuid.uuid4().hex
+        self.name = name
+        self.start = time.time()
+        self.attributes = dict(attributes or {})
+        self.spans: list[Span] = []
+        self._lock = threading.Lock()
+
+    def add(self, span: Span) -> None:
+        with self._lock:
+            self.spans.append(span)
+
+    def summary(self) -> dict:
+        """Totals per span kind plus overall token usage."""
+        with self._lock:
+            spans = list(self.spans)
+        by_kind: dict[str, dict] = {}
+        input_tokens = output_tokens = 0
+        for span in spans:
+            entry = by_kind.setdefault(span.kind, {"count": 0, "total_duration": 0.0, "errors": 0})
+            entry["count"] += 1
+            entry["total_duration"] = round(entry["total_duration"] + (span.duration or 0.0), 6)
+            entry["errors"] += span.outcome == "error"
+            input_tokens += span.input_tokens or 0
+            output_tokens += span.output_tokens or 0
+        return {"by_kind": by_kind, "input_tokens": input_tokens, "output_tokens": output_tokens}
+
+    def to_dict(self) -> dict:
+        with self._lock:
+            spans = [span.to_dict() for span in self.spans]
+        return {
+            "trace_id": self.trace_id,
+            "name": self.name,
+            "start": self.start,
+            "attributes": self.attributes,
+            "summary": self.summary(),
+            "spans": spans,
+        }
+
+
+def current_trace() -> Trace | None:
+    return _current_trace.get()
+
+
+@contextmanager
+def trace_span(name: str, kind: str = "internal", **attributes):
+    """
+    Times the enclosed block as a span of the current trace (a no-op record if no trace is active).
+    Exceptions mark the span as 'error' (or 'cancelled') and propagate unchanged.
+
+        with trace_span("wordpress.create_post", kind="http", url=url) as span:
+            response = requests.post(...)
+            span.set(status=response.status_code)
+    """
+    trace = _current_trace.get()
+    span = Span(name, kind, parent_id=_current_span_id.get(), attributes=attributes)
+    token = _current_span_id.set(span.span_id)
+    try:
+        yield span
+    except BaseException as e:
+        span.finish("cancelled" if isinstance(e, (asyncio.CancelledError, GeneratorExit)) else "error", e)
+        raise
+    else:
+        span.finish(span.outcome or "ok")
+    finally:
+        _current_span_id.reset(token)
+        if trace is not None:
+            trace.add(span)
+
+
+def record_span(name: str, kind: str = "internal", outcome: str = "ok", **attributes) -> None:
+    """Records an instantaneous span (e.g. a skipped stage) in the current trace."""
+    trace = _current_trace.get()
+    if trace is None:
+        return
+    span = Span(name, kind, parent_id=_current_span_id.get(), attributes=attributes)
+    span.finish(outcome)
+    trace.add(span)
+
+
+def _append_trace_file(trace_id: str, trace_name: str, spans: list[Span], path: str) -> None:
+    lines = []
+    for span in spans:
+        lines.append(json.dumps({"trace_id": trace_id, "trace_name": trace_name, **span.to_dict()}, ensure_ascii=False, default=str))
+    if not lines:
+        return
+    directory = os.path.dirname(path)
+    if directory:
+        os.makedirs(directory, exist_ok=True)
+    with _trace_file_lock, open(path, 'a', encoding='utf-8') as f:
+        f.write("\n".join(lines) + "\n")
+
+
+class _TraceFileWriter:
+    """Appends finished traces from a background thread, so closing a trace on an event loop never waits on disk."""
+    def __init__(self):
+        self._queue: queue.Queue = queue.Queue()
+        self._thread: threading.Thread | None = None
+        self._lock = threading.Lock()
+
+    def submit(self, trace_id: str, trace_name: str, spans: list[Span], path: str) -> None:
+        with self._lock:
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, name="trace-file-writer", daemon=True)
+                self._thread.start()
+                atexit.register(self.flush) # Don't lose the last traces on exit
+        self._queue.put((trace_id, trace_name, spans, path))
+
+    def _run(self) -> None:
+        while True:
+            trace_id, trace_name, spans, path = self._queue.get()
+            try:
+                _append_trace_file(trace_id, trace_name, spans, path)
+            except Exception as e:
+                logging.warning(f"Failed to append trace '{trace_name}' to {path}: {e}")
+            finally:
+                self._queue.task_done()
+
+    def flush(self) -> None:
+        """Blocks until every submitted trace is on disk."""
+        self._queue.join()
+
+
+_trace_writer = _TraceFileWriter()
+
+
+def flush_trace_file() -> None:
+    """Waits for traces queued by async callers to reach TRACE_FILE (e.g. before reading it)."""
+    _trace_writer.flush()
+
+
+@contextmanager
+def start_trace(name: str, **attributes):
+    """
+    Makes a new trace current for the enclosed block (and every task started inside it).
+    On exit its spans are appended to TRACE_FILE; on an event loop the append is handed to a
+    background writer. Yields None when tracing is disabled.
+    """
+    if not TRACING_ENABLED:
+        yield None
+        return
+    trace = Trace(name, attributes)
+    token = _current_trace.set(trace)
+    span_token = _current_span_id.set(None)
+    try:
+        yield trace
+    finally:
+        _current_span_id.reset(span_token)
+        _current_trace.reset(token)
+        with trace._lock:
+            spans = list(trace.spans)
+        try:
+            asyncio.get_running_loop()
+        except RuntimeError:
+            try:
+                _append_trace_file(trace.trace_id, name, spans, TRACE_FILE)
+            except Exception as e:
+                logging.warning(f"Failed to append trace '{name}' to {TRACE_FILE}: {e}")
+        else:
+            _trace_writer.submit(trace.trace_id, name, spans, TRACE_FILE)
+
+
+def traced(name: str):
+    """Decorator that runs each call of a sync or async function inside its own trace."""
+    def decorator(func):
+        if asyncio.iscoroutinefunction(func):
+            @functools.wraps(func)
+            async def async_wrapper(*args, **kwargs):
+                with start_trace(name):
+                    return await func(*args, **kwargs)
+            return async_wrapper
+
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            with start_trace(name):
+                return func(*args, **kwargs)
+        return wrapper
+    return decorator
+
+
+# --- Client Wrapper ---
+class TracedChatModel:
+    """
+    Wraps a chat model so each ainvoke/astream becomes an 'llm' span with model, token usage
+    (from `usage_metadata`), cache hit flag and outcome. Anything else is delegated.
+    """
+    wraps_chat_model = True
+
+    def __init__(self, client):
+        self.client = client
+
+    def __getattr__(self, name):
+        return getattr(self.client, name)
+
+    async def ainvoke(self, messages, *args, **kwargs):
+        with trace_span("llm.ainvoke", kind="llm", model=getattr(self.client, "model_name", None)) as span:
+            response = await self.client.ainvoke(messages, *args, **kwargs)
+            span.record_usage(getattr(response, "usage_metadata", None))
+            span.set(cache_hit=bool((getattr(response, "response_metadata", None) or {}).get("cache_hit")))
+            return response
+
+    async def astream(self, messages, *args, **kwargs):
+        # Built by hand rather than with trace_span: an async generator may be closed from another
+        # context, where resetting the current-span context variable would fail
+        trace = _current_trace.get()
+        span = Span("llm.astream", "llm", parent_id=_current_span_id.get(), attributes={"model": getattr(self.client, "model_name", None)})
+        chunks = 0
+        first_chunk_at = None
+        cache_hit = False
+        try:
+            async for chunk in self.client.astream(messages, *args, **kwargs):
+                chunks += 1
+                if first_chunk_at is None:
+                    first_chunk_at = time.perf_counter() - span._start_perf
+                span.record_usage(getattr(chunk, "usage_metadata", None))
+                cache_hit = cache_hit or bool((getattr(chunk, "response_metadata", None) or {}).get("cache_hit"))
+                yield chunk
+        except BaseException as e:
+            span.finish("cancelled" if isinstance(e, (asyncio.CancelledError, GeneratorExit)) else "error", e)
+            raise
+        else:
+            span.finish("ok")
+        finally:
+            span.set(chunks=chunks, time_to_first_chunk=round(first_chunk_at, 6) if first_chunk_at is not None else None, cache_hit=cache_hit)
+            if trace is not None:
+                trace.add(span)
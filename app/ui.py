@@ -1,19 +1,73 @@
 import streamlit as st
 import sys
 import os
-import asyncio
+import time
 from PIL import Image
 import io
 import logging
 import json
 
-from .content_generator import generate_persian_blog_package, generate_instagram_post_texts, analyze_blog_for_instagram_inputs, generate_instagram_story_teasers
+from .content_generator import generate_persian_blog_package, generate_instagram_post_texts, analyze_blog_for_instagram_inputs, generate_instagram_story_teasers, FUSED_IMAGE_PROMPTS, regenerate_package_artifacts, REGENERABLE_ARTIFACTS, SOURCE_ARTIFACTS
+from .source_digest import SOURCE_DIGEST_ENABLED, source_hash
+from .source_dedup import find_duplicate_sources, load_package_from_record
+from .output_store import get_output_store
+from .search_index import SEARCH_INDEX_ENABLED, search_packages
+from .pantry_outbox import PANTRY_OUTBOX_ENABLED, get_pantry_outbox
+from .pantry_mirror import PANTRY_MIRROR_ENABLED, get_pantry_mirror
 from .llm_clients import initialize_llm_clients
+from .llm_pool import pool_state
+from .http_transport import http_transport_stats
+from .job_manager import get_job_manager
 from .wordpress_handler import create_draft_post
-from .file_utils import list_pantry_baskets_async, get_pantry_basket_content_async
+from .file_utils import list_pantry_baskets_async, get_pantry_basket_content_async, run_io, get_io_runtime
 
 GRAPHIC_DIR = "images"
 
+_JOB_STATUS_ICONS = {"queued": "⏳", "running": "⚙️", "succeeded": "✅", "failed": "❌", "cancelled": "🚫"}
+
+
+@st.fragment(run_every=2)
+def _render_jobs_panel():
+    """Live list of background generation jobs; refreshes itself without rerunning the whole page."""
+    manager = get_job_manager()
+    jobs = manager.list_jobs()
+    if not jobs:
+        return
+    st.subheader("Generation Jobs")
+    for job in jobs:
+        icon = _JOB_STATUS_ICONS.get(job["status"], "")
+        progress = job["progress"]
+        elapsed = f" · {job['elapsed_seconds']}s" if job["elapsed_seconds"] is not None else ""
+        with st.container(border=True):
+            st.markdown(f"{icon} **{job['label'] or job['job_id']}** · {job['status']}{elapsed} · `{job['job_id']}`")
+            if progress["total"]:
+                st.progress(progress["done"] / progress["total"], text=f"{progress['done']}/{progress['total']} stages")
+            running = [stage for stage, event in job["stages"].items() if event == "started"]
+            if running:
+                st.caption(f"Running: {', '.join(running)}")
+            if job["error"]:
+                st.error(job["error"])
+            if job["status"] == "running" and job["partial"]:
+                # Partial output while the blog call is still streaming
+                with st.expander("Streaming blog output...", expanded=job["job_id"] == st.session_state.get("selected_job_id")):
+                    for field_key, field_value in job["partial"].items():
+                        if field_key == 'content':
+                            continue
+                        shown = ', '.join(str(v) for v in field_value) if isinstance(field_value, list) else field_value
+                        st.markdown(f"- **{field_key}:** {shown}")
+                    if 'content' in job["partial"]:
+                        st.markdown(str(job["partial"]['content']))
+            columns = st.columns(2)
+            if job["status"] in ("queued", "running"):
+                if columns[0].button("Cancel", key=f"cancel_job_{job['job_id']}"):
+                    manager.cancel(job["job_id"])
+            elif job["status"] in ("succeeded", "failed"):
+                if columns[0].button("Show result", key=f"show_job_{job['job_id']}"):
+                    st.session_state.generation_result = manager.result(job["job_id"])
+                    st.session_state.selected_job_id = job["job_id"]
+                    if 'uploaded_data' in st.session_state: del st.session_state.uploaded_data # Clear uploaded data if new generation occurs
+                    st.rerun()
+
 def main():
     if not os.getenv("GOOGLE_API_KEY"):
         st.error("GOOGLE_API_KEY not found in environment variables. Cannot attempt to initialize LLMs.")
@@ -26,6 +80,50 @@ def main():
     # Initialize all three LLM clients
     llm_blog, llm_image_prompt, llm_instagram_text = initialize_llm_clients()
 
+    with st.sidebar.expander("🩺 Model Pool Status"):
+        state = pool_state()
+        for role, models in state["roles"].items():
+            st.caption(f"{role}: {' → '.join(models)}")
+        st.dataframe([
+            {
+                "model": name,
+                "circuit": model["state"],
+                "in flight": f"{model['in_flight']}/{model['max_concurrency']}",
+                "calls": model["calls"],
+                "failures": model["failures"],
+                "p95 (s)": round(model["latency"]["p95"], 2) if model["latency"]["p95"] is not None else None,
+                "last failure": model["last_failure"],
+            }
+            for name, model in state["models"].items()
+        ], hide_index=True)
+        transport = http_transport_stats()
+        if transport.get("requests"):
+            st.caption(f"HTTP connection reuse: {transport['reuse_rate']:.0%} of {transport['requests']} requests "
+                       f"({transport['new_connections']} new connections, HTTP/2: {'on' if transport['http2'] else 'off'})")
+        io_stats = get_io_runtime().stats()
+        if io_stats["requests"]:
+            st.caption(f"Pantry connection reuse: {io_stats['reused_connections']} of {io_stats['requests']} requests "
+                       f"({io_stats['new_connections']} new connections)")
+
+    if os.getenv("PANTRY_ID") and PANTRY_OUTBOX_ENABLED:
+        with st.sidebar.expander("☁️ Pantry Uploads"):
+            outbox = get_pantry_outbox() # Also resumes uploads queued before a restart
+            outbox_status = outbox.status()
+            counts = outbox_status["counts"]
+            st.caption(f"Pending: {counts['pending'] + counts['uploading']} · Uploaded: {counts['done']} · Failed: {counts['failed']}")
+            if outbox_status["pending"]:
+                st.dataframe([
+                    {"basket": entry["basket_name"], "state": entry["status"], "attempts": entry["attempts"], "last error": entry["last_error"]}
+                    for entry in outbox_status["pending"]
+                ], hide_index=True)
+            if outbox_status["failed"]:
+                st.dataframe([
+                    {"basket": entry["basket_name"], "attempts": entry["attempts"], "error": entry["last_error"]}
+                    for entry in outbox_status["failed"]
+                ], hide_index=True)
+                if st.button("Retry failed uploads"):
+                    st.success(f"Re-queued {outbox.retry_failed()} upload(s).")
+
     st.header("Source Article Input")
     source_title = st.text_input("Source Title (H1)")
     source_body = st.text_area("Paste Source English Article Body Here", height=400)
@@ -43,6 +141,7 @@ def main():
             
             if 'final_parsed_package' in uploaded_full_data and uploaded_full_data['final_parsed_package'] is not None:
                 st.session_state.uploaded_data = uploaded_full_data['final_parsed_package']
+                st.session_state.uploaded_source = uploaded_full_data.get('source') # Present in records saved with their source
                 st.session_state.generation_result = None # Clear any previous generation to prioritize upload
                 st.success(f"Successfully loaded data from local file: {uploaded_json_file.name}")
             else:
@@ -56,6 +155,43 @@ def main():
             st.error(f"An error occurred while processing the uploaded file: {e}")
             if 'uploaded_data' in st.session_state: del st.session_state.uploaded_data 
     
+    # --- Local History Section ---
+    st.subheader("Load from Local History")
+    package_query = st.text_input("🔎 Search saved packages (title, keywords, tags, content; Persian or English)", key="package_query") if SEARCH_INDEX_ENABLED else ""
+    if package_query.strip():
+        found = search_packages(package_query, limit=50)
+        if found.get("error"):
+            st.error(f"Search failed: {found['error']}")
+        history_page = {"items": [{**result, "status": "success"} for result in found["results"]]}
+        if history_page["items"]:
+            st.caption(f"{len(history_page['items'])} best match(es) in {found['elapsed_ms']} ms")
+    else:
+        history_cols = st.columns([3, 2, 1])
+        history_search = history_cols[0].text_input("Filter by slug or source title", key="history_search")
+        history_status = history_cols[1].selectbox("Status", ["any", "success", "error", "save_failed"], key="history_status")
+        history_page_number = history_cols[2].number_input("Page", min_value=1, value=1, step=1, key="history_page")
+        history_page = get_output_store().list(page=int(history_page_number), page_size=20, search=history_search or None,
+                                               status=None if history_status == "any" else history_status)
+        if history_page["items"]:
+            st.caption(f"{history_page['total']} saved output(s), page {history_page['page']} of {history_page['pages']}")
+    if history_page["items"]:
+        selected_output = st.selectbox(
+            "Select a saved output to load:",
+            options=history_page["items"],
+            format_func=lambda item: f"#{item['id']:04d} · {item.get('title') or item['slug'] or '(no slug)'} · {item['timestamp'] or ''} · {item['status']}"
+        )
+        if st.button("Load Selected Output"):
+            saved_record = get_output_store().get(selected_output["id"])
+            if saved_record and saved_record.get('final_parsed_package') is not None:
+                st.session_state.uploaded_data = saved_record['final_parsed_package']
+                st.session_state.uploaded_source = saved_record.get('source')
+                st.session_state.generation_result = None # Clear any previous generation
+                st.success(f"Successfully loaded saved output #{selected_output['id']:04d}.")
+            else:
+                st.error(f"Error: saved output #{selected_output['id']:04d} has no 'final_parsed_package' to load.")
+    else:
+        st.caption("No saved outputs match these filters.")
+
     # --- Pantry Cloud Loading Section ---
     st.subheader("Load from Pantry Cloud")
     pantry_id_env = os.getenv("PANTRY_ID")
@@ -66,9 +202,26 @@ def main():
         if "pantry_basket_names" not in st.session_state:
             st.session_state.pantry_basket_names = []
 
-        if st.button("Fetch Baskets from Pantry"):
+        if PANTRY_MIRROR_ENABLED:
+            # Listing and loading are served from the local mirror, which keeps itself in sync
+            pantry_mirror = get_pantry_mirror()
+            pantry_mirror.start_background_refresh(pantry_id_env)
+            if st.button("Sync Pantry Now"):
+                with st.spinner("Syncing new baskets from Pantry..."):
+                    sync_result = run_io(pantry_mirror.sync(pantry_id_env))
+                if "error" in sync_result:
+                    st.error(sync_result["error"])
+                else:
+                    failed_note = f", {sync_result['failed']} failed" if sync_result["failed"] else ""
+                    st.success(f"Pantry synced: {sync_result['downloaded']} new basket(s) downloaded{failed_note}.")
+            st.session_state.pantry_basket_names = pantry_mirror.list_baskets(pantry_id_env)
+            mirror_state = pantry_mirror.state(pantry_id_env)
+            if mirror_state["synced_at"]:
+                st.caption(f"Local mirror: {mirror_state['downloaded']} of {mirror_state['baskets']} basket(s) downloaded, "
+                           f"last synced {time.strftime('%H:%M:%S', time.localtime(mirror_state['synced_at']))}.")
+        elif st.button("Fetch Baskets from Pantry"):
             with st.spinner("Fetching basket list from Pantry..."):
-                baskets = asyncio.run(list_pantry_baskets_async(pantry_id_env))
+                baskets = run_io(list_pantry_baskets_async(pantry_id_env))
                 if baskets is not None:
                     st.session_state.pantry_basket_names = baskets
                     if not baskets:
@@ -88,10 +241,14 @@ def main():
             if st.button("Load Selected Pantry Basket"):
                 if selected_pantry_basket:
                     with st.spinner(f"Loading '{selected_pantry_basket}' from Pantry..."):
-                        basket_content = asyncio.run(get_pantry_basket_content_async(pantry_id_env, selected_pantry_basket))
+                        if PANTRY_MIRROR_ENABLED:
+                            basket_content = run_io(get_pantry_mirror().load_basket(pantry_id_env, selected_pantry_basket))
+                        else:
+                            basket_content = run_io(get_pantry_basket_content_async(pantry_id_env, selected_pantry_basket))
                         if basket_content and isinstance(basket_content, dict):
                             if 'final_parsed_package' in basket_content and basket_content['final_parsed_package'] is not None:
                                 st.session_state.uploaded_data = basket_content['final_parsed_package']
+                                st.session_state.uploaded_source = basket_content.get('source')
                                 st.session_state.generation_result = None # Clear any previous generation
                                 st.success(f"Successfully loaded data from Pantry basket: {selected_pantry_basket}")
                             else:
@@ -103,7 +260,8 @@ def main():
                 else:
                     st.warning("No Pantry basket selected.")
         elif not st.session_state.pantry_basket_names and pantry_id_env: # Only show if pantry ID exists but no baskets fetched/found
-            st.caption("Click 'Fetch Baskets from Pantry' to see available saves.")
+            st.caption("The Pantry mirror has no baskets yet; it syncs in the background, or click 'Sync Pantry Now'." if PANTRY_MIRROR_ENABLED
+                       else "Click 'Fetch Baskets from Pantry' to see available saves.")
 
     st.divider()
 
@@ -116,26 +274,75 @@ def main():
         include_instagram_posts = st.checkbox("Include Instagram Post Texts", value=True, help="Generate viral title and caption for Instagram based on the blog content.")
         include_story_teasers = st.checkbox("Include Instagram Story Teasers", value=True, help="Generate Farsi teaser snippets for Instagram Stories.")
         include_iranian_video_prompt = st.checkbox("Include Iranian Farsi Video Prompt", value=False, help="Generate a short video prompt with Iranian context and Farsi dialogue.")
+        bypass_llm_cache = st.checkbox("Bypass LLM response cache", value=False, help="Always call the models, even if an identical request was answered before. The fresh responses replace the cached ones.")
+        stream_blog_output = st.checkbox("Stream blog output", value=True, help="Show the title, slug, tags and keywords as soon as the model produces them, then the article content.")
+        fuse_image_prompts = st.checkbox("Generate image prompts in one call", value=FUSED_IMAGE_PROMPTS, help="Ask for all four image prompts in a single structured response (fewer round trips, source sent once). Any prompt missing from the response is generated on its own.")
+        use_source_digest = st.checkbox("Condense source for image prompts", value=SOURCE_DIGEST_ENABLED, help="Summarize the source once and send that digest, instead of the full article, to the image and video prompt calls.")
+
+        def submit_generation():
+            generation_options = dict(
+                llm_blog_client=llm_blog, 
+                llm_image_prompt_client=llm_image_prompt, 
+                llm_instagram_text_client=llm_instagram_text, # Pass the Instagram text client
+                source_title=source_title, 
+                source_body=source_body,   
+                source_name=source_name,
+                source_url=source_url,
+                include_instagram_texts=include_instagram_posts, # Pass the checkbox state for post
+                include_story_teasers=include_story_teasers, # Pass the checkbox state for story
+                include_iranian_video_prompt=include_iranian_video_prompt, # NEW: Pass the checkbox state
+                bypass_cache=bypass_llm_cache,
+                stream_blog=stream_blog_output,
+                use_source_digest=use_source_digest,
+                fuse_image_prompts=fuse_image_prompts
+            )
 
+            def start_generation(job):
+                # Runs on the job manager's loop; progress and streamed fields land on the job
+                return generate_persian_blog_package(
+                    **generation_options,
+                    on_blog_field=job.on_blog_field if stream_blog_output else None,
+                    on_stage_event=job.on_stage_event,
+                )
+
+            # Generation runs in the background, so reruns, refreshes and other sessions do not lose it
+            job_id = get_job_manager().submit(start_generation, label=source_title, source_url=source_url)
+            st.session_state.selected_job_id = job_id
+            st.session_state.duplicate_check = None
+            st.success(f"Generation queued as job {job_id}. Follow its progress under Generation Jobs.")
+
+        current_source_key = source_hash(source_title or "", source_body or "")
         if st.button("✨ Generate Persian Blog Post Package"):
             if not source_name or not source_title or not source_body or not source_url:
                 st.warning("Please provide Source Name, Source Title, Source Body, and Source URL.")
             else:
-                with st.spinner("Generating Persian blog post, image prompts (artistic & realistic blog + Instagram), video prompts, and Instagram texts..."): # Updated spinner
-                    result_package = asyncio.run(generate_persian_blog_package(
-                        llm_blog_client=llm_blog, 
-                        llm_image_prompt_client=llm_image_prompt, 
-                        llm_instagram_text_client=llm_instagram_text, # Pass the Instagram text client
-                        source_title=source_title, 
-                        source_body=source_body,   
-                        source_name=source_name,
-                        source_url=source_url,
-                        include_instagram_texts=include_instagram_posts, # Pass the checkbox state for post
-                        include_story_teasers=include_story_teasers, # Pass the checkbox state for story
-                        include_iranian_video_prompt=include_iranian_video_prompt # NEW: Pass the checkbox state
-                    ))
-                st.session_state.generation_result = result_package 
-                if 'uploaded_data' in st.session_state: del st.session_state.uploaded_data # Clear uploaded data if new generation occurs
+                # Cheap fingerprint check before spending ~10 LLM calls on a story already generated
+                duplicates = find_duplicate_sources(source_body)
+                if duplicates:
+                    st.session_state.duplicate_check = {"source_key": current_source_key, "matches": duplicates}
+                else:
+                    submit_generation()
+
+        duplicate_check = st.session_state.get("duplicate_check")
+        if duplicate_check and duplicate_check["source_key"] == current_source_key:
+            st.warning("This source looks like a story that was already generated:")
+            for index, match in enumerate(duplicate_check["matches"]):
+                match_columns = st.columns([4, 1])
+                match_columns[0].markdown(f"**{match['similarity']:.0%} similar** · {match['title'] or match['slug']} · {match['url'] or ''} · saved {match['saved_at']}")
+                if match_columns[1].button("Load earlier package", key=f"load_duplicate_{index}"):
+                    earlier_package = load_package_from_record(match["local_file"])
+                    if earlier_package:
+                        st.session_state.uploaded_data = earlier_package
+                        st.session_state.uploaded_source = {"title": source_title, "body": source_body, "name": source_name, "url": source_url}
+                        st.session_state.generation_result = None
+                        st.session_state.duplicate_check = None
+                        st.rerun()
+                    else:
+                        st.error(f"Could not load the earlier package from {match['local_file']}.")
+            if st.button("Generate anyway"):
+                submit_generation()
+
+        _render_jobs_panel()
         
         display_data = None
         data_source_message = ""
@@ -287,6 +494,68 @@ This section contains all components needed for creating engaging Instagram cont
                         st.markdown("**2. Subtitle/Question (زیرنویس/سوال):** N/A")
                         st.markdown("**3. Body Text (متن بدنه):** N/A")
 
+                digest_report = result_package.get('source_digest_report')
+                if digest_report:
+                    with st.expander("📉 Source Digest (tokens sent to image/video prompts)"):
+                        if digest_report.get("digest_used"):
+                            st.markdown(f"**Bytes sent:** {digest_report['bytes_before']:,} → {digest_report['bytes_after']:,} (saved {digest_report['bytes_saved']:,})")
+                            st.markdown(f"**Estimated tokens:** {digest_report['estimated_tokens_before']:,} → {digest_report['estimated_tokens_after']:,}")
+                            if digest_report.get("cached"):
+                                st.caption("Digest reused from an earlier run of this source.")
+                        else:
+                            st.info(f"Full source was sent ({digest_report.get('reason')}).")
+                        st.json(digest_report, expanded=False)
+
+                with st.expander("♻️ Regenerate parts of this package"):
+                    st.caption("Re-runs only the selected parts; the blog and every other field are kept. The result is saved as a new version.")
+                    selected_artifacts = st.multiselect(
+                        "Parts to regenerate",
+                        options=list(REGENERABLE_ARTIFACTS),
+                        format_func=lambda key: REGENERABLE_ARTIFACTS[key],
+                        key="regenerate_artifacts"
+                    )
+                    # A loaded package is regenerated only from the source saved with it, never from whatever is in the form
+                    package_is_loaded = display_data is st.session_state.get("uploaded_data")
+                    if package_is_loaded:
+                        regen_source = st.session_state.get("uploaded_source") or {}
+                    else:
+                        regen_source = {"title": source_title, "body": source_body, "name": source_name, "url": source_url}
+                    regen_title = regen_source.get("title")
+                    regen_body = regen_source.get("body")
+                    blocked_artifacts = []
+                    if not (regen_title and regen_body):
+                        blocked_artifacts = [artifact for artifact in selected_artifacts if artifact in SOURCE_ARTIFACTS]
+                        if package_is_loaded and blocked_artifacts:
+                            st.error(f"This saved package does not include its source article, so {', '.join(REGENERABLE_ARTIFACTS[a] for a in blocked_artifacts)} cannot be regenerated. Generate the package again from its source instead.")
+                        elif package_is_loaded:
+                            st.caption("This saved package does not include its source article; only parts built from the blog itself can be regenerated.")
+                        elif blocked_artifacts:
+                            st.error("Image and video prompts need the original source: paste its title and body in Source Article Input above.")
+                    if st.button("Regenerate selected", disabled=not selected_artifacts or bool(blocked_artifacts)):
+                        base_package = dict(result_package)
+
+                        def start_regeneration(job):
+                            return regenerate_package_artifacts(
+                                package=base_package,
+                                artifacts=selected_artifacts,
+                                llm_image_prompt_client=llm_image_prompt,
+                                llm_instagram_text_client=llm_instagram_text,
+                                source_title=regen_title,
+                                source_body=regen_body,
+                                source_name=regen_source.get("name"),
+                                source_url=regen_source.get("url"),
+                                bypass_cache=True, # A regeneration asks for a different answer, not the cached one
+                                use_source_digest=use_source_digest,
+                                on_stage_event=job.on_stage_event,
+                            )
+
+                        job_id = get_job_manager().submit(
+                            start_regeneration,
+                            label=f"Regenerate {', '.join(selected_artifacts)} · {result_package.get('slug', '')}"
+                        )
+                        st.session_state.selected_job_id = job_id
+                        st.success(f"Regeneration queued as job {job_id}. Use Show result under Generation Jobs when it finishes.")
+
                 st.divider()
                 st.subheader("🖼️ Upload and Save Thumbnail Images")
                 
@@ -6,6 +6,7 @@ import requests
 import markdown
 import mimetypes
 from dotenv import load_dotenv
+from .tracing import trace_span, traced
 
 # Load environment variables for WP_URL etc.
 load_dotenv()
@@ -13,7 +14,18 @@ load_dotenv()
 # Configure logging (can be configured centrally if preferred)
 logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
 
+def _traced_request(method: str, step: str, url: str, **kwargs) -> requests.Response:
+    """`requests.request` recorded as an 'http' span named wordpress.<step> (status, bytes, outcome)."""
+    with trace_span(f"wordpress.{step}", kind="http", method=method.upper(), url=url) as span:
+        response = requests.request(method, url, **kwargs)
+        span.set(status=response.status_code, response_bytes=len(response.content))
+        if response.status_code >= 400:
+            span.fail(f"HTTP {response.status_code}")
+        return response
+
+
 # --- WordPress Interaction Function ---
+@traced("wordpress.create_draft_post")
 def create_draft_post(title: str, 
                       content: str, 
                       slug: str | None = None, 
@@ -94,7 +106,7 @@ def create_draft_post(title: str,
                 # 1. Search for existing tag
                 logging.info(f"Searching for tag ID for name: '{name}'")
                 search_params = {'search': name, 'per_page': 1}
-                response_search = requests.get(tags_endpoint, headers=headers, params=search_params, timeout=15)
+                response_search = _traced_request("get", "search_tag", tags_endpoint, headers=headers, params=search_params, timeout=15)
                 response_search.raise_for_status()
                 search_results = response_search.json()
 
@@ -116,7 +128,7 @@ def create_draft_post(title: str,
                     if name.isascii():
                         logging.info(f"Attempting to create new ASCII tag: '{name}'")
                         create_tag_data = {'name': name}
-                        response_create_tag = requests.post(tags_endpoint, headers=headers, json=create_tag_data, timeout=15)
+                        response_create_tag = _traced_request("post", "create_tag", tags_endpoint, headers=headers, json=create_tag_data, timeout=15)
                         
                         if response_create_tag.status_code == 201: # Created
                             new_tag_data = response_create_tag.json()
@@ -155,7 +167,7 @@ def create_draft_post(title: str,
     
     try:
         logging.info(f"Step 1: Attempting to create WordPress draft: '{title[:50]}...' with Cat=[26], Tags={create_data.get('tags')}")
-        response_create = requests.post(posts_endpoint, headers=headers, json=create_data, timeout=30)
+        response_create = _traced_request("post", "create_post", posts_endpoint, headers=headers, json=create_data, timeout=30)
         response_create.raise_for_status()
         create_response_json = response_create.json()
         new_post_id = create_response_json.get('id')
@@ -204,7 +216,7 @@ def create_draft_post(title: str,
         if len(update_data) > 1: # Check if more than just post_id is present
             try:
                 logging.info(f"Step 2: Attempting to update Rank Math field(s) for post ID {new_post_id} via custom endpoint {rank_math_endpoint}. Data: { {k: v for k, v in update_data.items() if k != 'post_id'} }...") # Log sent data
-                response_update = requests.post(rank_math_endpoint, headers=headers, json=update_data, timeout=30)
+                response_update = _traced_request("post", "update_rank_math", rank_math_endpoint, headers=headers, json=update_data, timeout=30)
                 response_update.raise_for_status() # Check for HTTP errors (like 404, 500)
                 
                 update_result = response_update.json() 
@@ -261,7 +273,7 @@ def create_draft_post(title: str,
                 }
 
                 # Upload the media
-                response_media = requests.post(media_endpoint, headers=media_headers, data=image_data, timeout=60) # Increased timeout for upload
+                response_media = _traced_request("post", "upload_media", media_endpoint, headers=media_headers, data=image_data, timeout=60) # Increased timeout for upload
                 response_media.raise_for_status()
                 media_data = response_media.json()
                 media_id = media_data.get('id')
@@ -278,7 +290,7 @@ def create_draft_post(title: str,
                     # Update Media Alt Text
                     try:
                         media_item_endpoint = f"{media_endpoint}/{media_id}"
-                        response_update_media = requests.post(media_item_endpoint, headers=headers, json=update_media_alt_data, timeout=30)
+                        response_update_media = _traced_request("post", "update_media_alt", media_item_endpoint, headers=headers, json=update_media_alt_data, timeout=30)
                         response_update_media.raise_for_status()
                         logging.info(f"Successfully updated alt text for Media ID {media_id}.")
                     except requests.exceptions.RequestException as e_media_alt:
@@ -288,7 +300,7 @@ def create_draft_post(title: str,
 
                     # Set Featured Image on Post
                     post_update_endpoint = f"{posts_endpoint}/{new_post_id}"
-                    response_update_post = requests.post(post_update_endpoint, headers=headers, json=update_post_data, timeout=30)
+                    response_update_post = _traced_request("post", "set_featured_media", post_update_endpoint, headers=headers, json=update_post_data, timeout=30)
                     response_update_post.raise_for_status()
                     logging.info(f"Step 3b: Successfully set featured image for Post ID {new_post_id}.")
 
@@ -0,0 +1,150 @@
+"""
+Benchmark: local save latency and event-loop blocking for typical and large packages.
+
+Builds a typical package (~30KB of Persian blog plus raw outputs) and a large one (~390KB),
+then times record serialization (json pretty/compact, orjson if installed), the atomic file
+write, and a full `save_output_to_file_async` call. A ticker coroutine runs alongside each
+async save and reports the longest event-loop stall, compared with the former in-loop
+`json.dump(indent=4)` write. Runs in a temporary directory, so the real answers/ is not touched.
+
+    python benchmarks/bench_local_save.py [--repeat 20]
+"""
+import os
+import sys
+import json
+import time
+import logging
+import asyncio
+import argparse
+import tempfile
+
+REPO_ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), ".."))
+sys.path.insert(0, REPO_ROOT)
+
+
+# --- Input Generators ---
+PARAGRAPH = "هوش مصنوعی مولد در سال ۲۰۲۵ به ابزار اصلی تولید محتوا در رسانه‌های فارسی‌زبان تبدیل شده است. "
+
+
+def _persian(size: int) -> str:
+    return PARAGRAPH * max(1, size // len(PARAGRAPH.encode("utf-8")))
+
+
+def make_record(content_bytes: int) -> dict:
+    """A saved-record-shaped dict whose blog content (and its raw LLM output) is about `content_bytes`."""
+    content = _persian(content_bytes)
+    package = {
+        "title": "عنوان نمونه", "slug": "sample-slug", "primary_keyword": "هوش مصنوعی",
+        "tags": ["ai", "news", "هوش مصنوعی"], "content": content,
+        "image_prompt": "A cinematic illustration " * 20, "realistic_image_prompt": "A realistic photo " * 20,
+        "instagram_post_title": "عنوان", "instagram_post_caption": _persian(1500),
+        "instagram_story_teasers": [_persian(200) for _ in range(3)],
+    }
+    return {
+        "id": 1, "timestamp": "20250101_120000", "status": "success", "error_message": None,
+        "raw_blog_llm_output": json.dumps(package, ensure_ascii=False), "raw_image_prompt_llm_output": package["image_prompt"],
+        "raw_realistic_image_prompt_llm_output": package["realistic_image_prompt"],
+        "raw_instagram_post_image_prompt": "prompt " * 100, "raw_instagram_video_prompt": "prompt " * 100,
+        "raw_iranian_farsi_video_prompt": _persian(2000), "final_parsed_package": package,
+        "source": {"title": "Source", "body": "English source body. " * (content_bytes // 40), "name": "Example", "url": "https://example.com/a"},
+        "pantry_basket_name": None, "trace": None,
+    }
+
+
+CASES = {"typical": 8_000, "large": 150_000}
+
+
+# --- Timers ---
+def best_of(func, repeat: int) -> float:
+    best = float("inf")
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func()
+        best = min(best, time.perf_counter() - start)
+    return best
+
+
+def legacy_write(path: str, record: dict) -> None:
+    with open(path, 'w', encoding='utf-8') as f:
+        json.dump(record, f, ensure_ascii=False, indent=4)
+
+
+async def max_loop_stall(coro_factory, repeat: int) -> tuple[float, float]:
+    """Runs `coro_factory()` `repeat` times beside a 1ms ticker; returns (mean save seconds, worst tick lag seconds)."""
+    worst = 0.0
+    running = True
+
+    async def ticker():
+        nonlocal worst
+        while running:
+            before = time.perf_counter()
+            await asyncio.sleep(0.001)
+            worst = max(worst, time.perf_counter() - before - 0.001)
+
+    tick_task = asyncio.create_task(ticker())
+    await asyncio.sleep(0.01)
+    total = 0.0
+    for _ in range(repeat):
+        start = time.perf_counter()
+        await coro_factory()
+        total += time.perf_counter() - start
+    running = False
+    await tick_task
+    return total / repeat, worst
+
+
+async def run_async_cases(records: dict, repeat: int, save_output_to_file_async) -> list[tuple]:
+    rows = []
+    for case, record in records.items():
+        async def legacy_in_loop():
+            legacy_write(os.path.join("scratch", "legacy.json"), record)
+
+        async def new_save():
+            await save_output_to_file_async(raw_blog_output=record["raw_blog_llm_output"], parsed_package=record["final_parsed_package"],
+                                            slug=f"bench-{case}", source=record["source"])
+
+        for label, factory in (("legacy in-loop json.dump", legacy_in_loop), ("save_output_to_file_async", new_save)):
+            mean_s, stall_s = await max_loop_stall(factory, repeat)
+            rows.append((case, label, mean_s, stall_s))
+    return rows
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--repeat", type=int, default=20, help="Iterations per measurement")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as workdir:
+        os.chdir(workdir)
+        os.makedirs("scratch", exist_ok=True)
+        os.environ.setdefault("TRACING_ENABLED", "false")
+        from app import file_utils  # noqa: E402  (imported here so its stores live in the temp directory)
+        logging.disable(logging.INFO)
+
+        records = {case: make_record(size) for case, size in CASES.items()}
+        serializers = {
+            "json indent=4": lambda r: file_utils.serialize_record(r, compact=False, fast=False),
+            "json compact": lambda r: file_utils.serialize_record(r, compact=True, fast=False),
+        }
+        if file_utils.orjson is not None:
+            serializers["orjson indent=2"] = lambda r: file_utils.serialize_record(r, compact=False, fast=True)
+            serializers["orjson compact"] = lambda r: file_utils.serialize_record(r, compact=True, fast=True)
+
+        print(f"{'case':<9}{'serializer':<18}{'bytes':>10}  {'serialize ms':>13}  {'atomic write ms':>16}")
+        for case, record in records.items():
+            for label, serialize in serializers.items():
+                data = serialize(record)
+                serialize_s = best_of(lambda: serialize(record), args.repeat)
+                write_s = best_of(lambda: file_utils.write_file_atomic(os.path.join("scratch", "bench.json"), data), args.repeat)
+                print(f"{case:<9}{label:<18}{len(data):>10}  {serialize_s * 1000:13.2f}  {write_s * 1000:16.2f}")
+            legacy_s = best_of(lambda: legacy_write(os.path.join("scratch", "legacy.json"), record), args.repeat)
+            print(f"{case:<9}{'legacy json.dump':<18}{'':>10}  {'':>13}  {legacy_s * 1000:16.2f}  (serialize + write)")
+
+        print(f"\n{'case':<9}{'save path':<28}{'mean ms':>9}  {'worst loop stall ms':>20}")
+        for case, label, mean_s, stall_s in asyncio.run(run_async_cases(records, args.repeat, file_utils.save_output_to_file_async)):
+            print(f"{case:<9}{label:<28}{mean_s * 1000:9.2f}  {stall_s * 1000:20.2f}")
+        os.chdir(REPO_ROOT)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,375 @@
+"""
+Benchmark: end-to-end package throughput and latency against local stand-ins, with a baseline check.
+
+Starts `app.stand_in_server` (WordPress REST, Rank Math, Pantry and an OpenAI-compatible LLM
+endpoint answering with synthetic packages) on a free local port, points the app at it, then for
+each concurrency level generates packages with `generate_persian_blog_package` (the real client
+chain, stage graph, local save and Pantry outbox) and publishes each with `create_draft_post`
+(tags, post, Rank Math, media). Latency, error shares and rate limits of every stand-in are
+configurable. With `--cassette` (recorded with LLM_CASSETTE_MODE=record) and `--sources`, LLM
+calls are replayed from the cassette instead.
+
+Reported per level: packages per minute, p50/p95/p99 end-to-end latency, per-stage durations
+(including `publish`), event-loop lag, peak RSS and Pantry drain time. Results are written as
+JSON; with a baseline, every shared level is compared and the exit status is 1 if a metric got
+worse than `--tolerance`. Runs in a temporary directory, so the real answers/ is not touched.
+
+    python benchmarks/bench_pipeline.py [--concurrency 1,2,4,8] [--packages 8]
+        [--llm-latency lognormal:0.4,0.3] [--service-latency 'wordpress=uniform:0.05,0.15;*=none']
+        [--error-rates pantry=0.05] [--rate-limits pantry=120]
+        [--baseline benchmarks/baselines/pipeline.json] [--save-baseline] [--tolerance 0.15]
+"""
+import os
+import sys
+import json
+import time
+import socket
+import asyncio
+import logging
+import argparse
+import platform
+import resource
+import tempfile
+import threading
+import subprocess
+
+REPO_ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), ".."))
+sys.path.insert(0, REPO_ROOT)
+
+DEFAULT_RESULTS_DIR = os.path.join(REPO_ROOT, "benchmarks", "results")
+DEFAULT_BASELINE = os.path.join(REPO_ROOT, "benchmarks", "baselines", "pipeline.json")
+
+# Metric -> True if higher is better; compared per concurrency level against the baseline
+COMPARED_METRICS = {
+    "packages_per_minute": True,
+    "latency_seconds.p50": False,
+    "latency_seconds.p95": False,
+    "latency_seconds.p99": False,
+    "loop_lag_ms.p99": False,
+    "peak_rss_mb": False,
+}
+
+
+# --- Input Generators ---
+PARAGRAPH = ("Researchers released a new open-weight language model on Tuesday, claiming state-of-the-art results "
+             "on reasoning benchmarks while using a fraction of the compute of earlier systems. ")
+
+
+def make_sources(count: int) -> list[dict]:
+    """Distinct English news sources of about 3KB (distinct, so none is a near-duplicate of another)."""
+    return [{
+        "id": f"bench-{n}",
+        "source_title": f"Model release number {n} shakes up the AI industry",
+        "source_body": f"Story {n}. " + PARAGRAPH * 18 + f" Item reference {n * 7919}.",
+        "source_name": "Bench Wire",
+        "source_url": f"https://example.com/news/{n}",
+    } for n in range(count)]
+
+
+# --- Measurements ---
+def percentile(values: list[float], p: float) -> float | None:
+    if not values:
+        return None
+    ordered = sorted(values)
+    index = min(len(ordered) - 1, max(0, round(p / 100 * (len(ordered) - 1))))
+    return ordered[index]
+
+
+def distribution(values: list[float], digits: int = 3) -> dict:
+    if not values:
+        return {"count": 0}
+    return {
+        "count": len(values),
+        "mean": round(sum(values) / len(values), digits),
+        "p50": round(percentile(values, 50), digits),
+        "p95": round(percentile(values, 95), digits),
+        "p99": round(percentile(values, 99), digits),
+        "max": round(max(values), digits),
+    }
+
+
+def peak_rss_mb() -> float:
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return round(peak / (1024 * 1024 if sys.platform == "darwin" else 1024), 1) # Bytes on macOS, KB on Linux
+
+
+class LoopLagMonitor:
+    """Samples how late a 10ms sleep wakes up on the running loop (a blocked loop shows as lag)."""
+    def __init__(self, interval: float = 0.01):
+        self.interval = interval
+        self.samples: list[float] = []
+        self._task: asyncio.Task | None = None
+
+    async def _run(self):
+        while True:
+            before = time.perf_counter()
+            await asyncio.sleep(self.interval)
+            self.samples.append((time.perf_counter() - before - self.interval) * 1000)
+
+    def start(self):
+        self._task = asyncio.create_task(self._run())
+
+    async def stop(self) -> dict:
+        self._task.cancel()
+        try:
+            await self._task
+        except asyncio.CancelledError:
+            pass
+        return distribution(self.samples, 2)
+
+
+# --- Stand-in Server ---
+def free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+def start_stand_in(port: int, args) -> tuple:
+    """Runs the stand-in server on its own loop thread, so benchmark load never delays its responses."""
+    from app.stand_in_server import StandInServer
+
+    server = StandInServer(latency=args.service_latency_spec, error_rates=args.error_rates, rate_limits=args.rate_limits,
+                           seed=args.seed, llm_content_chars=args.content_chars)
+    loop = asyncio.new_event_loop()
+    ready = threading.Event()
+
+    def run():
+        asyncio.set_event_loop(loop)
+        loop.run_until_complete(server.start("127.0.0.1", port))
+        ready.set()
+        loop.run_forever()
+
+    threading.Thread(target=run, name="stand-in-server", daemon=True).start()
+    if not ready.wait(10):
+        raise RuntimeError("Stand-in server did not start")
+    return server, loop
+
+
+# --- Runner ---
+async def run_level(concurrency: int, sources: list[dict], clients: tuple, image_path: str, args) -> dict:
+    from app.content_generator import generate_persian_blog_package
+    from app.wordpress_handler import create_draft_post
+    from app.pantry_outbox import get_pantry_outbox
+
+    latencies, failures = [], []
+    stages: dict[str, list[float]] = {}
+    queue: asyncio.Queue = asyncio.Queue()
+    for source in sources:
+        queue.put_nowait(source)
+
+    async def process(source: dict):
+        start = time.perf_counter()
+
+        def on_stage_event(event):
+            if event["event"] == "finished":
+                stages.setdefault(event["stage"], []).append(event["elapsed"])
+
+        package = await generate_persian_blog_package(
+            *clients, source["source_title"], source["source_body"], source["source_name"], source["source_url"],
+            include_iranian_video_prompt=True, stream_blog=args.stream_blog, max_in_flight=args.max_in_flight,
+            on_stage_event=on_stage_event,
+        )
+        if package.get("error"):
+            failures.append(package["error"])
+            return
+        publish_start = time.perf_counter()
+        published = await asyncio.to_thread(
+            create_draft_post, package.get("title"), package.get("content", ""), slug=package.get("slug"), tag_names=package.get("tags"),
+            primary_focus_keyword=package.get("primary_focus_keyword"), secondary_focus_keyword=package.get("secondary_focus_keyword"),
+            additional_focus_keywords=package.get("additional_focus_keywords"), seo_title=package.get("seo_title"),
+            seo_description=package.get("meta_description"), image_path=image_path, image_alt_text=package.get("alt_text"),
+        )
+        stages.setdefault("publish", []).append(time.perf_counter() - publish_start)
+        if not published.get("success"):
+            failures.append(published.get("error"))
+            return
+        latencies.append(time.perf_counter() - start)
+
+    async def worker():
+        while True:
+            try:
+                source = queue.get_nowait()
+            except asyncio.QueueEmpty:
+                return
+            try:
+                await process(source)
+            except Exception as e:
+                failures.append(f"{type(e).__name__}: {e}")
+
+    monitor = LoopLagMonitor()
+    monitor.start()
+    level_start = time.perf_counter()
+    await asyncio.gather(*(worker() for _ in range(concurrency)))
+    elapsed = time.perf_counter() - level_start
+    loop_lag = await monitor.stop()
+
+    drain_start = time.perf_counter()
+    drained = await get_pantry_outbox().wait_idle(args.drain_timeout)
+    return {
+        "concurrency": concurrency,
+        "packages": len(sources),
+        "succeeded": len(latencies),
+        "failed": len(failures),
+        "errors": sorted(set(str(error)[:200] for error in failures))[:5],
+        "elapsed_seconds": round(elapsed, 3),
+        "packages_per_minute": round(len(latencies) / elapsed * 60, 2) if elapsed else None,
+        "latency_seconds": distribution(latencies),
+        "stages_seconds": {name: distribution(values) for name, values in sorted(stages.items())},
+        "loop_lag_ms": loop_lag,
+        "peak_rss_mb": peak_rss_mb(),
+        "pantry_drain_seconds": round(time.perf_counter() - drain_start, 3),
+        "pantry_drained": drained,
+    }
+
+
+# --- Baseline Comparison ---
+def _metric(level: dict, path: str):
+    value = level
+    for part in path.split("."):
+        value = value.get(part) if isinstance(value, dict) else None
+    return value
+
+
+def compare_with_baseline(results: dict, baseline: dict, tolerance: float) -> list[dict]:
+    """Per level and metric: baseline, current, relative change and whether it regressed past `tolerance`."""
+    baseline_levels = {level["concurrency"]: level for level in baseline.get("levels", [])}
+    rows = []
+    for level in results["levels"]:
+        previous = baseline_levels.get(level["concurrency"])
+        if previous is None:
+            continue
+        for metric, higher_is_better in COMPARED_METRICS.items():
+            current, before = _metric(level, metric), _metric(previous, metric)
+            if not isinstance(current, (int, float)) or not isinstance(before, (int, float)) or before == 0:
+                continue
+            change = (current - before) / before
+            regressed = (change < -tolerance) if higher_is_better else (change > tolerance)
+            rows.append({"concurrency": level["concurrency"], "metric": metric, "baseline": before, "current": current,
+                         "change": round(change, 4), "regressed": regressed})
+    return rows
+
+
+def git_commit() -> str | None:
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], cwd=REPO_ROOT, capture_output=True, text=True, timeout=10).stdout.strip() or None
+    except (OSError, subprocess.SubprocessError):
+        return None
+
+
+# --- Main ---
+def _build_arg_parser() -> argparse.ArgumentParser:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--concurrency", default="1,2,4,8", help="Comma-separated packages in flight per level")
+    parser.add_argument("--packages", type=int, default=8, help="Packages generated and published per level")
+    parser.add_argument("--llm-latency", default="lognormal:0.4,0.3", help="LLM call latency (LLM_CASSETTE_LATENCY syntax; per model allowed)")
+    parser.add_argument("--service-latency", default="wordpress=uniform:0.05,0.15;rank_math=uniform:0.05,0.1;pantry=uniform:0.05,0.2",
+                        help="WordPress/Rank Math/Pantry latency, same syntax")
+    parser.add_argument("--error-rates", default="", help="Injected failure share per service, e.g. 'pantry=0.05,llm=0.01'")
+    parser.add_argument("--rate-limits", default="", help="Requests per minute per service before 429s, e.g. 'pantry=120'")
+    parser.add_argument("--content-chars", type=int, default=6000, help="Size of the synthetic blog body")
+    parser.add_argument("--stream-blog", action="store_true", help="Stream the blog call")
+    parser.add_argument("--max-in-flight", type=int, default=None, help="LLM calls in flight per package (default LLM_MAX_IN_FLIGHT)")
+    parser.add_argument("--cassette", help="Replay LLM calls from this cassette instead of the synthetic LLM endpoint")
+    parser.add_argument("--sources", help="Batch file (JSON/JSONL/CSV) of the sources the cassette was recorded with")
+    parser.add_argument("--drain-timeout", type=float, default=60, help="Seconds to wait for queued Pantry uploads per level")
+    parser.add_argument("--seed", default="0", help="Seed for synthetic latency and failures")
+    parser.add_argument("--output", help=f"Results file (default {os.path.relpath(DEFAULT_RESULTS_DIR, REPO_ROOT)}/pipeline-<time>.json)")
+    parser.add_argument("--baseline", default=DEFAULT_BASELINE, help="Baseline results to compare against, if the file exists")
+    parser.add_argument("--save-baseline", action="store_true", help="Also store these results as the baseline")
+    parser.add_argument("--tolerance", type=float, default=0.15, help="Relative change counted as a regression")
+    return parser
+
+
+def main(argv: list[str] | None = None) -> int:
+    args = _build_arg_parser().parse_args(argv)
+    levels = [int(value) for value in args.concurrency.split(",") if value.strip()]
+    if args.cassette and not args.sources:
+        raise SystemExit("--cassette needs --sources: replay only matches the sources the cassette was recorded with.")
+    # Paths given relative to the caller's directory, resolved before moving to the temp directory
+    output_path = os.path.abspath(args.output) if args.output else os.path.join(DEFAULT_RESULTS_DIR, f"pipeline-{time.strftime('%Y%m%d_%H%M%S')}.json")
+    baseline_path = os.path.abspath(args.baseline)
+    cassette_path = os.path.abspath(args.cassette) if args.cassette else None
+    sources_path = os.path.abspath(args.sources) if args.sources else None
+    # The LLM endpoint only takes part without a cassette; its latency then comes from --llm-latency
+    args.service_latency_spec = args.service_latency if cassette_path else f"{args.service_latency};llm={args.llm_latency}"
+
+    with tempfile.TemporaryDirectory() as workdir:
+        os.chdir(workdir)
+        port = free_port()
+        base_url = f"http://127.0.0.1:{port}"
+        # Set before the app is imported: several settings are read at import time
+        os.environ.update({
+            "WP_URL": base_url, "WP_USERNAME": "bench", "WP_APP_PASSWORD": "bench",
+            "PANTRY_BASE_URL": f"{base_url}/apiv1/pantry", "PANTRY_ID": "bench-pantry",
+            "AVALAI_BASE_URL": f"{base_url}/v1", "GOOGLE_API_KEY": os.getenv("GOOGLE_API_KEY") or "bench",
+            "LLM_CACHE_ENABLED": "false", "TRACING_ENABLED": "false", "PANTRY_MIRROR_REFRESH_SECONDS": "0",
+        })
+        if cassette_path:
+            os.environ.update({"LLM_CASSETTE_MODE": "replay", "LLM_CASSETTE_PATH": cassette_path,
+                               "LLM_CASSETTE_LATENCY": args.llm_latency, "LLM_CASSETTE_SEED": args.seed})
+        logging.disable(logging.WARNING)
+        from app.llm_clients import initialize_llm_clients  # noqa: E402  (imported here so its stores live in the temp directory)
+        from app.batch_runner import load_batch_items  # noqa: E402
+
+        server, server_loop = start_stand_in(port, args)
+        clients = initialize_llm_clients()
+        if not all(clients):
+            raise SystemExit("LLM clients could not be initialized.")
+        image_path = os.path.join(workdir, "featured.png")
+        with open(image_path, 'wb') as f:
+            f.write(b"\x89PNG\r\n\x1a\n" + os.urandom(200 * 1024))
+
+        all_sources = load_batch_items(sources_path) if sources_path else make_sources(args.packages * len(levels))
+        results = {
+            "benchmark": "pipeline",
+            "created_at": time.strftime("%Y-%m-%dT%H:%M:%S"),
+            "git_commit": git_commit(),
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "config": {key: value for key, value in vars(args).items() if key not in ("output", "baseline", "save_baseline")},
+            "levels": [],
+        }
+        print(f"{'conc':>4}  {'ok/total':>8}  {'pkg/min':>8}  {'p50 s':>7}  {'p95 s':>7}  {'p99 s':>7}  {'lag max ms':>10}  {'rss MB':>7}")
+        for index, concurrency in enumerate(levels):
+            # Fresh sources per level, so later levels never hit earlier saves (unless replaying a fixed set)
+            sources = all_sources if sources_path else all_sources[index * args.packages:(index + 1) * args.packages]
+            level = asyncio.run(run_level(concurrency, sources, clients, image_path, args))
+            results["levels"].append(level)
+            latency = level["latency_seconds"]
+            print(f"{concurrency:>4}  {level['succeeded']:>3}/{level['packages']:<4}  {level['packages_per_minute'] or 0:>8.2f}  "
+                  f"{latency.get('p50', 0):>7.2f}  {latency.get('p95', 0):>7.2f}  {latency.get('p99', 0):>7.2f}  "
+                  f"{level['loop_lag_ms'].get('max', 0):>10.2f}  {level['peak_rss_mb']:>7.1f}")
+            for error in level["errors"]:
+                print(f"      error: {error}")
+        results["stand_in_requests"] = server.state.snapshot()["requests"]
+        asyncio.run_coroutine_threadsafe(server.stop(), server_loop).result(10)
+        os.chdir(REPO_ROOT)
+
+    print("\nStages (last level, seconds):")
+    for name, stats in results["levels"][-1]["stages_seconds"].items():
+        print(f"  {name:<36} p50 {stats.get('p50', 0):>6.2f}  p95 {stats.get('p95', 0):>6.2f}  n={stats['count']}")
+
+    exit_code = 0
+    if os.path.exists(baseline_path):
+        with open(baseline_path, 'r', encoding='utf-8') as f:
+            baseline = json.load(f)
+        comparison = compare_with_baseline(results, baseline, args.tolerance)
+        results["baseline"] = {"path": baseline_path, "git_commit": baseline.get("git_commit"), "tolerance": args.tolerance, "comparison": comparison}
+        regressions = [row for row in comparison if row["regressed"]]
+        print(f"\nBaseline {os.path.relpath(baseline_path, REPO_ROOT)} ({baseline.get('git_commit')}): "
+              f"{len(comparison)} metric(s) compared, {len(regressions)} regression(s) past {args.tolerance:.0%}.")
+        for row in regressions:
+            print(f"  REGRESSION c={row['concurrency']} {row['metric']}: {row['baseline']} -> {row['current']} ({row['change']:+.1%})")
+        exit_code = 1 if regressions else 0
+
+    for path in [output_path] + ([baseline_path] if args.save_baseline else []):
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        with open(path, 'w', encoding='utf-8') as f:
+            json.dump(results, f, ensure_ascii=False, indent=2)
+        print(f"Wrote {os.path.relpath(path, REPO_ROOT)}")
+    return exit_code
+
+
+if __name__ == "__main__":
+    sys.exit(main())
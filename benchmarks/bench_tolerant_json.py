@@ -0,0 +1,149 @@
+"""
+Benchmark: single-pass tolerant JSON decoding vs. the former regex repair chain.
+
+Builds blog-shaped LLM outputs of increasing size (up to ~50KB and beyond) with raw newlines
+inside strings, unescaped quotes, trailing commas and truncation, then times
+`app.tolerant_json.loads_tolerant` against the regex chain it replaced. The legacy chain runs
+in a child process with a timeout, since its DOTALL pattern can backtrack for a very long time.
+
+    python benchmarks/bench_tolerant_json.py [--sizes 5000,20000,50000,100000] [--timeout 10]
+"""
+import os
+import re
+import sys
+import json
+import time
+import argparse
+import multiprocessing
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+from app.tolerant_json import loads_tolerant  # noqa: E402
+
+
+# --- Input Generators ---
+PARAGRAPH = 'هوش مصنوعی "مولد" در سال ۲۰۲۵ به ابزار اصلی تولید محتوا تبدیل شده است.\nاو گفت: "این فقط شروع است", و ادامه داد.\n'
+
+
+def _content_of_size(size: int) -> str:
+    repeats = max(1, size // len(PARAGRAPH.encode("utf-8")))
+    return PARAGRAPH * repeats
+
+
+def raw_newlines_and_quotes(size: int) -> str:
+    """Blog JSON with literal newlines and unescaped quotes inside the long `content` value."""
+    return (
+        '```json\n{\n  "title": "عنوان",\n  "slug": "sample-slug",\n'
+        '  "tags": ["ai", "news",],\n'
+        f'  "content": "{_content_of_size(size)}",\n'
+        '  "meta_description": "توضیح",\n}\n```'
+    )
+
+
+def truncated(size: int) -> str:
+    """Same document cut off mid-string, as when the model hits its token limit."""
+    return raw_newlines_and_quotes(size)[: -60]
+
+
+def pathological_quotes(size: int) -> str:
+    """Many short lines of `"k": "v" "x":` fragments with unescaped quotes."""
+    line = '"k": "v" "x":\n'
+    repeats = max(1, size // len(line))
+    return '{"content": "' + line * repeats + '"}'
+
+
+def unterminated_multiline(size: int) -> str:
+    """A multi-line value whose closing quote never arrives; the legacy pattern's nested
+    quantifiers try every way of splitting the lines before giving up."""
+    line = "خط\n"
+    repeats = max(1, size // len(line.encode("utf-8")))
+    return '{"title": "عنوان", "content": "' + line * repeats
+
+
+GENERATORS = {
+    "raw_newlines_and_quotes": raw_newlines_and_quotes,
+    "truncated": truncated,
+    "pathological_quotes": pathological_quotes,
+    "unterminated_multiline": unterminated_multiline,
+}
+
+
+# --- Legacy Regex Chain (as previously in content_generator.py) ---
+def legacy_parse(processed_output: str):
+    if processed_output.startswith("```json"):
+        processed_output = processed_output[7:]
+    if processed_output.endswith("```"):
+        processed_output = processed_output[:-3]
+    processed_output = processed_output.strip()
+    try:
+        return json.loads(processed_output)
+    except json.JSONDecodeError:
+        pass
+    temp_output = processed_output.replace('\\"', '__TEMP_QUOTE__')
+    temp_output = temp_output.replace('\\n', '__TEMP_NEWLINE__')
+    pattern = r'"[^"]*":\s*"(?:[^"\\]|\\.)*(?:\n(?:[^"\\]|\\.)*)*"'
+    temp_output = re.sub(pattern, lambda m: m.group(0).replace('\n', '\\n'), temp_output, flags=re.MULTILINE | re.DOTALL)
+    temp_output = temp_output.replace('__TEMP_NEWLINE__', '\\n')
+    temp_output = temp_output.replace('__TEMP_QUOTE__', '\\"')
+    temp_output = re.sub(r',(\s*[}\]])', r'\1', temp_output)
+    return json.loads(temp_output)
+
+
+def _legacy_worker(text: str, queue) -> None:
+    start = time.perf_counter()
+    try:
+        legacy_parse(text)
+        ok = True
+    except Exception:
+        ok = False
+    queue.put((time.perf_counter() - start, ok))
+
+
+def time_legacy(text: str, timeout: float) -> tuple[float | None, bool]:
+    """Returns (seconds, parsed_ok); seconds is None if the chain did not finish within the timeout."""
+    queue = multiprocessing.Queue()
+    process = multiprocessing.Process(target=_legacy_worker, args=(text, queue))
+    process.start()
+    process.join(timeout)
+    if process.is_alive():
+        process.terminate()
+        process.join()
+        return None, False
+    return queue.get()
+
+
+def time_tolerant(text: str, repeat: int = 5) -> tuple[float, bool]:
+    best = float("inf")
+    ok = True
+    for _ in range(repeat):
+        start = time.perf_counter()
+        try:
+            value = loads_tolerant(text)
+            ok = isinstance(value, dict)
+        except json.JSONDecodeError:
+            ok = False
+        best = min(best, time.perf_counter() - start)
+    return best, ok
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--sizes", default="5000,20000,50000,100000", help="Comma-separated approximate input sizes in bytes")
+    parser.add_argument("--timeout", type=float, default=10.0, help="Seconds allowed for each legacy run")
+    args = parser.parse_args()
+    sizes = [int(s) for s in args.sizes.split(",") if s.strip()]
+
+    print(f"{'case':<26}{'bytes':>9}  {'tolerant ms':>12} {'ok':>4}  {'legacy ms':>12} {'ok':>4}  {'tolerant us/KB':>15}")
+    for case, generate in GENERATORS.items():
+        for size in sizes:
+            text = generate(size)
+            nbytes = len(text.encode("utf-8"))
+            tolerant_s, tolerant_ok = time_tolerant(text)
+            legacy_s, legacy_ok = time_legacy(text, args.timeout)
+            legacy_col = f"{legacy_s * 1000:12.2f}" if legacy_s is not None else f"{'>' + str(int(args.timeout * 1000)):>12}"
+            per_kb = tolerant_s * 1e6 / (nbytes / 1024)
+            print(f"{case:<26}{nbytes:>9}  {tolerant_s * 1000:12.2f} {str(tolerant_ok):>4}  {legacy_col} {str(legacy_ok):>4}  {per_kb:15.1f}")
+
+
+if __name__ == "__main__":
+    main()